@@ -7,8 +7,9 @@ import os
 from core import diver_engine
 from core import levels_engine
 from core import parsing_engine
-from core.parsing_engine import parse_value_raw, extract, fmt_num, parse_raw_input, calculate_metrics
+from core.parsing_engine import parse_value_raw, extract, fmt_num, parse_raw_input, calculate_metrics, build_threshold_index
 from core.report_generator import generate_xray, generate_composite, generate_full_report, generate_composite_report
+from core.parse_cache import config_version
 from ui.tabs import tab_reports
 from ui.tabs import tab_candles
 from ui.tabs import tab_flow
@@ -54,9 +55,31 @@ def init_connection():
 
 supabase: Client = init_connection()
 
+# --- 💽 Локальное зеркало свечей (опционально) ---
+@st.cache_resource
+def init_mirror():
+    """
+    SQLite-зеркало таблицы candles, если задан CANDLES_MIRROR_PATH.
+    
+    Синхронизация идёт в фоновом потоке (один на процесс): новые строки по
+    watermark (ts, id) раз в CANDLES_MIRROR_SYNC_SEC, раз в
+    CANDLES_MIRROR_FULL_SYNC_SEC - полная сверка (чужие правки, удаления,
+    бэкфилл). Пока первая копия не готова, чтение идёт из Supabase.
+    """
+    path = os.getenv("CANDLES_MIRROR_PATH")
+    if not path:
+        return None
+    from core.local_mirror import LocalMirror
+    mirror = LocalMirror(path)
+    mirror.start_background_sync(supabase, max_age=int(os.getenv("CANDLES_MIRROR_SYNC_SEC", 60)),
+                                 full_max_age=int(os.getenv("CANDLES_MIRROR_FULL_SYNC_SEC", 3600)))
+    return mirror
+
+mirror = init_mirror()
+
 # --- 🗄️ Менеджер БД ---
 from core.db_manager import DatabaseManager
-db = DatabaseManager(supabase)
+db = DatabaseManager(supabase, mirror=mirror)
 
 # --- 🔄 Процессор конвейера ---
 from core.pipeline_processor import PipelineProcessor
@@ -93,6 +116,12 @@ def load_configurations():
         res_liq = supabase.table('liqshare_thresholds').select("*").eq('name', 'squeeze').execute()
         config['global_squeeze_limit'] = float(res_liq.data[0]['value']) if res_liq.data else 0.3
 
+        # Индекс порогов (symbol, tf) -> Thresholds: O(1) поиск в calculate_metrics
+        config['threshold_index'] = build_threshold_index(config)
+
+        # Версия конфига: часть ключа кэша парсинга (core/parse_cache.py)
+        config['config_version'] = config_version(config)
+
         return config
     except Exception as e:
         st.error(f"Ошибка загрузки конфигураций из БД: {e}")
@@ -166,7 +195,7 @@ elif selected_tab == "Свечи":
 elif selected_tab == "Дивер":
     tab_diver.render(db, processor, load_configurations, supabase)
 elif selected_tab == "Уровни":
-    tab_levels.render(supabase)
+    tab_levels.render(db)
 elif selected_tab == "Лаборатория":
     tab_lab.render(supabase, load_configurations)
 elif selected_tab == "Обучение":
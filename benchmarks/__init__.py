@@ -0,0 +1 @@
+# Benchmarks Package
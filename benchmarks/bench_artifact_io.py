@@ -0,0 +1,84 @@
+"""
+Benchmark: форматы артефактов offline/data (indented JSON vs npz).
+
+Размножает чистые сегменты и фичи ETH 1D (copies раз, новые id), пишет и
+читает их через offline.artifact_io в обоих форматах и печатает размер файла,
+время записи и чтения. Перед замером проверяет, что чтение возвращает ровно
+записанные записи. Файлы пишутся во временный каталог.
+
+Запуск:
+    python benchmarks/bench_artifact_io.py [copies] [repeats]
+"""
+
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from offline.artifact_io import (CLEAN_ROWS, FEATURES_ROWS, FORMAT_JSON, FORMAT_NPZ,
+                                 find_records, load_records, save_records)
+
+OFFLINE_DATA = _root_dir / "offline" / "data"
+
+
+def build_records(name, copies):
+    """ETH_1D_Binance_<name>.json, размноженный copies раз."""
+    with open(OFFLINE_DATA / f"ETH_1D_Binance_{name}.json") as f:
+        base = json.load(f)
+    records = []
+    for i in range(copies):
+        for rec in base:
+            rec = dict(rec)
+            rec["id"] = f"{rec['id']}-{i}"
+            records.append(rec)
+    return records
+
+
+def bench(records, rows_path, fmt, directory, repeats):
+    """
+    Лучшее время записи и чтения одного формата.
+
+    Возвращает:
+        dict: fmt, mb, write_ms, read_ms
+    """
+    base = Path(directory) / f"bench_{fmt}"
+    write = read = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        save_records(base, records, rows_path, fmt, debug_json=False)
+        write = min(write, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        loaded = load_records(base, fmt)
+        read = min(read, time.perf_counter() - t0)
+    if loaded != records:
+        raise AssertionError(f"{fmt}: records differ after roundtrip")
+    return {
+        "fmt": fmt,
+        "mb": find_records(base, fmt).stat().st_size / 1e6,
+        "write_ms": write * 1000,
+        "read_ms": read * 1000,
+    }
+
+
+def run(copies=100, repeats=3):
+    with tempfile.TemporaryDirectory() as directory:
+        for name, rows_path in (("clean", CLEAN_ROWS), ("features", FEATURES_ROWS)):
+            records = build_records(name, copies)
+            results = [bench(records, rows_path, fmt, directory, repeats) for fmt in (FORMAT_JSON, FORMAT_NPZ)]
+            for res in results:
+                print(f"[BENCH] {name:<9} {len(records):6d} records  {res['fmt']:<5} {res['mb']:8.1f} MB  "
+                      f"write {res['write_ms']:8.0f} ms  read {res['read_ms']:8.0f} ms")
+            js, npz = results
+            print(f"[OK] {name}: npz x{js['mb'] / npz['mb']:.1f} smaller, "
+                  f"write x{js['write_ms'] / npz['write_ms']:.1f}, read x{js['read_ms'] / npz['read_ms']:.1f}")
+
+
+if __name__ == "__main__":
+    c = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    r = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    run(c, r)
@@ -0,0 +1,73 @@
+"""
+Benchmark: parse_batch_with_labels, последовательно vs пул процессов.
+
+Строит Lab-вставку из размеченных сегментов (свечи + "Strong Up" и т.п.),
+проверяет, что параллельный режим возвращает те же segments / candles /
+warnings в том же порядке, и печатает candles/sec.
+
+Запуск:
+    python benchmarks/bench_batch_parser.py [segments] [candles_per_segment] [workers]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core.batch_parser import parse_batch_with_labels
+from benchmarks.bench_parse_raw_input import build_chunks, EXCHANGES
+
+LABELS = ["Strong Up", "Medium Down", "Weak Up", "Strong Down", "Medium Up", "Weak Down"]
+
+
+def build_lab_text(segments=120, candles_per_segment=12):
+    """Вставка Lab: segments сегментов по candles_per_segment свечей, каждый закрыт меткой."""
+    per_exchange = segments * candles_per_segment // len(EXCHANGES) + 1
+    chunks = build_chunks(per_exchange, ts_format="%d.%m.%Y %H:%M:%S")
+    parts = []
+    for i in range(segments):
+        parts.extend(chunks[i * candles_per_segment:(i + 1) * candles_per_segment])
+        parts.append(LABELS[i % len(LABELS)] + "\n")
+        # Пустой сегмент и битая свеча: проверяем порядок предупреждений
+        if i % 25 == 7:
+            parts.append("Weak Up\n")
+        if i % 30 == 11:
+            parts.append("01.01.2025 00:00:00 garbage without prices\n")
+    parts.append("Medium\n")
+    parts.append(chunks[0])
+    return "\n".join(parts)
+
+
+def timed(text, workers):
+    t0 = time.perf_counter()
+    result = parse_batch_with_labels(text, config={}, workers=workers)
+    return result, time.perf_counter() - t0
+
+
+def run(segments=120, candles_per_segment=12, workers=None):
+    workers = workers or os.cpu_count() or 1
+    text = build_lab_text(segments, candles_per_segment)
+    
+    serial, t_serial = timed(text, None)
+    parallel, t_parallel = timed(text, workers)
+    
+    if serial != parallel:
+        raise AssertionError("parallel parse_batch_with_labels differs from serial")
+    
+    n = len(serial[1])
+    print(f"[INFO] {len(serial[0])} segments, {n} candles, {len(serial[2])} warnings")
+    print(f"[OK] serial == parallel (segments, candles, warnings)")
+    print(f"[BENCH] serial:            {n / t_serial:10.0f} candles/sec")
+    print(f"[BENCH] parallel ({workers:>2} proc): {n / t_parallel:10.0f} candles/sec  (x{t_serial / t_parallel:.2f})")
+    return {"candles": n, "serial_cps": n / t_serial, "parallel_cps": n / t_parallel, "workers": workers}
+
+
+if __name__ == "__main__":
+    s = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    c = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    w = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    run(s, c, w)
@@ -0,0 +1,181 @@
+"""
+Benchmark: инкрементальный BoostHistory vs percentile_rank / top1_share (stage 2).
+
+Проверяет на случайных последовательностях (None, нули, повторы, int и float,
+отрицательные, большие и крошечные значения, длины 0..MAX_SEGMENT_LENGTH и
+длинные ряды), что на каждом шаге BoostHistory.rank(x) и top1_share()
+совпадают с исходными определениями над префиксом истории бит-в-бит
+(struct.pack('<d'), тот же тип результата, те же None). Затем сверяет
+process_segment на сегментах ETH 1D со старой версией BOOST и печатает время
+шага для обеих реализаций на разных длинах истории.
+
+Запуск:
+    python benchmarks/bench_boost_history.py [n_sequences] [seed]
+"""
+
+import json
+import random
+import struct
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+_offline_dir = _root_dir / "offline"
+for _p in (str(_root_dir), str(_offline_dir)):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+from stage2_features import BoostHistory, percentile_rank, process_segment, safe_get, top1_share
+from stats_calc import MAX_SEGMENT_LENGTH
+
+
+def random_value(rnd, pool):
+    """Значение истории: None, 0, повтор, int или float разного масштаба."""
+    r = rnd.random()
+    if r < 0.15:
+        return None
+    if r < 0.25:
+        return rnd.choice([0, 0.0, -0.0])
+    if r < 0.40 and pool:
+        return rnd.choice(pool)
+    if r < 0.50:
+        return rnd.randint(-5, 10 ** rnd.randint(1, 12))
+    scale = 10.0 ** rnd.randint(-8, 10)
+    return rnd.uniform(-0.2, 1.0) * scale
+
+
+def random_sequence(rnd):
+    n = rnd.randint(0, MAX_SEGMENT_LENGTH) if rnd.random() < 0.9 else rnd.randint(31, 400)
+    seq = []
+    for _ in range(n):
+        seq.append(random_value(rnd, seq))
+    return seq
+
+
+def _same(a, b):
+    """Совпадение бит-в-бит (включая -0.0) и по типу."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, float):
+        return struct.pack("<d", a) == struct.pack("<d", b)
+    return a == b
+
+
+def check_sequences(n, seed=0):
+    """
+    Сверяет BoostHistory с определениями на каждом шаге n случайных рядов.
+
+    Возвращает:
+        Список расхождений (seq, step, what, incremental, reference)
+    """
+    rnd = random.Random(seed)
+    mismatches = []
+    for _ in range(n):
+        seq = random_sequence(rnd)
+        hist = BoostHistory()
+        for step, x in enumerate(seq):
+            hist.append(x)
+            prefix = seq[:step + 1]
+            probes = [("rank(x)", hist.rank(x), percentile_rank(x, prefix)),
+                      ("top1_share", hist.top1_share(), top1_share(prefix))]
+            # Ранг произвольного значения (не только последнего)
+            probe = random_value(rnd, prefix)
+            probes.append((f"rank({probe!r})", hist.rank(probe), percentile_rank(probe, prefix)))
+            for what, inc, ref in probes:
+                if not _same(inc, ref):
+                    mismatches.append((seq, step, what, inc, ref))
+    return mismatches
+
+
+def reference_boost(seg):
+    """BOOST сегмента по исходному алгоритму (полные пересчёты по спискам)."""
+    candles = seg.get("data", {}).get("CONTEXT", {}).get("DATA", [])
+    v_hist, doi_hist, liq_hist, out = [], [], [], []
+    for i, c in enumerate(candles):
+        vol, doi = safe_get(c, "volume"), safe_get(c, "doi_pct")
+        liq_total = (safe_get(c, "liq_long") or 0) + (safe_get(c, "liq_short") or 0)
+        v_hist.append(vol)
+        doi_hist.append(abs(doi) if doi is not None else None)
+        liq_hist.append(liq_total)
+        boost = {
+            "vol_top1_share": top1_share(v_hist), "vol_rank": None,
+            "doi_top1_share": top1_share(doi_hist), "doi_rank": None,
+            "liq_top1_share": top1_share(liq_hist), "liq_rank": None,
+        }
+        if i >= 5:
+            boost["vol_rank"] = percentile_rank(vol, v_hist)
+            boost["doi_rank"] = percentile_rank(doi_hist[-1], doi_hist)
+            boost["liq_rank"] = percentile_rank(liq_total, liq_hist)
+        out.append(boost)
+    return out
+
+
+def check_segments():
+    """process_segment на сегментах ETH 1D: BOOST совпадает с исходным алгоритмом."""
+    with open(_offline_dir / "data" / "ETH_1D_Binance_clean.json") as f:
+        segments = json.load(f)
+    bad = 0
+    for seg in segments:
+        result = process_segment(seg)
+        got = [step["boost"] for step in result["steps"]] if result else []
+        if repr(got) != repr(reference_boost(seg)):
+            bad += 1
+    return len(segments), bad
+
+
+def bench(length, repeats=5, seed=0):
+    """Лучшее время (мкс на шаг) одного ряда длины length: определения vs BoostHistory."""
+    rnd = random.Random(seed)
+    seq = [random_value(rnd, []) for _ in range(length)]
+
+    def reference():
+        prefix = []
+        for x in seq:
+            prefix.append(x)
+            top1_share(prefix)
+            percentile_rank(x, prefix)
+
+    def incremental():
+        hist = BoostHistory()
+        for x in seq:
+            hist.append(x)
+            hist.top1_share()
+            hist.rank(x)
+
+    times = []
+    for fn in (reference, incremental):
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        times.append(best / length * 1e6)
+    return times
+
+
+def run(n=20_000, seed=0):
+    mismatches = check_sequences(n, seed)
+    if mismatches:
+        for seq, step, what, inc, ref in mismatches[:10]:
+            print(f"[FAIL] step {step} {what}: incremental={inc!r} reference={ref!r} seq={seq[:step + 1]!r}")
+        print(f"[FAIL] {len(mismatches)} mismatches")
+        sys.exit(1)
+    print(f"[OK] {n} random sequences identical at every step")
+
+    total, bad = check_segments()
+    if bad:
+        print(f"[FAIL] process_segment BOOST differs on {bad}/{total} ETH 1D segments")
+        sys.exit(1)
+    print(f"[OK] process_segment BOOST identical on {total} ETH 1D segments")
+
+    for length in (MAX_SEGMENT_LENGTH, 300, 3000):
+        ref, inc = bench(length, seed=seed)
+        print(f"[BENCH] history {length:5d}: definitions {ref:8.2f} us/step  BoostHistory {inc:6.2f} us/step  "
+              f"(x{ref / inc:.1f})")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    run(n, seed)
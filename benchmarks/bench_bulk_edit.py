@@ -0,0 +1,79 @@
+"""
+Benchmark: правки/удаление во вкладке "Свечи", построчно vs пакетом.
+
+Построчный путь - update_candle на каждую отредактированную строку;
+пакетный - update_candles_bulk (одинаковые правки одним update по списку
+id, уникальные - update по своему id, без upsert) и delete_candles чанками
+по ID_CHUNK_SIZE.
+Проверяет, что итоговые таблицы совпадают, и печатает число запросов и
+время при заданной задержке сети.
+
+Запуск:
+    python benchmarks/bench_bulk_edit.py [rows] [latency_ms]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core.db_manager import DatabaseManager
+from benchmarks.bench_fetch_and_merge import build_rows, build_db_rows
+from benchmarks.fake_supabase import FakeSupabase
+
+
+def build_updates(ids):
+    """Как в data_editor: у половины строк свои заметки, у половины - общая метка."""
+    updates = {}
+    for i, row_id in enumerate(ids):
+        updates[row_id] = {'note': f"note {i}"} if i % 2 else {'note': "checked"}
+    return updates
+
+
+def timed(client, action):
+    client.reset_stats()
+    t0 = time.perf_counter()
+    action()
+    return time.perf_counter() - t0, client.requests
+
+
+def run(n=200, latency_ms=20):
+    db_rows = build_db_rows(build_rows(n // 12 + 1))
+    ids = [r['id'] for r in db_rows[:n]]
+    updates = build_updates(ids)
+    to_delete = ids[::3]
+
+    slow = FakeSupabase({"candles": db_rows}, latency=latency_ms / 1000)
+    fast = FakeSupabase({"candles": db_rows}, latency=latency_ms / 1000)
+    db_slow, db_fast = DatabaseManager(slow), DatabaseManager(fast)
+
+    def per_row():
+        for row_id, changes in updates.items():
+            db_slow.update_candle(row_id, changes)
+
+    t_row, req_row = timed(slow, per_row)
+    t_bulk, req_bulk = timed(fast, lambda: db_fast.update_candles_bulk(updates))
+    t_del_row, req_del_row = timed(slow, lambda: [db_slow.delete_candles([i]) for i in to_delete])
+    t_del_bulk, req_del_bulk = timed(fast, lambda: db_fast.delete_candles(to_delete))
+
+    key = lambda r: r['id']
+    if sorted(slow.tables["candles"], key=key) != sorted(fast.tables["candles"], key=key):
+        raise AssertionError("bulk edit/delete differs from per-row path")
+
+    print(f"[INFO] {len(updates)} edited rows, {len(to_delete)} deleted, latency {latency_ms} ms")
+    print(f"[OK] tables identical")
+    print(f"[BENCH] update per row: {req_row:4d} requests  {t_row * 1000:8.1f} ms")
+    print(f"[BENCH] update bulk:    {req_bulk:4d} requests  {t_bulk * 1000:8.1f} ms")
+    print(f"[BENCH] delete per row: {req_del_row:4d} requests  {t_del_row * 1000:8.1f} ms")
+    print(f"[BENCH] delete bulk:    {req_del_bulk:4d} requests  {t_del_bulk * 1000:8.1f} ms")
+    return {"update_row_requests": req_row, "update_bulk_requests": req_bulk,
+            "delete_row_requests": req_del_row, "delete_bulk_requests": req_del_bulk}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    l = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(n, l)
@@ -0,0 +1,148 @@
+"""
+Benchmark: calculate_metrics с threshold_index vs поиск по таблицам.
+
+Генерирует случайные сырые свечи (включая пропуски, нули и доджи),
+сверяет поиск порогов через threshold_index с поиском по porog_doi /
+tf_params поле в поле и печатает candles/sec для обоих вариантов.
+
+Запуск:
+    python benchmarks/bench_calculate_metrics.py [n_candles] [seed]
+"""
+
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+import pandas as pd
+
+from core.parsing_engine import calculate_metrics, build_threshold_index
+
+SYMBOLS = ["ETH", "BTC", "SOL", "eth", None]
+TFS = ["4h", "1h", "1H", "1D", "5m", "15m", None]
+
+# Поля, которые parse_raw_input может вернуть как None
+# (OI-блок при отсутствии просто не попадает в словарь)
+NULLABLE_FIELDS = [
+    "open", "high", "low", "close", "change_abs", "change_pct",
+    "buy_volume", "sell_volume", "abv_delta", "buy_trades", "sell_trades", "trades_delta",
+    "liq_long", "liq_short",
+]
+OI_FIELDS = ["oi_open", "oi_high", "oi_low", "oi_close"]
+
+
+def make_config(indexed=True):
+    """Конфигурация в формате load_configurations()."""
+    config = {
+        "asset_coeffs": {"ETH": 1.0, "BTC": 0.8},
+        "porog_doi": pd.DataFrame([
+            {"timeframe": "4h", "eth": 1.5, "btc": 1.2},
+            {"timeframe": "1H", "eth": 0.9, "btc": 0.7},
+            {"timeframe": "1d", "eth": 3.0, "btc": 2.5},
+            {"timeframe": "4H", "eth": 9.9, "btc": 9.9},
+        ]),
+        "tf_params": {
+            "4h": {"tf": "4h", "sens": 1.0, "k_set": 1.2, "k_ctr": 0.8, "k_unl": 1.1},
+            "1h": {"tf": "1h", "sens": 0.5, "k_set": 1.3, "k_ctr": 0.9, "k_unl": 1.0},
+            "5m": {"tf": "5m", "sens": 0.2, "k_set": 1.0},
+        },
+        "global_squeeze_limit": 0.3,
+    }
+    if indexed:
+        config["threshold_index"] = build_threshold_index(config)
+    return config
+
+
+def make_raw(rnd):
+    """Одна случайная сырая свеча (поля иногда None или 0)."""
+    o = round(rnd.uniform(100, 3000), 2)
+    c = o if rnd.random() < 0.05 else round(o * rnd.uniform(0.97, 1.03), 2)
+    h = max(o, c) + (0 if rnd.random() < 0.1 else round(rnd.uniform(0, 50), 2))
+    l = min(o, c) - (0 if rnd.random() < 0.1 else round(rnd.uniform(0, 50), 2))
+    if h == l and rnd.random() < 0.5:
+        h = l = o = c
+    buy_v = round(rnd.uniform(0, 1e7), 2)
+    sell_v = round(rnd.uniform(0, 1e7), 2)
+    buy_t = round(rnd.uniform(0, 1e5))
+    sell_t = round(rnd.uniform(0, 1e5))
+    oi_o = round(rnd.uniform(1e5, 1e6), 2)
+    oi_c = round(oi_o * rnd.uniform(0.9, 1.1), 2)
+    raw = {
+        "symbol_clean": rnd.choice(SYMBOLS),
+        "tf": rnd.choice(TFS),
+        "open": o, "high": h, "low": l, "close": c,
+        "volume": round(rnd.uniform(0, 1e8), 2),
+        "change_abs": round(c - o, 2),
+        "change_pct": rnd.choice([None, 0.0, round((c - o) / o * 100, 2)]),
+        "buy_volume": buy_v, "sell_volume": sell_v, "abv_delta": round(buy_v - sell_v, 2),
+        "buy_trades": buy_t, "sell_trades": sell_t, "trades_delta": buy_t - sell_t,
+        "oi_open": oi_o, "oi_high": max(oi_o, oi_c) * 1.01, "oi_low": min(oi_o, oi_c) * 0.99, "oi_close": oi_c,
+        "liq_long": round(rnd.uniform(0, 1e6), 2), "liq_short": round(rnd.uniform(0, 1e6), 2),
+    }
+    for field in NULLABLE_FIELDS:
+        r = rnd.random()
+        if r < 0.04:
+            raw[field] = None
+        elif r < 0.06:
+            raw[field] = 0.0
+    if rnd.random() < 0.05:
+        for field in OI_FIELDS:
+            raw.pop(field)
+    elif rnd.random() < 0.05:
+        raw["oi_open"] = 0.0
+    return raw
+
+
+def same(a, b):
+    """Равенство с None == NaN."""
+    a_null = a is None or (isinstance(a, float) and math.isnan(a))
+    b_null = b is None or (isinstance(b, float) and math.isnan(b))
+    if a_null or b_null:
+        return a_null and b_null
+    return a == b
+
+
+def check_threshold_index(raws):
+    """Скалярный расчёт с threshold_index совпадает с поиском по таблицам."""
+    plain, indexed = make_config(indexed=False), make_config()
+    for raw in raws:
+        a = calculate_metrics(raw, plain)
+        b = calculate_metrics(raw, indexed)
+        for key, val in a.items():
+            if not same(val, b.get(key)):
+                raise AssertionError(f"{key}: plain={val!r} indexed={b.get(key)!r}\nraw={raw}")
+
+
+def run(n=20000, seed=42):
+    rnd = random.Random(seed)
+    config = make_config()
+    raws = [make_raw(rnd) for _ in range(n)]
+    
+    check_threshold_index(raws)
+    print(f"[OK] threshold_index identical to table lookup across {n} candles")
+    
+    plain = make_config(indexed=False)
+    t0 = time.perf_counter()
+    for raw in raws:
+        calculate_metrics(raw, plain)
+    plain_s = time.perf_counter() - t0
+    
+    t0 = time.perf_counter()
+    for raw in raws:
+        calculate_metrics(raw, config)
+    scalar_s = time.perf_counter() - t0
+    
+    print(f"[BENCH] calculate_metrics (no index): {n / plain_s:10.0f} candles/sec")
+    print(f"[BENCH] calculate_metrics:            {n / scalar_s:10.0f} candles/sec  (x{plain_s / scalar_s:.1f})")
+    return {"candles": n, "plain_cps": n / plain_s, "scalar_cps": n / scalar_s}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 42
+    run(n, seed)
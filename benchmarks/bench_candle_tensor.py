@@ -0,0 +1,96 @@
+"""
+Benchmark: стадии 2, 5, 6 на упакованном тензоре свечей vs словари свечей.
+
+Стадия 1 (FakeSupabase) пишет в offline/data под символом BENCH чистые
+сегменты ETH 1D, размноженные copies раз, и тензор свечей. Затем каждая
+стадия прогоняется дважды: с тензором и с отключённым тензором (путь по
+seg["data"]["CONTEXT"]["DATA"]); печатаются время, пик памяти (tracemalloc)
+и совпадение артефактов. Файлы BENCH удаляются после замера. Стадии
+импортируют пакет supabase - без него бенчмарк помечается [SKIP].
+
+Запуск:
+    python benchmarks/bench_candle_tensor.py [copies]
+"""
+
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from benchmarks.bench_io_paths import BENCH_SYMBOL, OFFLINE_DATA, build_segment_rows
+from benchmarks.fake_supabase import FakeSupabase
+
+
+def measure(fn):
+    """(результат, мс, пик MB) одного прогона; вывод стадии скрыт."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()
+        try:
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, elapsed * 1000, peak / 1e6
+
+
+def artifact(name):
+    path = OFFLINE_DATA / f"{BENCH_SYMBOL}_1D_Binance_{name}.json"
+    return path.read_bytes() if path.exists() else None
+
+
+def run(copies=100):
+    try:
+        from offline import stage1_loader, stage2_features, stage5_bins_stats, stage6_mine_stats
+        from offline import artifact_io, candle_tensor
+    except ImportError as e:
+        print(f"[SKIP] offline stages: {e}")
+        return
+    # Stage 2 imports its siblings as top-level modules
+    import candle_tensor as candle_tensor_top
+
+    for stage in (stage5_bins_stats, stage6_mine_stats):
+        stage.save_to_supabase = lambda *a, **k: (True, "skipped")
+
+    rows = build_segment_rows(copies)
+    with contextlib.redirect_stdout(io.StringIO()):
+        stage1_loader.run_pipeline(BENCH_SYMBOL, "1D", "Binance", supabase=FakeSupabase({"segments": rows}), full=True)
+    print(f"[INFO] {len(rows)} segments")
+
+    stages = [
+        ("stage2", lambda: stage2_features.run_simulation(BENCH_SYMBOL, "1D", "Binance", incremental=False),
+         "features", lambda: artifact_io.load_records(artifact_io.artifact_base(BENCH_SYMBOL, "1D", "Binance", "features"))),
+        ("stage5", lambda: stage5_bins_stats.run_bins_stats(BENCH_SYMBOL, "1D", "Binance"), "bins_stats", None),
+        ("stage6", lambda: stage6_mine_stats.run_mine_stats(BENCH_SYMBOL, "1D", "Binance"), "rules_stats", None),
+    ]
+    load = candle_tensor.load_candle_tensor
+    try:
+        for name, fn, out, read in stages:
+            results = {}
+            for mode in ("dicts", "tensor"):
+                for module in (candle_tensor, candle_tensor_top):
+                    module.load_candle_tensor = load if mode == "tensor" else (lambda base: None)
+                _, ms, peak = measure(fn)
+                results[mode] = (ms, peak, read() if read else artifact(out))
+                print(f"[BENCH] {name} {mode:<6} {ms:9.0f} ms  peak {peak:7.1f} MB")
+            (d_ms, d_peak, d_out), (t_ms, t_peak, t_out) = results["dicts"], results["tensor"]
+            status = "OK" if d_out == t_out else "FAIL"
+            print(f"[{status}] {name}: x{d_ms / t_ms:.2f} faster, peak x{d_peak / t_peak:.2f} lower, "
+                  f"{out} {'identical' if status == 'OK' else 'DIFFERS'}")
+    finally:
+        for module in (candle_tensor, candle_tensor_top):
+            module.load_candle_tensor = load
+        for path in OFFLINE_DATA.glob(f"{BENCH_SYMBOL}_1D_Binance_*"):
+            path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
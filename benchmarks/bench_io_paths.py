@@ -0,0 +1,167 @@
+"""
+Benchmark suite: I/O-пути приложения и offline-стадий на FakeSupabase.
+
+Каждый путь получает свой in-memory клиент с синтетическими данными и
+заданной задержкой сети; печатаются число запросов (по таблица.метод),
+строки на проводе и время. Offline-стадии импортируют пакет supabase -
+без него они помечаются [SKIP]. Стадия 1 пишет результат в offline/data
+под символом BENCH, файлы удаляются после замера.
+
+Запуск:
+    python benchmarks/bench_io_paths.py [latency_ms] [candles_per_exchange] [--json out.json]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core import batch_parser
+from core.db_manager import DatabaseManager
+from core.flow_engine import FLOW_COLUMNS
+from benchmarks.bench_fetch_and_merge import build_rows, build_db_rows
+from benchmarks.bench_save_candles import build_candles, CANDLES_SCHEMA
+from benchmarks.fake_supabase import FakeSupabase
+
+OFFLINE_DATA = _root_dir / "offline" / "data"
+BENCH_SYMBOL = "BENCH"
+
+
+# =============================================================================
+# ДАННЫЕ
+# =============================================================================
+
+def load_artifact(name):
+    """Артефакт ETH_1D_Binance_<name>.json из offline/data."""
+    with open(OFFLINE_DATA / f"ETH_1D_Binance_{name}.json") as f:
+        return json.load(f)
+
+
+def build_segment_rows(copies):
+    """Строки таблицы segments: чистые сегменты ETH 1D, размноженные copies раз."""
+    base = load_artifact("clean")
+    rows = []
+    for i in range(copies):
+        for seg in base:
+            row = {k: v for k, v in seg.items() if k != "setup_status"}
+            row["id"] = f"{seg['id']}-{i}"
+            row["symbol"] = BENCH_SYMBOL
+            rows.append(row)
+    return rows
+
+
+def build_lab_segments(copies):
+    """Сегменты в формате parse_batch_with_labels (META / IMPULSE / CONTEXT)."""
+    segments = []
+    for row in build_segment_rows(copies):
+        segments.append({
+            "META": row["data"]["META"],
+            "IMPULSE": {"y_dir": row["y_dir"], "y_size": row["y_size"]},
+            "CONTEXT": row["data"]["CONTEXT"],
+        })
+    return segments
+
+
+# =============================================================================
+# ЗАМЕР
+# =============================================================================
+
+def measure(name, client, action):
+    """Выполняет action(client) и возвращает строку результата."""
+    client.reset_stats()
+    t0 = time.perf_counter()
+    action(client)
+    elapsed = time.perf_counter() - t0
+    result = {"path": name, "ms": elapsed * 1000, **client.stats()}
+    calls = " ".join(f"{k}={v}" for k, v in result["by_call"].items())
+    print(f"[BENCH] {name:<34} {result['requests']:4d} req  {result['rows_returned']:6d} rows in  "
+          f"{result['rows_sent']:6d} rows out  {result['ms']:9.1f} ms  {calls}")
+    return result
+
+
+def db_paths(latency, per_exchange):
+    """DatabaseManager + batch_parser: клиент с таблицей candles."""
+    parsed = build_rows(per_exchange)
+    # Строки как в таблице: только колонки схемы
+    db_rows = [{k: v for k, v in r.items() if k in CANDLES_SCHEMA} for r in build_db_rows(parsed)]
+    candles = build_candles(len(db_rows))
+    ids = [r["id"] for r in db_rows]
+
+    def client(rows=db_rows):
+        return FakeSupabase({"candles": rows}, latency=latency,
+                            schema={"candles": CANDLES_SCHEMA})
+
+    paths = [
+        ("db.load_candles(limit=1000)", client(), lambda c: DatabaseManager(c).load_candles(limit=1000)),
+        ("db.load_candles_paged(FLOW_COLUMNS)", client(),
+         lambda c: DatabaseManager(c).load_candles_paged(columns=FLOW_COLUMNS)),
+        ("db.get_unique_symbols", client(), lambda c: DatabaseManager(c).get_unique_symbols()),
+        ("db.fetch_and_merge", client(), lambda c: DatabaseManager(c).fetch_and_merge(parsed[::3])),
+        ("db.save_candles_batch", client([]), lambda c: DatabaseManager(c).save_candles_batch(candles)),
+        ("db.update_candles_bulk", client(),
+         lambda c: DatabaseManager(c).update_candles_bulk({i: {"note": f"n{i}"} for i in ids[::2]})),
+        ("db.delete_candles", client(), lambda c: DatabaseManager(c).delete_candles(ids[::2])),
+        ("batch_parser.save_to_candles", client([]), lambda c: batch_parser.save_to_candles(c, candles)),
+        ("batch_parser.save_batch_transactionally", client([]),
+         lambda c: batch_parser.save_batch_transactionally(c, build_lab_segments(4), candles)),
+    ]
+    return [measure(name, c, action) for name, c, action in paths]
+
+
+def offline_paths(latency, copies=20):
+    """Offline-стадии 1, 3-6 (нужен пакет supabase для импорта модулей)."""
+    try:
+        from offline import stage1_loader, stage3_bins, stage4_rules, stage5_bins_stats, stage6_mine_stats
+    except ImportError as e:
+        print(f"[SKIP] offline stages: {e}")
+        return []
+
+    def client(tables=None):
+        return FakeSupabase(tables or {}, latency=latency)
+
+    results = [measure(
+        "stage1.run_pipeline", client({"segments": build_segment_rows(copies)}),
+        lambda c: stage1_loader.run_pipeline(BENCH_SYMBOL, "1D", "Binance", supabase=c)
+    )]
+    for path in OFFLINE_DATA.glob(f"{BENCH_SYMBOL}_1D_Binance_*"):
+        path.unlink(missing_ok=True)
+
+    saves = [
+        ("stage3.save_to_supabase", lambda c: stage3_bins.save_to_supabase(
+            load_artifact("bins"), "ETH", "1D", "Binance", supabase=c)),
+        ("stage4.save_to_supabase", lambda c: stage4_rules.save_to_supabase(
+            load_artifact("rules_STRICT"), "ETH", "1D", "Binance", "STRICT", supabase=c)),
+        ("stage5.save_to_supabase", lambda c: stage5_bins_stats.save_to_supabase(
+            load_artifact("bins_stats"), "ETH", "1D", "Binance", supabase=c)),
+        ("stage6.save_to_supabase", lambda c: stage6_mine_stats.save_to_supabase(
+            load_artifact("rules_stats"), "ETH", "1D", "Binance", supabase=c)),
+    ]
+    results += [measure(name, client(), action) for name, action in saves]
+    return results
+
+
+def run(latency_ms=20, candles_per_exchange=96, json_path=None):
+    latency = latency_ms / 1000
+    print(f"[INFO] latency {latency_ms} ms, {candles_per_exchange * 12} candles in DB paths")
+    results = db_paths(latency, candles_per_exchange) + offline_paths(latency)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"latency_ms": latency_ms, "results": results}, f, indent=2)
+        print(f"[OK] results written to {json_path}")
+    return results
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    out = None
+    if "--json" in args:
+        i = args.index("--json")
+        out = args[i + 1]
+        del args[i:i + 2]
+    l = float(args[0]) if len(args) > 0 else 20
+    n = int(args[1]) if len(args) > 1 else 96
+    run(l, n, out)
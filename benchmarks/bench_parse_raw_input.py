@@ -0,0 +1,106 @@
+"""
+Benchmark: parse_raw_input legacy vs single_pass.
+
+Строит день 5m-свечей по четырём биржам в формате Coinglass, проверяет,
+что оба режима возвращают одинаковые словари, и печатает candles/sec.
+
+Запуск:
+    python benchmarks/bench_parse_raw_input.py [candles_per_exchange] [repeats]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core.parsing_engine import parse_raw_input, PARSE_MODE_LEGACY, PARSE_MODE_SINGLE_PASS
+
+EXCHANGES = ["Binance", "Bybit", "OKX", "Bitget"]
+
+CANDLE_TEMPLATE = """{ts} {exchange} · ETHUSDT Perpetual · 5m
+O {open:.2f} H {high:.2f} L {low:.2f} C {close:.2f} V {volume}M
+Change {change:+.2f} ({change_pct:+.2f}%)
+Amplitude {amp:.2f} ({amp_pct:.2f}%)
+Active Buy/Sell Volume
+Buy {buy}M Sell -{sell}M Delta {delta:+.2f}M Ratio 1.02
+Active Buy/Sell Trades
+Buy {buy_tr}K Sell -{sell_tr}K Delta {dtr:+.2f}K Ratio 0.98
+Open Interest
+O 2.08M H 2.1M L 1.84M C 1.85M
+Liquidation
+Long 155.6K Short -109.4K
+Funding Rate
+O 0.0100% H 0.0120% L 0.0050% C 0.0080%
+Aggregated Funding Rate
+O 0.0090% H 0.0110% L 0.0040% C 0.0070%
+Long/Short Ratio
+O 1.21 H 1.35 L 1.10 C 1.25
+Net Longs
+O 1.2M C 1.3M Δ +100K
+Net Shorts
+O 1.1M C 1.05M Δ -50K
+"""
+
+
+def build_chunks(candles_per_exchange=288, ts_format="%d.%m.%Y %H:%M"):
+    """Coinglass-блоки: candles_per_exchange свечей 5m на каждую биржу."""
+    start = datetime(2025, 6, 13, 0, 0)
+    chunks = []
+    for i in range(candles_per_exchange):
+        ts = (start + timedelta(minutes=5 * i)).strftime(ts_format)
+        o = 2500 + (i % 50)
+        c = o + ((i % 7) - 3)
+        buy = 5 + (i % 11) / 10
+        sell = 5 + (i % 13) / 10
+        buy_tr = 40 + i % 9
+        sell_tr = 41 + i % 5
+        for ex in EXCHANGES:
+            chunks.append(CANDLE_TEMPLATE.format(
+                ts=ts, exchange=ex, open=o, high=max(o, c) + 2, low=min(o, c) - 2, close=c,
+                volume=20 + i % 17, change=c - o, change_pct=(c - o) / o * 100,
+                amp=4 + abs(c - o), amp_pct=(4 + abs(c - o)) / o * 100,
+                buy=buy, sell=sell, delta=buy - sell,
+                buy_tr=buy_tr, sell_tr=sell_tr, dtr=buy_tr - sell_tr,
+            ))
+    return chunks
+
+
+def bench(chunks, mode, repeats=3):
+    """Лучшее время из repeats прогонов -> candles/sec."""
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for chunk in chunks:
+            parse_raw_input(chunk, mode=mode)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return len(chunks) / best if best else float("inf")
+
+
+def run(candles_per_exchange=288, repeats=3):
+    chunks = build_chunks(candles_per_exchange)
+    
+    # Проверка эквивалентности перед замером
+    for chunk in chunks:
+        legacy = parse_raw_input(chunk, mode=PARSE_MODE_LEGACY)
+        fast = parse_raw_input(chunk, mode=PARSE_MODE_SINGLE_PASS)
+        if legacy != fast:
+            raise AssertionError(f"single_pass mismatch on chunk:\n{chunk}")
+    
+    legacy_cps = bench(chunks, PARSE_MODE_LEGACY, repeats)
+    fast_cps = bench(chunks, PARSE_MODE_SINGLE_PASS, repeats)
+    
+    print(f"[INFO] {len(chunks)} candles ({candles_per_exchange} x {len(EXCHANGES)} exchanges)")
+    print(f"[BENCH] legacy:      {legacy_cps:10.0f} candles/sec")
+    print(f"[BENCH] single_pass: {fast_cps:10.0f} candles/sec  (x{fast_cps / legacy_cps:.2f})")
+    return {"candles": len(chunks), "legacy_cps": legacy_cps, "single_pass_cps": fast_cps}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 288
+    r = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    run(n, r)
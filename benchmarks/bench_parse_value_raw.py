@@ -0,0 +1,115 @@
+"""
+Benchmark: parse_value_raw (быстрый путь) vs parse_value_raw_legacy.
+
+Строит большой случайный корпус: токены Coinglass (K/M/B, %, запятые,
+знаки, пробелы по краям), граничные случаи и мусор (экспонента, лишние
+точки, пробелы внутри, юникод-цифры, не-строки). Проверяет совпадение
+бит-в-бит (struct.pack('<d'), включая -0.0 и inf) и одинаковые None,
+затем печатает values/sec обеих реализаций на реалистичном потоке токенов.
+
+Запуск:
+    python benchmarks/bench_parse_value_raw.py [n_values] [seed]
+"""
+
+import contextlib
+import io
+import random
+import struct
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core import parsing_engine
+from core.parsing_engine import parse_value_raw, parse_value_raw_legacy
+from benchmarks.bench_parser_suite import VALUE_RE
+from benchmarks.synthetic_coinglass import generate_blocks
+
+EDGE_CASES = [
+    None, "", "-", " - ", "0", "-0", "+0", "0.00", "-0.00", ".5", "5.", ".", "-.", "+", "--5", "+-5",
+    "1,234.56", ",5", "5,", "1,,2", "1.2,3", "1.2.3", "1e5", "1E-3", "5KM", "5%K", "5K%", "5%%",
+    " 5 ", "5 K", "5 %", "1 000", "\t5\n", " 5", "−5", "٣", "５", "1.5k", "2m", "3b", "K", "%",
+    "9" * 400, "-" + "9" * 400, "0.005", "0.015", "2.675", "1.005K", "inf", "nan", "Infinity",
+    0, 0.0, 1.5, -2, True, False, [], ["5"], b"5",
+]
+
+
+def random_token(rnd):
+    """Случайный токен: в основном валидный, иногда испорченный."""
+    sign = rnd.choice(["", "", "", "-", "+"])
+    whole = str(rnd.randint(0, 10 ** rnd.randint(0, 9)))
+    if rnd.random() < 0.3 and len(whole) > 3:
+        whole = f"{int(whole):,}"
+    frac = "" if rnd.random() < 0.2 else "." + "".join(rnd.choice("0123456789") for _ in range(rnd.randint(0, 6)))
+    suffix = rnd.choice(["", "", "K", "M", "B", "k", "m", "b"])
+    pct = "%" if rnd.random() < 0.2 else ""
+    token = sign + whole + frac + suffix + pct
+    if rnd.random() < 0.1:
+        token = " " * rnd.randint(1, 2) + token + " " * rnd.randint(0, 2)
+    if rnd.random() < 0.1:
+        # Порча: вставка случайного символа
+        pos = rnd.randint(0, len(token))
+        token = token[:pos] + rnd.choice(".,-+ eE%KMBx_ ٣") + token[pos:]
+    return token
+
+
+def _bits(val):
+    return None if val is None else struct.pack("<d", val)
+
+
+def check_equivalence(n, seed=0):
+    """
+    Сверяет обе реализации на корпусе из n случайных токенов + EDGE_CASES.
+
+    Возвращает:
+        Список расхождений (token, fast, legacy)
+    """
+    rnd = random.Random(seed)
+    corpus = EDGE_CASES + [random_token(rnd) for _ in range(n)]
+    mismatches = []
+    # Предупреждения legacy о мусоре здесь ожидаемы, прячем их
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(2):  # второй проход - через кэш токенов
+            for token in corpus:
+                fast, legacy = parse_value_raw(token), parse_value_raw_legacy(token)
+                if _bits(fast) != _bits(legacy):
+                    mismatches.append((token, fast, legacy))
+    return mismatches
+
+
+def bench(fn, values, repeats=5):
+    """Лучшее время одного прохода по values (сек)."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for v in values:
+            fn(v)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(n=200_000, seed=0):
+    mismatches = check_equivalence(n, seed)
+    if mismatches:
+        for token, fast, legacy in mismatches[:20]:
+            print(f"[FAIL] {token!r}: fast={fast!r} legacy={legacy!r}")
+        print(f"[FAIL] {len(mismatches)} mismatches")
+        sys.exit(1)
+    print(f"[OK] {n + len(EDGE_CASES)} tokens identical bit-for-bit (cold and cached)")
+
+    blocks = generate_blocks(max(1, n // 120), seed=seed)
+    values = [v for b in blocks for v in VALUE_RE.findall(b.split("\n", 1)[1])]
+    parsing_engine._VALUE_CACHE.clear()
+    t_legacy = bench(parse_value_raw_legacy, values)
+    t_fast = bench(parse_value_raw, values)
+    print(f"[BENCH] legacy: {len(values) / t_legacy:12,.0f} values/sec")
+    print(f"[BENCH] fast:   {len(values) / t_fast:12,.0f} values/sec  (x{t_legacy / t_fast:.1f})")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    run(n, seed)
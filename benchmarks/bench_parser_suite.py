@@ -0,0 +1,250 @@
+"""
+Benchmark suite: пропускная способность и пиковая память парсинга с гейтом регрессий.
+
+Для каждой функции пути вставки (parse_value_raw, parse_raw_input,
+calculate_metrics, generate_xray, generate_composite, process_batch,
+parse_batch_with_labels) и каждого размера входа замеряет items/sec (лучший
+из repeats прогонов) и пик памяти через tracemalloc (отдельный прогон, чтобы
+трассировка не искажала время). Вход - synthetic_coinglass с фиксированным
+seed, поэтому прогоны на одной машине сравнимы.
+
+Результаты пишутся в JSON; если есть baseline, каждый замер сравнивается с
+ним: падение items/sec или рост пика памяти больше tolerance - регрессия,
+код возврата 1 (для CI / pre-commit).
+
+Запуск:
+    python benchmarks/bench_parser_suite.py                       # сравнить с baseline
+    python benchmarks/bench_parser_suite.py --sizes 100,1000,10000 --json out.json
+    python benchmarks/bench_parser_suite.py --update-baseline     # записать baseline
+    python benchmarks/bench_parser_suite.py --only parse_raw_input,process_batch --tolerance 0.1
+"""
+
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core.parsing_engine import parse_value_raw, parse_raw_input, calculate_metrics
+from core.report_generator import generate_xray, generate_composite
+from core.pipeline_processor import PipelineProcessor
+from core.batch_parser import parse_batch_with_labels
+from core.db_manager import DatabaseManager
+from benchmarks.bench_calculate_metrics import make_config
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.synthetic_coinglass import EXCHANGES, generate_blocks, generate_lab_text
+
+DEFAULT_SIZES = (100, 1000)
+DEFAULT_BASELINE = Path(__file__).parent / "parser_baseline.json"
+DEFAULT_TOLERANCE = 0.2
+MIN_SAMPLE_SEC = 0.05
+CANDLES_PER_SEGMENT = 12
+
+# Числа в тексте Coinglass: 2500.43 / -3.25M / 0.0128% / +499.10K
+VALUE_RE = re.compile(r"[+\-]?\d[\d,.]*[KMB%]?")
+
+
+# =============================================================================
+# ВХОДНЫЕ ДАННЫЕ
+# =============================================================================
+
+def _blocks(size, config):
+    """size блоков 5m по всем биржам + их raw и метрики."""
+    blocks = generate_blocks(max(1, size // len(EXCHANGES)))
+    raws = [parse_raw_input(b) for b in blocks]
+    metrics = [calculate_metrics(r, config) for r in raws]
+    return blocks, raws, metrics
+
+
+def _groups(metrics):
+    """Свечи одного ts с разных бирж - вход generate_composite."""
+    groups = defaultdict(list)
+    for m in metrics:
+        groups[(m.get("tf"), m.get("ts"))].append(m)
+    return list(groups.values())
+
+
+def build_cases(size, config):
+    """
+    Кейсы одного размера.
+
+    Аргументы:
+        size: Число свечей (для parse_value_raw - число значений)
+        config: Конфигурация в формате load_configurations()
+
+    Возвращает:
+        Список (name, unit, n_items, fn) - fn() выполняет один прогон
+    """
+    blocks, raws, metrics = _blocks(size, config)
+    text = "\n".join(blocks)
+    # Значения секций (без строки заголовка с датой и временем)
+    values = [v for b in blocks for v in VALUE_RE.findall(b.split("\n", 1)[1])][:size]
+    groups = _groups(metrics)
+    lab_text = generate_lab_text(max(1, size // CANDLES_PER_SEGMENT), CANDLES_PER_SEGMENT)
+    lab_candles = max(1, size // CANDLES_PER_SEGMENT) * CANDLES_PER_SEGMENT
+    processor = PipelineProcessor(DatabaseManager(FakeSupabase({"candles": []})), lambda: config)
+
+    return [
+        ("parse_value_raw", "values", len(values), lambda: [parse_value_raw(v) for v in values]),
+        ("parse_raw_input", "candles", len(blocks), lambda: [parse_raw_input(b) for b in blocks]),
+        ("calculate_metrics", "candles", len(raws), lambda: [calculate_metrics(r, config) for r in raws]),
+        ("generate_xray", "candles", len(metrics), lambda: [generate_xray(m) for m in metrics]),
+        ("generate_composite", "candles", len(metrics), lambda: [generate_composite(g) for g in groups]),
+        ("process_batch", "candles", len(blocks), lambda: processor.process_batch(text)),
+        ("parse_batch_with_labels", "candles", lab_candles,
+         lambda: parse_batch_with_labels(lab_text, config=config)),
+    ]
+
+
+# =============================================================================
+# ЗАМЕР
+# =============================================================================
+
+def measure(fn, n_items, repeats):
+    """
+    Время (лучший из repeats) и пик памяти одного прогона.
+    Короткие прогоны повторяются в цикле до MIN_SAMPLE_SEC на замер, иначе
+    шум таймера на малых размерах съедает tolerance.
+
+    Возвращает:
+        dict: items_per_sec, best_ms, peak_kb
+    """
+    t0 = time.perf_counter()
+    fn()
+    once = time.perf_counter() - t0
+    loops = max(1, int(MIN_SAMPLE_SEC / once)) if once > 0 else 1
+
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / loops)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "items_per_sec": n_items / best if best > 0 else float("inf"),
+        "best_ms": best * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, repeats=5, only=None):
+    """
+    Прогоняет все кейсы по всем размерам.
+
+    Возвращает:
+        dict: {"<name>@<size>": {name, size, unit, n, items_per_sec, best_ms, peak_kb}}
+    """
+    config = make_config()
+    results = {}
+    for size in sizes:
+        for name, unit, n_items, fn in build_cases(size, config):
+            if only and name not in only:
+                continue
+            res = {"name": name, "size": size, "unit": unit, "n": n_items, **measure(fn, n_items, repeats)}
+            results[f"{name}@{size}"] = res
+            print(f"[BENCH] {name:<24} size={size:<6} {res['items_per_sec']:12,.0f} {unit}/sec  "
+                  f"{res['best_ms']:9.2f} ms  peak {res['peak_kb']:9.1f} KB")
+    return results
+
+
+# =============================================================================
+# СРАВНЕНИЕ С BASELINE
+# =============================================================================
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Сравнивает замеры с baseline.
+
+    Аргументы:
+        results: Результат run()
+        baseline: Словарь results из сохранённого JSON
+        tolerance: Допустимое ухудшение (0.2 = 20%)
+
+    Возвращает:
+        Список строк-регрессий (пустой - всё в пределах tolerance)
+    """
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            print(f"[INFO] {key}: no baseline")
+            continue
+        speed = cur["items_per_sec"] / base["items_per_sec"] if base["items_per_sec"] else 1.0
+        mem = cur["peak_kb"] / base["peak_kb"] if base["peak_kb"] else 1.0
+        line = f"{key:<32} speed x{speed:5.2f}  peak x{mem:5.2f}"
+        if speed < 1 - tolerance or mem > 1 + tolerance:
+            print(f"[FAIL] {line}")
+            regressions.append(line)
+        else:
+            print(f"[OK] {line}")
+    return regressions
+
+
+def _meta(args):
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "repeats": args.repeats,
+        "sizes": args.sizes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parser throughput / memory suite")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", type=lambda s: set(s.split(",")), default=None,
+                        help="comma-separated case names")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write results as the new baseline instead of comparing")
+    args = parser.parse_args()
+
+    print(f"[INFO] sizes {args.sizes}, best of {args.repeats}, tolerance {args.tolerance:.0%}")
+    results = run(args.sizes, args.repeats, args.only)
+    payload = {"meta": _meta(args), "results": results}
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"[OK] results written to {args.json_path}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"[OK] baseline written to {args.baseline}")
+        sys.exit(0)
+
+    if not Path(args.baseline).exists():
+        print(f"[INFO] no baseline at {args.baseline} (run with --update-baseline)")
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("machine") != platform.machine():
+        print("[WARN] baseline recorded on a different machine, numbers may not be comparable")
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"[FAIL] {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1)
+    print("[OK] no regressions")
@@ -0,0 +1,105 @@
+"""
+Benchmark: DatabaseManager.save_candles_batch, число запросов на бэкфилл.
+
+Свечи пайплайна содержат поля, которых нет в таблице candles (parsed_ts,
+missing_fields, funding и т.д.). Без известной схемы каждое такое поле
+стоит отдельного PGRST204-ретрая с полной пересылкой батча; с кэшем схемы
+строки обрезаются до отправки, а батч уходит чанками по SAVE_CHUNK_SIZE.
+
+Запуск:
+    python benchmarks/bench_save_candles.py [candles] [latency_ms]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
+
+from core.db_manager import DatabaseManager, SAVE_CHUNK_SIZE
+from core.parsing_engine import calculate_metrics
+from core.report_generator import generate_xray
+from benchmarks.bench_fetch_and_merge import build_rows
+from benchmarks.bench_parse_raw_input import EXCHANGES
+from benchmarks.fake_supabase import FakeSupabase
+
+# Колонки таблицы candles (как в save_to_candles + служебные)
+CANDLES_SCHEMA = {
+    "id", "created_at", "ts", "symbol_clean", "raw_symbol", "exchange", "tf",
+    "open", "high", "low", "close", "volume", "buy_volume", "sell_volume",
+    "abv_delta", "abv_ratio", "buy_trades", "sell_trades", "trades_delta", "trades_ratio",
+    "oi_open", "oi_high", "oi_low", "oi_close", "liq_long", "liq_short",
+    "change_abs", "change_pct", "amplitude_abs", "amplitude_pct",
+    "cvd_pct", "cvd_sign", "cvd_small", "dtrades_pct", "ratio_stable",
+    "avg_trade_buy", "avg_trade_sell", "tilt_pct", "implied_price", "dpx",
+    "price_vs_delta", "doi_pct", "oipos", "oi_path", "oe", "liq_share_pct",
+    "limb_pct", "liq_squeeze", "porog_final", "r", "epsilon", "oi_in_sens",
+    "t_set_pct", "t_counter_pct", "t_unload_pct", "oi_set", "oi_counter", "oi_unload",
+    "r_strength", "dominant_reject", "price_sign", "range", "range_pct", "body_pct",
+    "clv_pct", "upper_tail_pct", "lower_tail_pct", "x_ray", "x_ray_composite",
+    "raw_data", "note", "report_diver",
+    "fr_open", "fr_high", "fr_low", "fr_close",
+    "agg_fr_open", "agg_fr_high", "agg_fr_low", "agg_fr_close", "basis",
+    "ls_ratio_open", "ls_ratio_high", "ls_ratio_low", "ls_ratio_close",
+    "net_longs_open", "net_longs_close", "net_longs_delta",
+    "net_shorts_open", "net_shorts_close", "net_shorts_delta",
+}
+
+
+def build_candles(n):
+    """n свечей после пайплайна (метрики + X-RAY)."""
+    per_exchange = n // (3 * len(EXCHANGES)) + 1
+    candles = []
+    for raw in build_rows(per_exchange)[:n]:
+        full = calculate_metrics(raw, {})
+        full['x_ray'] = generate_xray(full)
+        candles.append(full)
+    return candles
+
+
+def timed_save(client, candles):
+    db = DatabaseManager(client)
+    client.reset_stats()
+    t0 = time.perf_counter()
+    db.save_candles_batch(candles)
+    return time.perf_counter() - t0, client.requests, client.rows_sent
+
+
+def stored(client):
+    rows = client.tables["candles"]
+    return sorted(
+        ({k: v for k, v in r.items() if k not in ("id", "note")} for r in rows),
+        key=lambda r: (r["exchange"], r["tf"], r["ts"])
+    )
+
+
+def run(n=2000, latency_ms=20):
+    candles = build_candles(n)
+    schema = {"candles": CANDLES_SCHEMA}
+
+    # Схема неизвестна (пустая таблица): только PGRST204-ретраи
+    cold = FakeSupabase({"candles": []}, latency=latency_ms / 1000, schema=schema)
+    t_cold, req_cold, sent_cold = timed_save(cold, candles)
+
+    # Схема читается одной строкой из таблицы (после первого бэкфилла)
+    warm = FakeSupabase({"candles": [dict(r) for r in cold.tables["candles"][:1]]},
+                        latency=latency_ms / 1000, schema=schema)
+    t_warm, req_warm, sent_warm = timed_save(warm, candles)
+
+    if stored(cold) != stored(warm):
+        raise AssertionError("saved rows differ between cold and cached schema")
+
+    print(f"[INFO] {len(candles)} candles, chunk {SAVE_CHUNK_SIZE}, latency {latency_ms} ms")
+    print(f"[OK] stored rows identical")
+    print(f"[BENCH] unknown schema: {req_cold:3d} requests  {sent_cold:6d} rows sent  {t_cold * 1000:8.1f} ms")
+    print(f"[BENCH] cached schema:  {req_warm:3d} requests  {sent_warm:6d} rows sent  {t_warm * 1000:8.1f} ms")
+    return {"cold_requests": req_cold, "warm_requests": req_warm,
+            "cold_ms": t_cold * 1000, "warm_ms": t_warm * 1000}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    l = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run(n, l)
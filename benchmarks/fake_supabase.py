@@ -0,0 +1,386 @@
+"""
+In-memory stand-in for the Supabase client (postgrest query builder).
+
+Supports the subset the app uses: table / select / eq / neq / gt / gte /
+lt / lte / in_ / is_ / or_ / order / limit / range / insert / upsert /
+update / delete / execute. Every execute() is one "round trip": it is
+counted and optionally delayed by `latency` seconds plus `row_latency` per
+row sent or returned, so benchmarks can compare request counts and
+simulated network time without a real DB.
+
+    client = FakeSupabase({"candles": rows}, latency=0.02, schema={"candles": cols})
+    DatabaseManager(client).fetch_and_merge(batch)
+    print(client.requests, client.stats())
+"""
+
+import time
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    """Error raised like postgrest APIError (message carries the PostgREST text)."""
+
+
+# =============================================================================
+# ФИЛЬТРЫ
+# =============================================================================
+
+def _split_top(text, sep=","):
+    """Split by sep outside parentheses and double quotes."""
+    parts, depth, quoted, buf, i = [], 0, False, [], 0
+    while i < len(text):
+        ch = text[i]
+        if quoted:
+            if ch == "\\" and i + 1 < len(text):
+                buf.append(text[i + 1])
+                i += 2
+                continue
+            if ch == '"':
+                quoted = False
+            buf.append(ch)
+        elif ch == '"':
+            quoted = True
+            buf.append(ch)
+        elif ch == "(":
+            depth += 1
+            buf.append(ch)
+        elif ch == ")":
+            depth -= 1
+            buf.append(ch)
+        elif ch == sep and depth == 0:
+            parts.append("".join(buf))
+            buf = []
+        else:
+            buf.append(ch)
+        i += 1
+    if buf:
+        parts.append("".join(buf))
+    return parts
+
+
+def _unquote(val):
+    val = val.strip()
+    if len(val) >= 2 and val[0] == '"' and val[-1] == '"':
+        return val[1:-1]
+    return val
+
+
+def _coerce(row_val, val):
+    """Bring filter value (string) to the type of the stored value."""
+    if val is None or row_val is None:
+        return row_val, val
+    if isinstance(row_val, bool):
+        return row_val, str(val).lower() == "true"
+    if isinstance(row_val, (int, float)) and not isinstance(val, (int, float)):
+        try:
+            return row_val, float(val)
+        except ValueError:
+            return str(row_val), str(val)
+    if isinstance(row_val, str) and not isinstance(val, str):
+        return row_val, str(val)
+    return row_val, val
+
+
+def _compare(op, row_val, val):
+    if op == "is":
+        if str(val).lower() == "null" or val is None:
+            return row_val is None
+        return row_val is (str(val).lower() == "true")
+    if op == "in":
+        return any(_compare("eq", row_val, v) for v in val)
+    if row_val is None:
+        return False
+    a, b = _coerce(row_val, val)
+    if op == "eq":
+        return a == b
+    if op == "neq":
+        return a != b
+    if op == "gt":
+        return a > b
+    if op == "gte":
+        return a >= b
+    if op == "lt":
+        return a < b
+    if op == "lte":
+        return a <= b
+    raise FakeAPIError(f"unsupported operator {op}")
+
+
+def _parse_condition(text):
+    """'col.op.value' | 'and(...)' | 'or(...)' -> predicate(row)."""
+    text = text.strip()
+    for logic, combine in (("and(", all), ("or(", any)):
+        if text.startswith(logic) and text.endswith(")"):
+            preds = [_parse_condition(p) for p in _split_top(text[len(logic):-1])]
+            return lambda row, preds=preds, combine=combine: combine(p(row) for p in preds)
+
+    col, op, raw = text.split(".", 2)
+    negate = op == "not"
+    if negate:
+        op, raw = raw.split(".", 1)
+    if op == "in":
+        val = [_unquote(v) for v in _split_top(raw.strip()[1:-1])]
+        as_set = frozenset(val)
+
+        def pred_in(row, col=col, val=val, as_set=as_set, negate=negate):
+            row_val = row.get(col)
+            # Строки сравниваются напрямую по множеству, остальное - через _compare
+            res = row_val in as_set if isinstance(row_val, str) else _compare("in", row_val, val)
+            return not res if negate else res
+        return pred_in
+
+    val = _unquote(raw)
+
+    def pred(row, col=col, op=op, val=val, negate=negate):
+        res = _compare(op, row.get(col), val)
+        return not res if negate else res
+    return pred
+
+
+# =============================================================================
+# КЛИЕНТ
+# =============================================================================
+
+class FakeSupabase:
+    """Minimal in-memory Supabase client with request counting and latency."""
+
+    def __init__(self, tables=None, latency=0.0, schema=None, row_latency=0.0):
+        """
+        Аргументы:
+            tables: {"table": [row_dict, ...]} - начальные данные
+            latency: Задержка каждого execute() в секундах
+            row_latency: Доп. задержка на строку запроса/ответа (объём данных)
+            schema: {"table": set(columns)} - колонки таблиц; неизвестные
+                    колонки дают ошибки как у PostgREST (PGRST204 / 42703)
+        """
+        self.tables = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.latency = latency
+        self.row_latency = row_latency
+        self.schema = {name: set(cols) for name, cols in (schema or {}).items()}
+        self.requests = 0
+        self.rows_returned = 0
+        self.rows_sent = 0
+        self.log = []
+        self._next_id = 1 + max(
+            (r.get("id") or 0 for rows in self.tables.values() for r in rows
+             if isinstance(r.get("id"), int)),
+            default=0
+        )
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def reset_stats(self):
+        """Reset request counters/log."""
+        self.requests = 0
+        self.rows_returned = 0
+        self.rows_sent = 0
+        self.log = []
+
+    def stats(self):
+        """Counters as a plain dict; by_call: {"table.method": requests}."""
+        by_call = {}
+        for name, method in self.log:
+            key = f"{name}.{method}"
+            by_call[key] = by_call.get(key, 0) + 1
+        return {
+            "requests": self.requests,
+            "rows_returned": self.rows_returned,
+            "rows_sent": self.rows_sent,
+            "by_call": by_call
+        }
+
+    def _round_trip(self, name, method):
+        self.requests += 1
+        self.log.append((name, method))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _transfer(self, rows):
+        """Simulated payload time for rows sent or returned."""
+        if self.row_latency and rows:
+            time.sleep(self.row_latency * rows)
+
+    def _rows(self, name):
+        return self.tables.setdefault(name, [])
+
+    def _check_write_columns(self, name, rows):
+        cols = self.schema.get(name)
+        if not cols:
+            return
+        for row in rows:
+            for key in row:
+                if key not in cols:
+                    raise FakeAPIError(
+                        f"{{'code': 'PGRST204', 'message': \"Could not find the '{key}' column of '{name}' in the schema cache\"}}"
+                    )
+
+    def _check_read_columns(self, name, columns):
+        cols = self.schema.get(name)
+        if not cols or columns is None:
+            return
+        for col in columns:
+            if col not in cols:
+                raise FakeAPIError(
+                    f"{{'code': '42703', 'message': 'column {name}.{col} does not exist'}}"
+                )
+
+
+class FakeQuery:
+    """Chainable query builder; execute() applies it to the in-memory table."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.method = "select"
+        self.columns = None
+        self.filters = []
+        self.orders = []
+        self.limit_n = None
+        self.offset = 0
+        self.payload = None
+        self.on_conflict = None
+        self.count_mode = None
+
+    # --- операции ---
+    def select(self, columns="*", count=None):
+        self.method = "select"
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        self.columns = None if cols == ["*"] else cols
+        self.count_mode = count
+        return self
+
+    def insert(self, rows):
+        self.method = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self.method = "upsert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = [c.strip() for c in on_conflict.split(",")] if on_conflict else ["id"]
+        return self
+
+    def update(self, changes):
+        self.method = "update"
+        self.payload = changes
+        return self
+
+    def delete(self):
+        self.method = "delete"
+        return self
+
+    # --- фильтры ---
+    def _add(self, col, op, val):
+        self.filters.append(lambda row: _compare(op, row.get(col), val))
+        return self
+
+    def eq(self, col, val):
+        return self._add(col, "eq", val)
+
+    def neq(self, col, val):
+        return self._add(col, "neq", val)
+
+    def gt(self, col, val):
+        return self._add(col, "gt", val)
+
+    def gte(self, col, val):
+        return self._add(col, "gte", val)
+
+    def lt(self, col, val):
+        return self._add(col, "lt", val)
+
+    def lte(self, col, val):
+        return self._add(col, "lte", val)
+
+    def in_(self, col, values):
+        return self._add(col, "in", list(values))
+
+    def is_(self, col, val):
+        return self._add(col, "is", val)
+
+    def or_(self, filters):
+        preds = [_parse_condition(p) for p in _split_top(filters)]
+        self.filters.append(lambda row: any(p(row) for p in preds))
+        return self
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    # --- выполнение ---
+    def _match(self, row):
+        return all(f(row) for f in self.filters)
+
+    def execute(self):
+        client = self.client
+        client._round_trip(self.name, self.method)
+        rows = client._rows(self.name)
+
+        if self.method == "select":
+            client._check_read_columns(self.name, self.columns)
+            found = [r for r in rows if self._match(r)]
+            for col, desc in reversed(self.orders):
+                found.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+            total = len(found)
+            found = found[self.offset:]
+            if self.limit_n is not None:
+                found = found[:self.limit_n]
+            if self.columns is not None:
+                found = [{c: r.get(c) for c in self.columns} for r in found]
+            else:
+                found = [dict(r) for r in found]
+            client.rows_returned += len(found)
+            client._transfer(len(found))
+            return SimpleNamespace(data=found, count=total if self.count_mode else None)
+
+        if self.method in ("insert", "upsert"):
+            client.rows_sent += len(self.payload)
+            client._transfer(len(self.payload))
+            client._check_write_columns(self.name, self.payload)
+            out = []
+            keys = self.on_conflict or []
+            index = {tuple(r.get(k) for k in keys): r for r in rows} if self.method == "upsert" else {}
+            for new in self.payload:
+                target = index.get(tuple(new.get(k) for k in keys)) if self.method == "upsert" else None
+                if target is not None:
+                    target.update(new)
+                    out.append(dict(target))
+                else:
+                    row = dict(new)
+                    if row.get("id") is None:
+                        row["id"] = client._next_id
+                        client._next_id += 1
+                    rows.append(row)
+                    if self.method == "upsert":
+                        index[tuple(row.get(k) for k in keys)] = row
+                    out.append(dict(row))
+            return SimpleNamespace(data=out, count=None)
+
+        if self.method == "update":
+            client.rows_sent += 1
+            client._check_write_columns(self.name, [self.payload])
+            out = []
+            for r in rows:
+                if self._match(r):
+                    r.update(self.payload)
+                    out.append(dict(r))
+            return SimpleNamespace(data=out, count=None)
+
+        if self.method == "delete":
+            kept, out = [], []
+            for r in rows:
+                (out if self._match(r) else kept).append(r)
+            rows[:] = kept
+            return SimpleNamespace(data=[dict(r) for r in out], count=None)
+
+        raise FakeAPIError(f"unsupported method {self.method}")
@@ -0,0 +1,198 @@
+"""
+Генератор синтетических свечей в формате Coinglass для нагрузочных тестов.
+
+Цены - детерминированное (seed) случайное блуждание на каждый TF, общее для
+всех бирж (у бирж небольшой сдвиг цены и свои объёмы), поэтому блоки разных
+бирж с одним ts/TF проходят композитную проверку пайплайна. Каждый блок
+содержит заголовок, OHLC/V, Change, Amplitude, Basis, Active Buy/Sell Volume и
+Trades, Open Interest, Liquidation, Funding Rate, Aggregated Funding Rate,
+Long/Short Ratio, Net Longs/Shorts. Секции можно выборочно выбрасывать
+(missing_rate), а для Лаборатории - закрывать сегменты метками
+"Strong/Medium/Weak Up/Down".
+
+    from benchmarks.synthetic_coinglass import generate_text, generate_lab_text
+    text = generate_text(2880, tfs=("5m", "1h"))        # -> process_batch
+    lab = generate_lab_text(segments=500)                # -> parse_batch_with_labels
+
+Запуск (текст в stdout):
+    python benchmarks/synthetic_coinglass.py 288 --tfs 5m,1h --exchanges Binance,Bybit
+    python benchmarks/synthetic_coinglass.py 1000 --lab 12 > lab.txt
+"""
+
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+EXCHANGES = ("Binance", "Bybit", "OKX", "Bitget")
+LABELS = ("Strong Up", "Medium Down", "Weak Up", "Strong Down", "Medium Up", "Weak Down")
+TF_MINUTES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "4h": 240, "1d": 1440}
+
+# Секции, которые missing_rate может выбросить (OHLC и заголовок остаются всегда)
+OPTIONAL_SECTIONS = ("abv", "trades", "oi", "liq", "fr", "agg_fr", "ls", "net_longs", "net_shorts")
+
+
+def fmt_big(val):
+    """Число в стиле Coinglass: 1.23M / 45.6K / 789."""
+    sign = "-" if val < 0 else ""
+    val = abs(val)
+    for div, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if val >= div:
+            return f"{sign}{val / div:.2f}{suffix}"
+    return f"{sign}{val:.2f}"
+
+
+def _signed(val):
+    """fmt_big с явным '+' для положительных."""
+    out = fmt_big(val)
+    return out if out.startswith("-") else "+" + out
+
+
+def candle_block(ts, exchange, symbol, tf, rng, price, drop=()):
+    """
+    Один блок Coinglass.
+
+    Аргументы:
+        ts: datetime начала свечи
+        exchange, symbol, tf: Заголовок ("ETHUSDT" -> "ETHUSDT Perpetual")
+        rng: random.Random (объёмы, OI, funding)
+        price: (open, high, low, close)
+        drop: Ключи OPTIONAL_SECTIONS, которые не выводить
+    """
+    o, h, l, c = price
+    volume = rng.uniform(5e6, 60e6)
+    buy = volume * rng.uniform(0.4, 0.6)
+    sell = volume - buy
+    buy_tr = rng.uniform(20e3, 90e3)
+    sell_tr = buy_tr * rng.uniform(0.8, 1.2)
+    oi_o = rng.uniform(1.5e6, 2.5e6)
+    oi_c = oi_o * rng.uniform(0.97, 1.03)
+    oi_h = max(oi_o, oi_c) * rng.uniform(1.0, 1.01)
+    oi_l = min(oi_o, oi_c) * rng.uniform(0.99, 1.0)
+    fr = [rng.uniform(-0.01, 0.03) for _ in range(4)]
+    agg = [v * rng.uniform(0.8, 1.2) for v in fr]
+    ls = [rng.uniform(0.8, 1.6) for _ in range(4)]
+    nl_o, nl_c = rng.uniform(0.8e6, 1.5e6), rng.uniform(0.8e6, 1.5e6)
+    ns_o, ns_c = rng.uniform(0.8e6, 1.5e6), rng.uniform(0.8e6, 1.5e6)
+
+    lines = [
+        f"{ts.strftime('%d.%m.%Y %H:%M:%S')} {exchange} · {symbol} Perpetual · {tf}",
+        f"O {o:.2f} H {h:.2f} L {l:.2f} C {c:.2f} V {fmt_big(volume)}",
+        f"Change {c - o:+.2f} ({(c - o) / o * 100:+.2f}%)",
+        f"Amplitude {h - l:.2f} ({(h - l) / o * 100:.2f}%)",
+        f"Basis {rng.uniform(-1.5, 1.5):+.2f}",
+    ]
+    sections = {
+        "abv": ["Active Buy/Sell Volume",
+                f"Buy {fmt_big(buy)} Sell -{fmt_big(sell)} Delta {_signed(buy - sell)} Ratio {buy / sell:.2f}"],
+        "trades": ["Active Buy/Sell Trades",
+                   f"Buy {fmt_big(buy_tr)} Sell -{fmt_big(sell_tr)} Delta {_signed(buy_tr - sell_tr)} Ratio {buy_tr / sell_tr:.2f}"],
+        "oi": ["Open Interest",
+               f"O {fmt_big(oi_o)} H {fmt_big(oi_h)} L {fmt_big(oi_l)} C {fmt_big(oi_c)}"],
+        "liq": ["Liquidation",
+                f"Long {fmt_big(rng.uniform(0, 400e3))} Short -{fmt_big(rng.uniform(0, 400e3))}"],
+        "fr": ["Funding Rate",
+               f"O {fr[0]:.4f}% H {max(fr):.4f}% L {min(fr):.4f}% C {fr[3]:.4f}%"],
+        "agg_fr": ["Aggregated Funding Rate",
+                   f"O {agg[0]:.4f}% H {max(agg):.4f}% L {min(agg):.4f}% C {agg[3]:.4f}%"],
+        "ls": ["Long/Short Ratio",
+               f"O {ls[0]:.2f} H {max(ls):.2f} L {min(ls):.2f} C {ls[3]:.2f}"],
+        "net_longs": ["Net Longs",
+                      f"O {fmt_big(nl_o)} C {fmt_big(nl_c)} Δ {_signed(nl_c - nl_o)}"],
+        "net_shorts": ["Net Shorts",
+                       f"O {fmt_big(ns_o)} C {fmt_big(ns_c)} Δ {_signed(ns_c - ns_o)}"],
+    }
+    for key in OPTIONAL_SECTIONS:
+        if key not in drop:
+            lines.extend(sections[key])
+    return "\n".join(lines) + "\n"
+
+
+def _price_path(n, rng, start_price, step_pct):
+    """n свечей (o, h, l, c) случайного блуждания."""
+    path = []
+    close = start_price
+    for _ in range(n):
+        o = close
+        c = o * (1 + rng.gauss(0, step_pct))
+        h = max(o, c) * (1 + abs(rng.gauss(0, step_pct / 2)))
+        l = min(o, c) * (1 - abs(rng.gauss(0, step_pct / 2)))
+        path.append((o, h, l, c))
+        close = c
+    return path
+
+
+def generate_blocks(n_candles, exchanges=EXCHANGES, tfs=("5m",), symbol="ETHUSDT",
+                    start=datetime(2025, 6, 13), start_price=2500.0, missing_rate=0.0, seed=0):
+    """
+    Блоки Coinglass: n_candles свечей на каждую пару (биржа, TF).
+    Порядок: TF -> время -> биржа (как при вставке нескольких бирж подряд).
+
+    Аргументы:
+        n_candles: Свечей на биржу и TF
+        exchanges, tfs: Биржи и таймфреймы (ключи TF_MINUTES)
+        symbol: Символ в заголовке
+        start: Время первой свечи
+        start_price: Начальная цена блуждания
+        missing_rate: Вероятность выбросить каждую необязательную секцию
+        seed: Seed генератора (одинаковые аргументы -> одинаковый текст)
+
+    Возвращает:
+        Список строк-блоков
+    """
+    rng = random.Random(seed)
+    blocks = []
+    for tf in tfs:
+        minutes = TF_MINUTES[tf]
+        step_pct = 0.001 * (minutes ** 0.5)
+        path = _price_path(n_candles, rng, start_price, step_pct)
+        offsets = {ex: 1 + rng.uniform(-0.0005, 0.0005) for ex in exchanges}
+        for i, (o, h, l, c) in enumerate(path):
+            ts = start + timedelta(minutes=minutes * i)
+            for ex in exchanges:
+                k = offsets[ex]
+                drop = [s for s in OPTIONAL_SECTIONS if missing_rate and rng.random() < missing_rate]
+                blocks.append(candle_block(ts, ex, symbol, tf, rng, (o * k, h * k, l * k, c * k), drop))
+    return blocks
+
+
+def generate_text(n_candles, **kwargs):
+    """Один текст для process_batch / stream_batch (аргументы как у generate_blocks)."""
+    return "\n".join(generate_blocks(n_candles, **kwargs))
+
+
+def generate_lab_text(segments=100, candles_per_segment=12, exchange="Binance", tf="5m",
+                      labels=LABELS, seed=0, **kwargs):
+    """
+    Вставка Лаборатории: segments сегментов по candles_per_segment свечей одной
+    биржи, каждый закрыт меткой из labels (по кругу) для parse_batch_with_labels.
+    """
+    blocks = generate_blocks(segments * candles_per_segment, exchanges=(exchange,), tfs=(tf,),
+                             seed=seed, **kwargs)
+    parts = []
+    for i in range(segments):
+        parts.extend(blocks[i * candles_per_segment:(i + 1) * candles_per_segment])
+        parts.append(labels[i % len(labels)] + "\n")
+    return "\n".join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic Coinglass candle text")
+    parser.add_argument("candles", type=int, help="candles per exchange and TF (Lab: segments)")
+    parser.add_argument("--tfs", default="5m")
+    parser.add_argument("--exchanges", default=",".join(EXCHANGES))
+    parser.add_argument("--symbol", default="ETHUSDT")
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lab", type=int, default=0, metavar="N",
+                        help="Lab paste: 'candles' segments of N candles with labels")
+    args = parser.parse_args()
+
+    if args.lab:
+        text = generate_lab_text(args.candles, args.lab, exchange=args.exchanges.split(",")[0],
+                                 tf=args.tfs.split(",")[0], symbol=args.symbol,
+                                 missing_rate=args.missing_rate, seed=args.seed)
+    else:
+        text = generate_text(args.candles, exchanges=args.exchanges.split(","), tfs=args.tfs.split(","),
+                             symbol=args.symbol, missing_rate=args.missing_rate, seed=args.seed)
+    sys.stdout.write(text)
@@ -2,6 +2,7 @@ import re
 import math
 from datetime import datetime
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from core.parsing_engine import parse_raw_input, calculate_metrics
 from core.report_generator import generate_full_report
 
@@ -249,6 +250,15 @@ def save_to_candles(supabase, candles_list):
         except Exception as e:
             print(f"Candle Save Error: {e}")
             raise e
+        
+        # Symbol catalog, local mirror and read cache of the app (same client).
+        # Imported here: pool workers import this module and never save
+        from core.db_manager import DatabaseManager
+        db = DatabaseManager(supabase)
+        db.register_catalog(data_for_upsert)
+        if db.mirror is not None:
+            db.mirror.apply_rows(res.data)
+        db.cache.invalidate_rows(data_for_upsert)
             
     return count
 
@@ -309,8 +319,115 @@ def save_to_segments(supabase, segments_list):
     return count
 
 # --- 5. BATCH PARSER WITH LABELS (Original Function) ---
-def parse_batch_with_labels(full_text, config=None):
-    # ... (Same as before)
+
+# Below this many labelled segments the pool start-up costs more than it saves
+PARALLEL_MIN_SEGMENTS = 8
+
+# Config shipped once per worker process (see _init_segment_worker)
+_WORKER_CONFIG = None
+
+def _parse_segment(chunk_text, strength, direction, config):
+    """
+    Parses the candles of one labelled segment.
+    Top-level (picklable) so it can run inside a worker process.
+    Returns (segment_obj or None, candles, warnings) - warnings in the same
+    order the serial loop used to emit them.
+    """
+    warnings = []
+
+    # Corrected Split Regex (by Timestamp)
+    # Support single-digit hour (e.g. 0:00:00, 4:00:00)
+    raw_candles = re.split(r'(?m)^(?=\d{2}\.\d{2}\.\d{4}\s+\d{1,2}:\d{2}:\d{2})', chunk_text)
+    raw_candles = [c.strip() for c in raw_candles if c.strip()]
+    
+    parsed_segment_candles = []
+    
+    for rc in raw_candles:
+        base = parse_raw_input(rc)
+        if not base.get('open'): 
+            if len(rc) > 20: warnings.append(f"Failed to parse candle: {rc[:50]}...")
+            continue
+        
+        full = calculate_metrics(base, config)
+        # Need to generate X-Ray for consistency if saving to 'candles'
+        # Attempt to generate X-Ray for ALL candles (safe wrapper)
+        try:
+            full['x_ray'] = generate_full_report(full) if full else None
+        except Exception as e:
+            # Log warning but don't crash
+            print(f"Warning: Failed to generate x_ray: {e}") 
+            full['x_ray'] = None
+        
+        parsed_segment_candles.append(full)
+    
+    if not parsed_segment_candles:
+        warnings.append(f"Label {strength} {direction} had valid text but no valid candles parsed.")
+        return None, [], warnings
+
+    # Safe sort: Handle None if strict parsing failed to avoid crash
+    parsed_segment_candles.sort(key=lambda x: (x.get('ts') or ''))
+    
+    # Use Tuple Return (Variant A)
+    stats, stats_warnings = calculate_stats_agg(parsed_segment_candles)
+    
+    # Extend main warnings cleanly
+    if stats_warnings:
+        warnings.extend(stats_warnings)
+
+    first = parsed_segment_candles[0]
+    meta = {
+        "symbol": first.get('symbol_clean'), 
+        "tf": first.get('tf'),
+        "exchange": first.get('exchange'),
+        "total_candles": len(parsed_segment_candles),
+        "impulse_split_index": len(parsed_segment_candles) - 1
+    }
+    
+    segment_obj = {
+        "META": meta,
+        "CONTEXT": {
+            "STATS": stats,
+            "DATA": parsed_segment_candles
+        },
+        "IMPULSE": {
+            "y_dir": direction,
+            "y_size": strength
+        }
+    }
+    return segment_obj, parsed_segment_candles, warnings
+
+def _init_segment_worker(config):
+    """Pool initializer: keeps config in the worker instead of pickling it per task."""
+    global _WORKER_CONFIG
+    _WORKER_CONFIG = config
+
+def _parse_segment_job(job):
+    """Worker entry point: job = (chunk_text, strength, direction)."""
+    return _parse_segment(*job, _WORKER_CONFIG)
+
+def _run_segment_jobs(jobs, config, workers):
+    """
+    Runs _parse_segment over jobs, serially or on a process pool.
+    Results always come back in job order, so output does not depend on workers.
+    """
+    if not workers or workers <= 1 or len(jobs) < PARALLEL_MIN_SEGMENTS:
+        return [_parse_segment(*job, config) for job in jobs]
+
+    workers = min(workers, len(jobs))
+    # A few jobs per round trip: segments are small, IPC overhead is not
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_segment_worker,
+                             initargs=(config,)) as pool:
+        return list(pool.map(_parse_segment_job, jobs, chunksize=chunksize))
+
+def parse_batch_with_labels(full_text, config=None, workers=None):
+    """
+    Splits a Lab paste by labels and parses every segment.
+    workers > 1 fans segments out to a process pool (used only when there are
+    at least PARALLEL_MIN_SEGMENTS segments); segments, candles and warnings
+    are identical to the serial path and in the same order.
+    """
     segments = []
     all_candles = []
     warnings = []
@@ -344,6 +461,10 @@ def parse_batch_with_labels(full_text, config=None):
     labels_iter = list(re.finditer(LABEL_REGEX, full_text, re.IGNORECASE))
     current_pos = 0
     
+    # Per label: either a ready warning (str) or the index of its parse job
+    jobs = []
+    order = []
+    
     for match in labels_iter:
         label_start = match.start()
         label_end = match.end()
@@ -355,70 +476,25 @@ def parse_batch_with_labels(full_text, config=None):
         chunk_text = full_text[current_pos:label_start].strip()
         
         if not chunk_text:
-            warnings.append(f"Label {strength} {direction} at char {label_start} has no preceding candles.")
+            order.append(f"Label {strength} {direction} at char {label_start} has no preceding candles.")
         else:
-            # Corrected Split Regex (by Timestamp)
-            # Support single-digit hour (e.g. 0:00:00, 4:00:00)
-            raw_candles = re.split(r'(?m)^(?=\d{2}\.\d{2}\.\d{4}\s+\d{1,2}:\d{2}:\d{2})', chunk_text)
-            raw_candles = [c.strip() for c in raw_candles if c.strip()]
-            
-            parsed_segment_candles = []
-            
-            for rc in raw_candles:
-                base = parse_raw_input(rc)
-                if not base.get('open'): 
-                    if len(rc) > 20: warnings.append(f"Failed to parse candle: {rc[:50]}...")
-                    continue
-                
-                full = calculate_metrics(base, config)
-                # Need to generate X-Ray for consistency if saving to 'candles'
-                # Attempt to generate X-Ray for ALL candles (safe wrapper)
-                try:
-                    full['x_ray'] = generate_full_report(full) if full else None
-                except Exception as e:
-                    # Log warning but don't crash
-                    print(f"Warning: Failed to generate x_ray: {e}") 
-                    full['x_ray'] = None
-                
-                parsed_segment_candles.append(full)
-            
-            if parsed_segment_candles:
-                # Safe sort: Handle None if strict parsing failed to avoid crash
-                parsed_segment_candles.sort(key=lambda x: (x.get('ts') or ''))
-                all_candles.extend(parsed_segment_candles)
-                
-                # Use Tuple Return (Variant A)
-                stats, stats_warnings = calculate_stats_agg(parsed_segment_candles)
-                
-                # Extend main warnings cleanly
-                if stats_warnings:
-                    warnings.extend(stats_warnings)
-
-                first = parsed_segment_candles[0]
-                meta = {
-                    "symbol": first.get('symbol_clean'), 
-                    "tf": first.get('tf'),
-                    "exchange": first.get('exchange'),
-                    "total_candles": len(parsed_segment_candles),
-                    "impulse_split_index": len(parsed_segment_candles) - 1
-                }
-                
-                segment_obj = {
-                    "META": meta,
-                    "CONTEXT": {
-                        "STATS": stats,
-                        "DATA": parsed_segment_candles
-                    },
-                    "IMPULSE": {
-                        "y_dir": direction,
-                        "y_size": strength
-                    }
-                }
-                segments.append(segment_obj)
-            else:
-                warnings.append(f"Label {strength} {direction} had valid text but no valid candles parsed.")
+            order.append(len(jobs))
+            jobs.append((chunk_text, strength, direction))
         
         current_pos = label_end
+    
+    results = _run_segment_jobs(jobs, config, workers)
+    
+    # Reassemble in label order
+    for item in order:
+        if isinstance(item, str):
+            warnings.append(item)
+            continue
+        segment_obj, parsed_segment_candles, seg_warnings = results[item]
+        if segment_obj is not None:
+            all_candles.extend(parsed_segment_candles)
+            segments.append(segment_obj)
+        warnings.extend(seg_warnings)
         
     tail_text = full_text[current_pos:].strip()
     if tail_text:
@@ -1,21 +1,145 @@
 """Database Manager Module - CRUD operations for candles table."""
 
+import atexit
+import os
 import re
+import threading
+import weakref
 import pandas as pd
 from datetime import datetime, time
+from time import monotonic, perf_counter
+
+from core.local_mirror import DEFAULT_SPOOL_PATH, WriteSpool
+from core.query_cache import QueryCache, QueryScope
+
+
+# Raw candle columns: everything parse_raw_input produces (+ id). Enough to
+# rerun calculate_metrics. fetch_and_merge also needs note/composite/raw text;
+# derived metrics and x_ray are recomputed by calculate_metrics / generate_xray.
+RAW_COLUMNS = [
+    'id', 'ts', 'exchange', 'symbol_clean', 'raw_symbol', 'tf',
+    'open', 'high', 'low', 'close', 'volume',
+    'buy_volume', 'sell_volume', 'abv_delta', 'abv_ratio',
+    'buy_trades', 'sell_trades', 'trades_delta', 'trades_ratio',
+    'oi_open', 'oi_high', 'oi_low', 'oi_close',
+    'liq_long', 'liq_short',
+    'change_abs', 'change_pct', 'amplitude_abs', 'amplitude_pct',
+    'fr_open', 'fr_high', 'fr_low', 'fr_close',
+    'agg_fr_open', 'agg_fr_high', 'agg_fr_low', 'agg_fr_close',
+    'basis',
+    'ls_ratio_open', 'ls_ratio_high', 'ls_ratio_low', 'ls_ratio_close',
+    'net_longs_open', 'net_longs_close', 'net_longs_delta',
+    'net_shorts_open', 'net_shorts_close', 'net_shorts_delta'
+]
+MERGE_COLUMNS = RAW_COLUMNS + ['note', 'x_ray_composite', 'raw_data']
+
+# Max timestamps per batched fetch_and_merge request (keeps the URL bounded)
+FETCH_MERGE_MAX_KEYS = 200
+
+# Rows per page for iter_candles (Supabase caps responses at 1000 rows by default)
+CANDLES_PAGE_SIZE = 1000
+
+# Rows per upsert request in save_candles_batch (bounded request size)
+SAVE_CHUNK_SIZE = 500
+
+# Ids per in.(...) filter in bulk update/delete (UUIDs: ~8 KB of URL)
+ID_CHUNK_SIZE = 200
+
+# Column sets per client and table, shared by all DatabaseManager instances
+# (a new instance is created on every Streamlit rerun): {client: {table: set}}
+_TABLE_COLUMNS = weakref.WeakKeyDictionary()
+
+# Read cache per client: DatabaseManager is rebuilt on every Streamlit rerun
+_QUERY_CACHES = weakref.WeakKeyDictionary()
+
+# LocalMirror per client, so managers built without one (batch_parser) still update it
+_MIRRORS = weakref.WeakKeyDictionary()
+
+# Distinct (exchange, symbol_clean, tf) of candles, kept up to date on write
+CATALOG_TABLE = 'candle_catalog'
+CATALOG_KEY = ('exchange', 'symbol_clean', 'tf')
+
+# Catalog keys already registered per client; None - catalog table missing
+_CATALOG_KEYS = weakref.WeakKeyDictionary()
+
+# Marker row the catalog backfill (README) writes last: until it is there the
+# table may be partly filled and get_unique_symbols keeps scanning candles
+CATALOG_BACKFILLED = ('*', '*', '*')
+
+# Write-behind queue per client (see CandleWriteQueue)
+_WRITE_QUEUES = weakref.WeakKeyDictionary()
+_WRITE_QUEUES_LOCK = threading.Lock()
+
+# Upsert key of candles; rows with the same key are coalesced in the queue
+CANDLE_KEY = ('exchange', 'symbol_clean', 'tf', 'ts')
+
+# SQLSTATE classes retried as an outage, not as a bad row: connection,
+# transaction rollback (deadlock / serialization), resources, operator intervention
+_TRANSIENT_SQLSTATE = ('08', '40', '53', '57')
+
+
+def _is_transient(error):
+    """
+    True for failures of the request itself (network, timeouts, HTTP 5xx/429,
+    PostgREST connection errors) rather than of the rows in it.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if any(s in type(error).__name__ for s in ('Timeout', 'Connect', 'Network', 'Protocol')):
+        return True
+    code = str(getattr(error, 'code', None) or '')
+    if len(code) == 3 and code.isdigit():
+        return code[0] == '5' or code == '429'
+    if len(code) == 5 and code[:2] in _TRANSIENT_SQLSTATE:
+        return True
+    return code.startswith('PGRST00')
+
+
+def _is_missing_table(error):
+    """True if the error says the table itself does not exist (42P01 / PGRST205)."""
+    code = str(getattr(error, 'code', None) or '')
+    if code in ('42P01', 'PGRST205'):
+        return True
+    return re.search(r'relation "[\w.]+" does not exist|Could not find the table', str(error)) is not None
+
+
+def _pgrst_quote(val):
+    """Quote a value for PostgREST or=/in. filters (values contain ':' '.' ',')."""
+    s = str(val).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{s}"'
 
 
 class DatabaseManager:
     """Manages database operations for candles table."""
     
-    def __init__(self, supabase_client):
-        """Initialize with Supabase client instance."""
+    def __init__(self, supabase_client, mirror=None, cache=None):
+        """
+        Initialize with Supabase client instance.
+        
+        Args:
+            supabase_client: Supabase client
+            mirror: Optional LocalMirror; once synced, load_candles,
+                    iter_candles and get_unique_symbols read from it and
+                    writes made here are applied to it as well. It is
+                    remembered for the client: later managers of the same
+                    client get it by default
+            cache: QueryCache for load_candles / load_candles_paged /
+                   get_unique_symbols (default: one shared per client)
+        """
         self.supabase = supabase_client
+        if mirror is not None:
+            _MIRRORS[supabase_client] = mirror
+        self.mirror = mirror if mirror is not None else _MIRRORS.get(supabase_client)
+        self.cache = cache if cache is not None else _QUERY_CACHES.setdefault(supabase_client, QueryCache())
+        # Projected columns the table turned out not to have
+        self._missing_columns = set()
     
     def save_candles_batch(self, candles_data):
         """
         Save batch of candles to database with upsert.
-        Handles missing columns automatically.
+        Rows are projected to the cached 'candles' column set before the first
+        request and sent in chunks of SAVE_CHUNK_SIZE. If the schema is unknown
+        or stale, missing columns are still handled by the PGRST204 retry.
         """
         if not candles_data:
             return True
@@ -30,19 +154,42 @@ class DatabaseManager:
             # Remove 'id' to prevent "null value in column id" error during mixed batch upserts
             row.pop('id', None)
         
+        # Project to known columns: no round trips spent discovering them
+        known = self.get_table_columns('candles')
+        if known:
+            for row in current_data:
+                for key in [k for k in row if k not in known]:
+                    del row[key]
+        
+        dropped_columns = []
+        for i in range(0, len(current_data), SAVE_CHUNK_SIZE):
+            self._upsert_candles(current_data[i:i + SAVE_CHUNK_SIZE], dropped_columns)
+        
+        self.register_catalog(current_data)
+        return True
+    
+    def _upsert_candles(self, chunk, dropped_columns):
+        """Upsert one chunk; drop columns reported missing (PGRST204) and retry."""
+        # Columns already rejected for earlier chunks
+        for row in chunk:
+            for col in dropped_columns:
+                row.pop(col, None)
+        
         # Attempt loop
         attempt = 0
         max_attempts = 20  # Enough for many missing metrics
-        dropped_columns = []
         
         while attempt < max_attempts:
             try:
                 # Upsert WITHOUT ignore_duplicates to allow UPDATES
                 res = self.supabase.table('candles').upsert(
-                    current_data,
+                    chunk,
                     on_conflict='exchange,symbol_clean,tf,ts'
                 ).execute()
                 
+                if self.mirror is not None:
+                    self.mirror.apply_rows(res.data)
+                self.cache.invalidate_rows(chunk)
                 return True
             except Exception as e:
                 err_str = str(e)
@@ -52,8 +199,12 @@ class DatabaseManager:
                     bad_col = match.group(1)
                     if bad_col not in dropped_columns:
                         dropped_columns.append(bad_col)
+                        # Stale schema cache: forget the column
+                        known = self.get_table_columns('candles', fetch=False)
+                        if known:
+                            known.discard(bad_col)
                         # Remove this column from all rows
-                        for row in current_data:
+                        for row in chunk:
                             row.pop(bad_col, None)
                     else:
                         # Loop detected
@@ -65,11 +216,189 @@ class DatabaseManager:
         
         raise Exception("Failed to save after max attempts removing columns")
     
+    def write_queue(self):
+        """
+        Shared CandleWriteQueue of this client (started on first use), spooled
+        to the mirror file or to CANDLES_WRITE_SPOOL_PATH / DEFAULT_SPOOL_PATH.
+        """
+        with _WRITE_QUEUES_LOCK:
+            queue = _WRITE_QUEUES.get(self.supabase)
+            if queue is None:
+                if self.mirror is not None:
+                    spool = self.mirror.write_spool()
+                else:
+                    spool = WriteSpool(os.getenv("CANDLES_WRITE_SPOOL_PATH", DEFAULT_SPOOL_PATH))
+                queue = CandleWriteQueue(self, spool=spool)
+                _WRITE_QUEUES[self.supabase] = queue
+        return queue
+    
+    def save_candles_async(self, candles_data):
+        """
+        Queue candles for save_candles_batch in the background and return at once
+        (rows are in the durable spool, not yet in Supabase).
+        Returns the queue depth after submitting.
+        """
+        return self.write_queue().submit(candles_data)
+    
+    def register_catalog(self, rows):
+        """
+        Add the (exchange, symbol_clean, tf) keys of written candles to
+        CATALOG_TABLE. Keys already registered by this process cost no request.
+        A missing catalog table disables registration (reads fall back to
+        candles); other failures only skip this call, and its keys are sent
+        again with the next write.
+        Returns the number of new keys sent.
+        """
+        known = _CATALOG_KEYS.setdefault(self.supabase, set())
+        if known is None:
+            return 0
+        
+        new_keys = {tuple(r.get(k) for k in CATALOG_KEY) for r in rows}
+        new_keys = {k for k in new_keys if all(k) and k not in known}
+        if not new_keys:
+            return 0
+        
+        try:
+            self.supabase.table(CATALOG_TABLE).upsert(
+                [dict(zip(CATALOG_KEY, k)) for k in sorted(new_keys)],
+                on_conflict=','.join(CATALOG_KEY),
+                ignore_duplicates=True
+            ).execute()
+        except Exception as e:
+            self._catalog_failed("update", e)
+            return 0
+        
+        known.update(new_keys)
+        return len(new_keys)
+    
+    def get_catalog(self):
+        """
+        Rows of CATALOG_TABLE (exchange, symbol_clean, tf) or None if the
+        table is missing, has no CATALOG_BACKFILLED marker yet (not fully
+        backfilled) or could not be read this time.
+        """
+        if _CATALOG_KEYS.get(self.supabase, set()) is None:
+            return None
+        try:
+            res = self.supabase.table(CATALOG_TABLE).select(','.join(CATALOG_KEY)).execute()
+        except Exception as e:
+            self._catalog_failed("read", e)
+            return None
+        keys = [tuple(r.get(k) for k in CATALOG_KEY) for r in res.data or []]
+        if CATALOG_BACKFILLED not in keys:
+            return None
+        known = _CATALOG_KEYS.setdefault(self.supabase, set())
+        if known is not None:
+            known.update(keys)
+        return [row for row, key in zip(res.data, keys) if key != CATALOG_BACKFILLED]
+    
+    def _catalog_failed(self, action, error):
+        """Log a catalog error; only a missing table disables the catalog."""
+        if _is_missing_table(error):
+            print(f"Catalog table missing, using candles scan: {error}")
+            _CATALOG_KEYS[self.supabase] = None
+        else:
+            print(f"Catalog {action} failed, using candles scan for now: {error}")
+    
+    def _catalog_keys_of(self, ids):
+        """Catalog keys of candles by id (one narrow select per ID_CHUNK_SIZE ids)."""
+        if _CATALOG_KEYS.get(self.supabase, set()) is None:
+            return set()
+        ids = list(ids)
+        keys = set()
+        for i in range(0, len(ids), ID_CHUNK_SIZE):
+            res = self.supabase.table('candles').select(','.join(CATALOG_KEY))\
+                .in_('id', ids[i:i + ID_CHUNK_SIZE]).execute()
+            keys.update(tuple(r.get(k) for k in CATALOG_KEY) for r in res.data or [])
+        return {k for k in keys if all(k)}
+    
+    def prune_catalog(self, keys):
+        """
+        Remove catalog keys that no candle has any more (after deletes or
+        edits of exchange / symbol_clean / tf). One existence check per key.
+        Returns the number of keys removed.
+        """
+        known = _CATALOG_KEYS.get(self.supabase, set())
+        if known is None or not keys:
+            return 0
+        removed = 0
+        for key in sorted(k for k in keys if k != CATALOG_BACKFILLED):
+            try:
+                query = self.supabase.table('candles').select('id')
+                for col, val in zip(CATALOG_KEY, key):
+                    query = query.eq(col, val)
+                if query.limit(1).execute().data:
+                    continue
+                query = self.supabase.table(CATALOG_TABLE).delete()
+                for col, val in zip(CATALOG_KEY, key):
+                    query = query.eq(col, val)
+                query.execute()
+            except Exception as e:
+                self._catalog_failed("prune", e)
+                return removed
+            known.discard(key)
+            removed += 1
+        return removed
+    
+    def get_table_columns(self, table='candles', refresh=False, fetch=True):
+        """
+        Column set of a table, read once per client and cached for the process.
+        Read as the keys of one row, so an empty table gives None (unknown).
+        
+        Args:
+            table: Table name
+            refresh: Re-read even if cached
+            fetch: False - only return what is cached (no request)
+        """
+        cache = _TABLE_COLUMNS.setdefault(self.supabase, {})
+        if (refresh or table not in cache) and fetch:
+            try:
+                res = self.supabase.table(table).select("*").limit(1).execute()
+            except Exception as e:
+                print(f"Schema read failed for '{table}': {e}")
+                return cache.get(table)
+            if not res.data:
+                return cache.get(table)
+            cache[table] = set(res.data[0].keys())
+        return cache.get(table)
+    
+    def refresh_schema(self, table='candles'):
+        """Re-read the column set of a table (after migrations)."""
+        return self.get_table_columns(table, refresh=True)
+    
+    def _use_mirror(self):
+        """True if reads can be served by the local mirror."""
+        return self.mirror is not None and self.mirror.is_ready()
+    
+    def cache_stats(self):
+        """Read cache counters (hits, misses, hit_rate, ...)."""
+        return self.cache.stats()
+    
+    @staticmethod
+    def _rows_scope(df, start_date, end_date, tfs, symbols):
+        """QueryScope of a candles DataFrame loaded with these filters."""
+        ids = df['id'].tolist() if 'id' in df.columns else ()
+        return QueryScope(start_date, end_date, tfs, symbols, ids=ids)
+    
     def load_candles(self, limit=100, start_date=None, end_date=None, tfs=None, symbols=None):
         """
         Load candles from database with optional filters.
-        Returns pandas DataFrame.
+        Returns pandas DataFrame (served from the read cache when fresh).
         """
+        key = ('load_candles', limit, start_date, end_date,
+               tuple(sorted(tfs or [])), tuple(sorted(symbols or [])))
+        return self.cache.get_or_load(
+            key,
+            lambda: self._load_candles(limit, start_date, end_date, tfs, symbols),
+            lambda df: self._rows_scope(df, start_date, end_date, tfs, symbols)
+        )
+    
+    def _load_candles(self, limit, start_date, end_date, tfs, symbols):
+        """Uncached load_candles."""
+        if self._use_mirror():
+            return self.mirror.load_candles(limit=limit, start_date=start_date, end_date=end_date,
+                                            tfs=tfs, symbols=symbols)
+        
         query = self.supabase.table('candles').select("*").order('ts', desc=True)
         
         if start_date:
@@ -90,8 +419,125 @@ class DatabaseManager:
         res = query.limit(limit).execute()
         return pd.DataFrame(res.data) if res.data else pd.DataFrame()
     
+    def iter_candles(self, columns=None, start_date=None, end_date=None, tfs=None, symbols=None,
+                     page_size=CANDLES_PAGE_SIZE, limit=None, descending=False):
+        """
+        Keyset-paginated candle loader: yields one DataFrame per page.
+        
+        Walks (ts, id) with a cursor instead of offsets, so pages stay cheap at
+        any depth and no request hits the PostgREST row cap. Filters match
+        load_candles; columns=None selects "*", otherwise only the listed
+        columns (ts and id are always fetched for the cursor).
+        
+        Args:
+            columns: Column list or None for "*"
+            start_date, end_date, tfs, symbols: Same filters as load_candles
+            page_size: Rows per request
+            limit: Max rows in total (None - no limit)
+            descending: Newest first (like load_candles)
+        """
+        if columns is not None:
+            columns = list(dict.fromkeys(['id', 'ts'] + list(columns)))
+        
+        if self._use_mirror():
+            df = self.mirror.query(columns=columns, start_date=start_date, end_date=end_date,
+                                   tfs=tfs, symbols=symbols, limit=limit, descending=descending)
+            for i in range(0, len(df), page_size):
+                yield df.iloc[i:i + page_size].reset_index(drop=True)
+            return
+        
+        if columns is None:
+            columns = ['*']
+        
+        def apply_filters(query):
+            if start_date:
+                query = query.gte('ts', start_date.isoformat())
+            if end_date:
+                # End date inclusive (until end of day)
+                end_dt = datetime.combine(end_date, time(23, 59, 59))
+                query = query.lte('ts', end_dt.isoformat())
+            if tfs and len(tfs) > 0:
+                # Case-insensitive filter hack: add both cases
+                tfs_extended = list(set(tfs + [t.upper() for t in tfs] + [t.lower() for t in tfs]))
+                query = query.in_('tf', tfs_extended)
+            if symbols and len(symbols) > 0:
+                query = query.in_('symbol_clean', symbols)
+            return query
+        
+        op = 'lt' if descending else 'gt'
+        cursor = None
+        fetched = 0
+        
+        while limit is None or fetched < limit:
+            size = page_size if limit is None else min(page_size, limit - fetched)
+            
+            def build(query, cursor=cursor, size=size):
+                query = apply_filters(query)
+                if cursor is not None:
+                    c_ts, c_id = cursor
+                    query = query.or_(
+                        f"ts.{op}.{_pgrst_quote(c_ts)},and(ts.eq.{_pgrst_quote(c_ts)},id.{op}.{c_id})"
+                    )
+                return query.order('ts', desc=descending).order('id', desc=descending).limit(size)
+            
+            if columns == ['*']:
+                rows = build(self.supabase.table('candles').select("*")).execute().data or []
+            else:
+                rows = self._select_projected(columns, build)
+            
+            if not rows:
+                break
+            
+            fetched += len(rows)
+            yield pd.DataFrame(rows)
+            
+            if len(rows) < size:
+                break
+            cursor = (rows[-1]['ts'], rows[-1]['id'])
+    
+    def load_candles_paged(self, columns=None, start_date=None, end_date=None, tfs=None, symbols=None,
+                           page_size=CANDLES_PAGE_SIZE, limit=None, descending=False, as_chunks=False):
+        """
+        Load candles through iter_candles.
+        Returns the page iterator (as_chunks=True) or one concatenated DataFrame
+        (served from the read cache when fresh).
+        """
+        chunks = self.iter_candles(
+            columns=columns, start_date=start_date, end_date=end_date, tfs=tfs, symbols=symbols,
+            page_size=page_size, limit=limit, descending=descending
+        )
+        if as_chunks:
+            return chunks
+        
+        def load():
+            frames = list(chunks)
+            if not frames:
+                return pd.DataFrame()
+            return pd.concat(frames, ignore_index=True)
+        
+        key = ('load_candles_paged', tuple(columns) if columns is not None else None,
+               start_date, end_date, tuple(sorted(tfs or [])), tuple(sorted(symbols or [])),
+               limit, descending)
+        return self.cache.get_or_load(
+            key, load,
+            lambda df: self._rows_scope(df, start_date, end_date, tfs, symbols)
+        )
+    
     def get_unique_symbols(self):
-        """Получить список уникальных символов (активов) из БД."""
+        """Получить список уникальных символов (активов) из БД (через кэш чтения)."""
+        return self.cache.get_or_load(
+            ('get_unique_symbols',),
+            self._get_unique_symbols,
+            lambda symbols: QueryScope(values=symbols)
+        )
+    
+    def _get_unique_symbols(self):
+        """Uncached get_unique_symbols: local mirror, catalog, or a full candles scan."""
+        if self._use_mirror():
+            return self.mirror.get_unique_symbols()
+        catalog = self.get_catalog()
+        if catalog is not None:
+            return sorted(set(row['symbol_clean'] for row in catalog if row.get('symbol_clean')))
         res = self.supabase.table('candles').select('symbol_clean').execute()
         if res.data:
             symbols = list(set(row['symbol_clean'] for row in res.data if row.get('symbol_clean')))
@@ -99,21 +545,87 @@ class DatabaseManager:
         return []
     
     def delete_candles(self, ids):
-        """Delete candles by IDs."""
-        self.supabase.table('candles').delete().in_('id', ids).execute()
+        """
+        Delete candles by IDs, ID_CHUNK_SIZE ids per request, then drop
+        catalog keys left without candles.
+        """
+        ids = list(ids)
+        keys = self._catalog_keys_of(ids)
+        for i in range(0, len(ids), ID_CHUNK_SIZE):
+            self.supabase.table('candles').delete().in_('id', ids[i:i + ID_CHUNK_SIZE]).execute()
+        if self.mirror is not None:
+            self.mirror.delete_ids(ids)
+        self.cache.invalidate_ids(ids)
+        self.prune_catalog(keys)
         return True
     
     def update_candle(self, id, changes):
-        """Update single candle by ID."""
-        self.supabase.table('candles').update(changes).eq('id', id).execute()
+        """Update single candle by ID (keeps the catalog in step with key edits)."""
+        old_keys = self._catalog_keys_of([id]) if set(CATALOG_KEY) & set(changes) else set()
+        res = self.supabase.table('candles').update(changes).eq('id', id).execute()
+        if self.mirror is not None:
+            self.mirror.apply_rows(res.data)
+        self.cache.invalidate_ids([id], changes)
+        if old_keys:
+            self.register_catalog(res.data or [])
+            self.prune_catalog(old_keys)
         return True
     
-    def fetch_and_merge(self, batch_data):
+    def update_candles_bulk(self, updates):
+        """
+        Apply {id: changes} in a few requests instead of one per row.
+        
+        Ids sharing the same changes (e.g. one note on many rows) get one
+        update().in_('id', ...) per ID_CHUNK_SIZE ids; a row with changes of
+        its own gets update().eq('id', ...). Only UPDATE is sent, so a row
+        deleted meanwhile is skipped instead of being re-inserted as a partial
+        row (an upsert on id would insert it, or fail the chunk on NOT NULL
+        columns).
+        
+        Returns:
+            Number of rows updated
+        """
+        groups = {}
+        for row_id, changes in updates.items():
+            if changes:
+                key = tuple(sorted((k, repr(v)) for k, v in changes.items()))
+                groups.setdefault(key, (changes, []))[1].append(row_id)
+        
+        # Catalog keys the edited rows had before key columns changed
+        old_keys = self._catalog_keys_of(
+            [row_id for row_id, changes in updates.items() if changes and set(CATALOG_KEY) & set(changes)]
+        )
+        
+        written = []
+        for changes, ids in groups.values():
+            if len(ids) == 1:
+                res = self.supabase.table('candles').update(changes).eq('id', ids[0]).execute()
+                written.extend(res.data or [])
+                continue
+            for i in range(0, len(ids), ID_CHUNK_SIZE):
+                res = self.supabase.table('candles').update(changes)\
+                    .in_('id', ids[i:i + ID_CHUNK_SIZE]).execute()
+                written.extend(res.data or [])
+        
+        if self.mirror is not None:
+            self.mirror.apply_rows(written)
+        changed = set().union(*(changes for changes, _ in groups.values())) if groups else set()
+        self.cache.invalidate_ids(updates, changed)
+        if old_keys:
+            self.register_catalog(written)
+            self.prune_catalog(old_keys)
+        return len(written)
+    
+    def fetch_and_merge(self, batch_data, batched=True):
         """
         Fetch existing candles from DB and merge with new batch data.
         1. Find existing candles by (exchange, symbol, tf, ts)
         2. Merge new data into existing (fill empty fields)
         Returns merged list.
+        
+        batched=True: exact-key lookup in one request per FETCH_MERGE_MAX_KEYS
+        timestamps (or= filter), selecting only MERGE_COLUMNS.
+        batched=False: one select("*") per (exchange, symbol, tf) over [min_ts, max_ts].
         """
         if not batch_data:
             return []
@@ -131,33 +643,21 @@ class DatabaseManager:
                 groups[key] = []
             groups[key].append(row.get('ts'))
         
-        db_map = {}  # (ex, sym, tf, ts) -> db_row
-        
         # 2. Batch fetching from DB
-        for (ex, sym, tf), ts_list in groups.items():
-            if not ts_list:
-                continue
-            min_ts = min(ts_list)
-            max_ts = max(ts_list)
-            
-            res = self.supabase.table('candles')\
-                .select("*")\
-                .eq('exchange', ex)\
-                .eq('symbol_clean', sym)\
-                .eq('tf', tf)\
-                .gte('ts', min_ts)\
-                .lte('ts', max_ts)\
-                .execute()
-            
-            if res.data:
-                for db_row in res.data:
-                    k = get_merge_key(
-                        db_row.get('exchange'),
-                        db_row.get('symbol_clean'),
-                        db_row.get('tf'),
-                        db_row.get('ts')
-                    )
-                    db_map[k] = db_row
+        if batched:
+            db_rows = self._fetch_by_keys(groups)
+        else:
+            db_rows = self._fetch_by_ranges(groups)
+        
+        db_map = {}  # (ex, sym, tf, ts) -> db_row
+        for db_row in db_rows:
+            k = get_merge_key(
+                db_row.get('exchange'),
+                db_row.get('symbol_clean'),
+                db_row.get('tf'),
+                db_row.get('ts')
+            )
+            db_map[k] = db_row
         
         # 3. Merge
         merged_batch = []
@@ -187,6 +687,343 @@ class DatabaseManager:
                 merged_batch.append(new_row)
         
         return merged_batch
+    
+    def _fetch_by_ranges(self, groups):
+        """Legacy lookup: one select("*") per (ex, sym, tf) over the ts range."""
+        rows = []
+        for (ex, sym, tf), ts_list in groups.items():
+            if not ts_list:
+                continue
+            min_ts = min(ts_list)
+            max_ts = max(ts_list)
+            
+            res = self.supabase.table('candles')\
+                .select("*")\
+                .eq('exchange', ex)\
+                .eq('symbol_clean', sym)\
+                .eq('tf', tf)\
+                .gte('ts', min_ts)\
+                .lte('ts', max_ts)\
+                .execute()
+            
+            if res.data:
+                rows.extend(res.data)
+        return rows
+    
+    def _fetch_by_keys(self, groups):
+        """
+        Batched lookup: or=(and(exchange.eq.X,symbol_clean.eq.Y,tf.eq.Z,ts.in.(...)),...)
+        over exact timestamps, split so that one request carries at most
+        FETCH_MERGE_MAX_KEYS timestamps. Unknown columns in MERGE_COLUMNS are
+        dropped and the request retried (same approach as save_candles_batch).
+        """
+        # Flatten to request-sized blocks: [(ex, sym, tf, [ts, ...]), ...]
+        blocks = [[]]
+        block_size = 0
+        for (ex, sym, tf), ts_list in groups.items():
+            # NULL key parts never match an equality filter
+            if ex is None or sym is None or tf is None:
+                continue
+            unique_ts = list(dict.fromkeys(ts for ts in ts_list if ts))
+            for i in range(0, len(unique_ts), FETCH_MERGE_MAX_KEYS):
+                part = unique_ts[i:i + FETCH_MERGE_MAX_KEYS]
+                if block_size + len(part) > FETCH_MERGE_MAX_KEYS:
+                    blocks.append([])
+                    block_size = 0
+                blocks[-1].append((ex, sym, tf, part))
+                block_size += len(part)
+        
+        rows = []
+        for block in blocks:
+            if not block:
+                continue
+            or_filter = ",".join(
+                f"and(exchange.eq.{_pgrst_quote(ex)},symbol_clean.eq.{_pgrst_quote(sym)},"
+                f"tf.eq.{_pgrst_quote(tf)},ts.in.({','.join(_pgrst_quote(t) for t in ts_part)}))"
+                for ex, sym, tf, ts_part in block
+            )
+            rows.extend(self._select_merge_rows(or_filter))
+        return rows
+    
+    def _select_merge_rows(self, or_filter):
+        """One projected select of MERGE_COLUMNS for a batched or= filter."""
+        return self._select_projected(
+            MERGE_COLUMNS,
+            lambda q: q.or_(or_filter)
+        )
+    
+    def _select_projected(self, columns, build):
+        """
+        Run select(columns) on candles with filters applied by build(query).
+        Columns absent from the cached schema are skipped; others the table
+        does not have (42703) are dropped and the request retried, the same
+        way save_candles_batch handles PGRST204.
+        """
+        known = self.get_table_columns('candles', fetch=False)
+        columns = [c for c in columns
+                   if c not in self._missing_columns and (not known or c in known)]
+        
+        for _ in range(len(columns) + 1):
+            try:
+                res = build(self.supabase.table('candles').select(",".join(columns))).execute()
+                return res.data or []
+            except Exception as e:
+                # Detect unknown column (42703: column candles.x does not exist)
+                match = re.search(r"column (?:\w+\.)?(\w+) does not exist", str(e))
+                if not match or match.group(1) not in columns:
+                    raise e
+                bad_col = match.group(1)
+                self._missing_columns.add(bad_col)
+                columns.remove(bad_col)
+        
+        raise Exception("Failed to fetch candles after removing unknown columns")
+
+
+class CandleWriteQueue:
+    """
+    Write-behind queue for save_candles_batch.
+    
+    submit() only stores rows by CANDLE_KEY (a newer row for the same candle
+    is merged over the pending one) and returns; a daemon thread drains the
+    queue with save_candles_batch. A failed flush puts its rows back (without
+    overwriting newer submissions) and is retried with exponential backoff.
+    
+    Outages (see _is_transient) retry the whole batch and never drop rows.
+    Any other failure bisects the batch so the good rows are saved and the
+    rejected ones isolated; a row rejected max_attempts times is moved to
+    the dead-letter list (dead_letters() / retry_dead_letters()) instead of
+    blocking the queue. Pending rows are flushed at interpreter exit.
+    
+    With a spool (WriteSpool) every submitted row is stored durably before
+    submit() returns and removed once saved; dead letters are kept there
+    too. A new queue on the same spool resumes whatever a previous process
+    left unsaved.
+    """
+    
+    def __init__(self, db, base_delay=0.5, max_delay=30.0, max_batch=SAVE_CHUNK_SIZE * 4, max_attempts=5,
+                 spool=None):
+        """
+        Args:
+            db: DatabaseManager used for writing
+            base_delay: First retry delay in seconds (doubles per failure)
+            max_delay: Retry delay cap in seconds
+            max_batch: Max rows per flush
+            max_attempts: Rejections of a single row before it is dead-lettered
+            spool: Optional WriteSpool; None keeps the queue in memory only
+        """
+        self.db = db
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.spool = spool
+        self._pending = {}
+        self._attempts = {}
+        self._dead = {}
+        self._batch = {}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._failures_in_row = 0
+        
+        # Metrics
+        self.submitted = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_flush_ms = None
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+        
+        # Resume rows a previous process queued but did not save
+        self.restored = 0
+        if spool is not None:
+            pending, dead = spool.load()
+            self._pending.update(pending)
+            self._dead.update(dead)
+            self.restored = len(pending)
+            if pending or dead:
+                print(f"Write queue restored {len(pending)} pending and {len(dead)} dead-lettered rows from spool")
+        
+        self._thread = threading.Thread(target=self._run, name="candle-write-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, candles_data):
+        """Add candles to the queue; returns the queue depth."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("CandleWriteQueue is closed")
+            keys = []
+            for row in candles_data or []:
+                key = tuple(row.get(k) for k in CANDLE_KEY)
+                prev = self._pending.get(key)
+                if prev is not None:
+                    self.coalesced += 1
+                    row = {**prev, **row}
+                self._pending[key] = dict(row)
+                self.submitted += 1
+                keys.append(key)
+            # Spooled row covers an in-flight one for the same key until it is saved
+            self._spool('put', [(k, {**self._batch.get(k, {}), **self._pending[k]}) for k in keys])
+            self._cond.notify_all()
+            return len(self._pending)
+    
+    def _take(self):
+        """Pop up to max_batch pending rows (oldest first)."""
+        keys = list(self._pending)[:self.max_batch]
+        batch = {k: self._pending.pop(k) for k in keys}
+        self._batch = batch
+        self._in_flight = len(batch)
+        return batch
+    
+    def _spool(self, method, *args):
+        """Call a WriteSpool method; a spool error is printed, the queue keeps going in memory."""
+        if self.spool is None:
+            return
+        try:
+            getattr(self.spool, method)(*args)
+        except Exception as e:
+            print(f"Write queue spool {method} failed: {e}")
+    
+    def _save(self, items, failed):
+        """
+        Save [(key, row)], bisecting on row errors to isolate the rejected rows.
+        
+        Returns:
+            Number of rows saved; failed gets {key: error} for the rest
+        """
+        try:
+            self.db.save_candles_batch([row for _, row in items])
+            return len(items)
+        except Exception as e:
+            if len(items) == 1 or _is_transient(e):
+                for key, _ in items:
+                    failed[key] = e
+                return 0
+            mid = len(items) // 2
+            return self._save(items[:mid], failed) + self._save(items[mid:], failed)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                batch = self._take()
+            
+            t0 = perf_counter()
+            failed = {}
+            saved = self._save(list(batch.items()), failed)
+            elapsed_ms = (perf_counter() - t0) * 1000
+            
+            with self._cond:
+                self._in_flight = 0
+                self._batch = {}
+                # Rows resubmitted meanwhile stay spooled (merged over the saved ones)
+                self._spool('remove', [k for k in batch if k not in failed and k not in self._pending])
+                if saved:
+                    self.flushes += 1
+                    self.flushed += saved
+                    self.last_flush_ms = elapsed_ms
+                    self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                    self._flush_ms_total += elapsed_ms
+                    for key in batch:
+                        if key not in failed:
+                            self._attempts.pop(key, None)
+                if not failed:
+                    self._failures_in_row = 0
+                    self._cond.notify_all()
+                    continue
+                
+                error = next(iter(failed.values()))
+                print(f"Write queue flush failed ({len(failed)}/{len(batch)} rows): {error}")
+                self.failures += 1
+                self.last_error = str(error)
+                self._failures_in_row += 1
+                for key, err in failed.items():
+                    row = batch[key]
+                    if not _is_transient(err):
+                        attempts = self._attempts.get(key, 0) + 1
+                        if attempts >= self.max_attempts and key not in self._pending:
+                            # Rejected on its own too often: park it, don't block the queue
+                            self._attempts.pop(key, None)
+                            self._dead[key] = {"row": row, "error": str(err), "attempts": attempts}
+                            self._spool('bury', key, row, err, attempts)
+                            print(f"Write queue dead-lettered {key} after {attempts} attempts: {err}")
+                            continue
+                        self._attempts[key] = attempts
+                    # Back in the queue; rows submitted meanwhile are newer and win
+                    newer = self._pending.get(key)
+                    self._pending[key] = {**row, **newer} if newer is not None else row
+                self._cond.notify_all()
+                if self._closed:
+                    kept = " (kept in spool)" if self.spool is not None else ""
+                    print(f"Write queue closed with {len(self._pending)} unsaved rows{kept}")
+                    return
+                delay = min(self.max_delay, self.base_delay * 2 ** (self._failures_in_row - 1))
+                deadline = monotonic() + delay
+                # Backoff; close() cuts it short for one final attempt
+                while not self._closed and monotonic() < deadline:
+                    self._cond.wait(deadline - monotonic())
+    
+    def dead_letters(self):
+        """Rows given up on: list of {"row", "error", "attempts"} (oldest first)."""
+        with self._cond:
+            return [dict(entry) for entry in self._dead.values()]
+    
+    def retry_dead_letters(self):
+        """Resubmit dead-lettered rows with a fresh attempt budget; returns their count."""
+        with self._cond:
+            rows = [entry["row"] for entry in self._dead.values()]
+            self._dead.clear()
+            self._spool('clear_dead_letters')
+        if rows:
+            self.submit(rows)
+        return len(rows)
+    
+    def flush(self, timeout=None):
+        """Wait until the queue is drained; False on timeout."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+    
+    def close(self, timeout=30.0):
+        """Stop accepting rows, drain the queue and stop the thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+    
+    def stats(self):
+        """Queue depth, flush latency and failure counters as a plain dict."""
+        with self._cond:
+            return {
+                "depth": len(self._pending),
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "restored": self.restored,
+                "coalesced": self.coalesced,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "failures": self.failures,
+                "dead_letters": len(self._dead),
+                "last_error": self.last_error,
+                "last_flush_ms": self.last_flush_ms,
+                "avg_flush_ms": (self._flush_ms_total / self.flushes) if self.flushes else None,
+                "max_flush_ms": self.max_flush_ms,
+                "spool": getattr(self.spool, 'path', None)
+            }
 
 
 # Backward compatibility - standalone functions that use global supabase
@@ -22,6 +22,13 @@ TF_MAP = {
     '1w': '1W', 'w1': '1W'
 }
 
+# Колонки, которые читает анализ (валидация, TF-статистика)
+FLOW_COLUMNS = [
+    'ts', 'tf', 'symbol_clean', 'open', 'high', 'low', 'close',
+    'body_pct', 'price_vs_delta', 'cvd_pct', 'cvd_sign',
+    'oi_set', 'oi_counter', 'oi_unload'
+]
+
 # --- ХЕЛПЕРЫ (ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ) ---
 
 def to_utc(dt: datetime) -> datetime:
@@ -199,18 +206,14 @@ def run_full_analysis(db, symbol: str, start_ts: datetime, end_ts: datetime) ->
             report["errors"].append("Дата начала должна быть раньше даты конца")
             return report
 
-        # 2. Загрузка
-        fetch_limit = 100000
-        df = db.load_candles(
+        # 2. Загрузка (постранично по ts, только нужные колонки, без лимита строк)
+        df = db.load_candles_paged(
+            columns=FLOW_COLUMNS,
             symbols=[symbol],
             start_date=s_ts_utc.date(),
-            end_date=e_ts_utc.date(),
-            limit=fetch_limit
+            end_date=e_ts_utc.date()
         )
         report["data"]["candles_fetched"] = len(df)
-        
-        if len(df) >= fetch_limit:
-            report["warnings"].append(f"Достигнут лимит загрузки {fetch_limit}.")
 
         if df.empty:
             report["errors"].append("В базе данных нет записей за этот период")
@@ -0,0 +1,486 @@
+"""Local Mirror Module - SQLite copy of the candles table for fast/offline reads."""
+
+import json
+import os
+import sqlite3
+import threading
+import time as time_mod
+from datetime import datetime, time, timezone
+
+import pandas as pd
+
+
+# Default mirror location (overridden by CANDLES_MIRROR_PATH)
+DEFAULT_MIRROR_PATH = os.path.join("data", "candles_mirror.sqlite")
+
+# Rows per Supabase request during sync
+MIRROR_SYNC_PAGE_SIZE = 1000
+
+# Write-queue spool location without a mirror (overridden by CANDLES_WRITE_SPOOL_PATH)
+DEFAULT_SPOOL_PATH = os.path.join("data", "candles_write_spool.sqlite")
+
+
+def _quote_ident(name):
+    """Quote an SQL identifier."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def ts_sort_key(val):
+    """
+    Sortable UTC key for a timestamp / date: 'YYYY-MM-DDTHH:MM:SS.ffffff'.
+    Naive values are treated as UTC (as PostgREST filters are).
+    """
+    if val is None:
+        return None
+    if isinstance(val, datetime):
+        dt = val
+    elif hasattr(val, 'isoformat') and not isinstance(val, str):
+        # date -> midnight
+        dt = datetime.combine(val, time(0, 0))
+    else:
+        try:
+            dt = datetime.fromisoformat(str(val).replace('Z', '+00:00'))
+        except ValueError:
+            return str(val)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+class LocalMirror:
+    """
+    Incremental SQLite mirror of Supabase 'candles'.
+
+    sync() pulls rows after the stored (ts, id) watermark (keyset, ids may be
+    UUIDs), so repeated syncs cost one request when nothing is new. Rows
+    written through DatabaseManager / batch_parser.save_to_candles are applied
+    immediately (apply_rows / delete_ids); rows changed, deleted or backfilled
+    (ts below the watermark) by other clients are picked up by sync(full=True),
+    which sync_if_stale runs every full_max_age seconds;
+    start_background_sync keeps both off the request path.
+    Reads mirror DatabaseManager.load_candles / load_candles_paged semantics.
+    """
+
+    def __init__(self, path=DEFAULT_MIRROR_PATH):
+        """Open (or create) the mirror database at path."""
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sync_thread = None
+        self._init_schema()
+        self._columns = self._load_columns()
+
+    # =========================================================================
+    # СХЕМА
+    # =========================================================================
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS candles ("id" PRIMARY KEY, "_ts" TEXT)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS mirror_meta (key TEXT PRIMARY KEY, value TEXT)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS mirror_columns (name TEXT PRIMARY KEY, kind TEXT, pos INTEGER)'
+            )
+
+    def _load_columns(self):
+        """{column: kind} in original column order."""
+        rows = self._conn.execute('SELECT name, kind FROM mirror_columns ORDER BY pos').fetchall()
+        return dict(rows)
+
+    def _ensure_columns(self, rows):
+        """Add columns seen in rows; remember value kind (bool/json/any)."""
+        for row in rows:
+            for key, val in row.items():
+                kind = 'bool' if isinstance(val, bool) else 'json' if isinstance(val, (dict, list)) else 'any'
+                if key not in self._columns:
+                    if key != 'id':
+                        self._conn.execute(f'ALTER TABLE candles ADD COLUMN {_quote_ident(key)}')
+                    self._columns[key] = kind if val is not None else None
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO mirror_columns (name, kind, pos) VALUES (?, ?, ?)',
+                        (key, self._columns[key], len(self._columns))
+                    )
+                elif self._columns[key] is None and val is not None:
+                    self._columns[key] = kind
+                    self._conn.execute('UPDATE mirror_columns SET kind = ? WHERE name = ?', (kind, key))
+        for idx in ('"_ts"', '"symbol_clean", "_ts"', '"tf", "_ts"'):
+            if all(c.strip('"') in self._columns or c == '"_ts"' for c in idx.split(', ')):
+                name = "ix_" + idx.replace('"', '').replace(', ', '_')
+                self._conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON candles ({idx}, "id")')
+
+    @staticmethod
+    def _encode(val):
+        if isinstance(val, bool):
+            return int(val)
+        if isinstance(val, (dict, list)):
+            return json.dumps(val, ensure_ascii=False)
+        return val
+
+    def _decode_row(self, names, values):
+        out = {}
+        for name, val in zip(names, values):
+            kind = self._columns.get(name)
+            if val is not None:
+                if kind == 'bool':
+                    val = bool(val)
+                elif kind == 'json':
+                    val = json.loads(val)
+            out[name] = val
+        return out
+
+    # =========================================================================
+    # ЗАПИСЬ / СИНХРОНИЗАЦИЯ
+    # =========================================================================
+
+    def apply_rows(self, rows):
+        """
+        Insert or update rows (must carry 'id'), e.g. upsert/update results.
+        Columns missing from a row keep their mirrored value.
+        """
+        with self._lock, self._conn:
+            return self._apply_rows(rows)
+
+    def _apply_rows(self, rows):
+        """apply_rows inside the caller's lock and transaction."""
+        rows = [r for r in (rows or []) if r.get('id') is not None]
+        if not rows:
+            return 0
+        self._ensure_columns(rows)
+        # One executemany per column set (rows of one write share it)
+        groups = {}
+        for row in rows:
+            values = [self._encode(v) for v in row.values()]
+            if 'ts' in row:
+                values.append(ts_sort_key(row['ts']))
+            groups.setdefault(tuple(row), []).append(values)
+        for names, values in groups.items():
+            names = list(names) + (['_ts'] if 'ts' in names else [])
+            cols = ", ".join(_quote_ident(n) for n in names)
+            marks = ", ".join("?" for _ in names)
+            updates = ", ".join(f"{_quote_ident(n)} = excluded.{_quote_ident(n)}" for n in names if n != 'id')
+            conflict = f'DO UPDATE SET {updates}' if updates else 'DO NOTHING'
+            self._conn.executemany(
+                f'INSERT INTO candles ({cols}) VALUES ({marks}) ON CONFLICT ("id") {conflict}', values
+            )
+        return len(rows)
+
+    def delete_ids(self, ids):
+        """Remove rows by id."""
+        ids = list(ids or [])
+        if not ids:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM candles WHERE "id" = ?', [(i,) for i in ids])
+        return len(ids)
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute('SELECT value FROM mirror_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO mirror_meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @property
+    def watermark(self):
+        """(ts, id) of the last synced row in (ts, id) order, or None."""
+        ts = self._meta('watermark_ts')
+        return (ts, self._meta('watermark_id')) if ts else None
+
+    @property
+    def last_sync(self):
+        """Unix time of the last finished sync (0 if never)."""
+        return float(self._meta('last_sync', 0) or 0)
+
+    @property
+    def last_full_sync(self):
+        """Unix time of the last finished full resync (0 if never)."""
+        return float(self._meta('last_full_sync', 0) or 0)
+
+    def sync(self, supabase, full=False, page_size=MIRROR_SYNC_PAGE_SIZE):
+        """
+        Pull new rows from Supabase by (ts, id) watermark.
+        full=True re-reads the whole table and then removes rows that are no
+        longer there (picks up external updates/deletes/backfills). The mirror
+        keeps serving its current rows until the resync finishes; an aborted
+        one leaves them in place. Reads and writes are only blocked while a
+        page is applied, never during a Supabase request; concurrent syncs
+        run one after another.
+        Returns the number of rows pulled.
+        """
+        from core.db_manager import _pgrst_quote
+
+        with self._sync_lock:
+            with self._lock, self._conn:
+                watermark = None if full else self.watermark
+                if full:
+                    self._conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen_ids ("id" PRIMARY KEY)')
+                    self._conn.execute('DELETE FROM seen_ids')
+
+            pulled = 0
+            while True:
+                query = supabase.table('candles').select("*")
+                if watermark is not None:
+                    w_ts, w_id = (_pgrst_quote(v) for v in watermark)
+                    query = query.or_(f"ts.gt.{w_ts},and(ts.eq.{w_ts},id.gt.{w_id})")
+                res = query.order('ts').order('id').limit(page_size).execute()
+                rows = res.data or []
+                if not rows:
+                    break
+                watermark = (rows[-1]['ts'], rows[-1]['id'])
+                with self._lock, self._conn:
+                    self._apply_rows(rows)
+                    if full:
+                        self._conn.executemany('INSERT OR IGNORE INTO seen_ids ("id") VALUES (?)',
+                                               [(r['id'],) for r in rows])
+                    self._set_meta('watermark_ts', watermark[0])
+                    self._set_meta('watermark_id', watermark[1])
+                pulled += len(rows)
+                if len(rows) < page_size:
+                    break
+
+            with self._lock, self._conn:
+                now = time_mod.time()
+                if full:
+                    # Rows gone from Supabase; an empty table also resets the watermark
+                    self._conn.execute('DELETE FROM candles WHERE "id" NOT IN (SELECT "id" FROM seen_ids)')
+                    self._conn.execute('DELETE FROM seen_ids')
+                    if watermark is None:
+                        self._conn.execute("DELETE FROM mirror_meta WHERE key IN ('watermark_ts', 'watermark_id')")
+                    self._set_meta('last_full_sync', now)
+                elif not self.last_full_sync:
+                    # First sync of an empty mirror is a complete copy
+                    self._set_meta('last_full_sync', now)
+                self._set_meta('last_sync', now)
+            return pulled
+
+    def sync_if_stale(self, supabase, max_age=60, full_max_age=None):
+        """
+        sync() only if the last one is older than max_age seconds; a full
+        resync instead if the last full one is older than full_max_age
+        (None - never).
+        """
+        now = time_mod.time()
+        if full_max_age is not None and now - self.last_full_sync >= full_max_age:
+            return self.sync(supabase, full=True)
+        if now - self.last_sync >= max_age:
+            return self.sync(supabase)
+        return 0
+
+    def start_background_sync(self, supabase, max_age=60, full_max_age=None):
+        """
+        Run sync_if_stale(supabase, max_age, full_max_age) in a daemon thread
+        every max_age seconds, so no caller waits for a sync (including the
+        first full copy). Errors (e.g. no network) are printed and retried on
+        the next tick; reads keep using what is already mirrored. Returns the
+        thread; a second call returns the running one.
+        """
+        with self._lock:
+            if self._sync_thread is not None and self._sync_thread.is_alive():
+                return self._sync_thread
+
+            def loop():
+                while not self._stop.is_set():
+                    try:
+                        self.sync_if_stale(supabase, max_age=max_age, full_max_age=full_max_age)
+                    except Exception as e:
+                        print(f"Mirror sync failed: {e}")
+                    self._stop.wait(max(1, max_age))
+
+            self._stop.clear()
+            self._sync_thread = threading.Thread(target=loop, name="candles-mirror-sync", daemon=True)
+            self._sync_thread.start()
+            return self._sync_thread
+
+    def stop_background_sync(self, timeout=None):
+        """Stop the background sync thread after its current sync."""
+        self._stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(timeout)
+            self._sync_thread = None
+
+    # =========================================================================
+    # ЧТЕНИЕ
+    # =========================================================================
+
+    def is_ready(self):
+        """True once at least one sync finished."""
+        return self.last_sync > 0
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM candles').fetchone()[0]
+
+    def query(self, columns=None, start_date=None, end_date=None, tfs=None, symbols=None,
+              limit=None, descending=False):
+        """
+        Rows as DataFrame, filters as in DatabaseManager.load_candles.
+        Ordered by (ts, id); columns=None returns every mirrored column.
+        """
+        if columns is None:
+            names = [c for c in self._columns]
+        else:
+            names = [c for c in dict.fromkeys(columns) if c in self._columns]
+        if not names:
+            return pd.DataFrame()
+
+        where, params = [], []
+        if start_date:
+            where.append('"_ts" >= ?')
+            params.append(ts_sort_key(start_date))
+        if end_date:
+            # End date inclusive (until end of day)
+            where.append('"_ts" <= ?')
+            params.append(ts_sort_key(datetime.combine(end_date, time(23, 59, 59))))
+        if tfs and len(tfs) > 0 and 'tf' in self._columns:
+            # Case-insensitive filter hack: add both cases
+            tfs_extended = list(set(tfs + [t.upper() for t in tfs] + [t.lower() for t in tfs]))
+            where.append(f'"tf" IN ({", ".join("?" for _ in tfs_extended)})')
+            params.extend(tfs_extended)
+        if symbols and len(symbols) > 0:
+            if 'symbol_clean' not in self._columns:
+                return pd.DataFrame()
+            where.append(f'"symbol_clean" IN ({", ".join("?" for _ in symbols)})')
+            params.extend(symbols)
+
+        direction = "DESC" if descending else "ASC"
+        sql = f'SELECT {", ".join(_quote_ident(n) for n in names)} FROM candles'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f' ORDER BY "_ts" {direction}, "id" {direction}'
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        return pd.DataFrame([self._decode_row(names, r) for r in rows], columns=names)
+
+    def load_candles(self, limit=100, start_date=None, end_date=None, tfs=None, symbols=None):
+        """Same contract as DatabaseManager.load_candles (newest first)."""
+        return self.query(start_date=start_date, end_date=end_date, tfs=tfs, symbols=symbols,
+                          limit=limit, descending=True)
+
+    def get_unique_symbols(self):
+        """Sorted distinct symbol_clean."""
+        if 'symbol_clean' not in self._columns:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT DISTINCT "symbol_clean" FROM candles WHERE "symbol_clean" IS NOT NULL AND "symbol_clean" != \'\''
+            ).fetchall()
+        return sorted(r[0] for r in rows)
+
+    def write_spool(self):
+        """WriteSpool in the mirror database (own connection unless in memory)."""
+        if self.path == ":memory:":
+            return WriteSpool(conn=self._conn, lock=self._lock)
+        return WriteSpool(self.path)
+
+    def close(self):
+        self.stop_background_sync()
+        with self._lock:
+            self._conn.close()
+
+
+class WriteSpool:
+    """
+    Durable copy of the CandleWriteQueue: rows waiting to be written and
+    dead-lettered rows, keyed by the candle key, in SQLite (the mirror file
+    or DEFAULT_SPOOL_PATH). The queue writes a row here before submit()
+    returns and removes it once Supabase has it, so rows queued but not yet
+    saved survive a restart or crash and are reloaded by the next queue.
+    """
+
+    def __init__(self, path=DEFAULT_SPOOL_PATH, conn=None, lock=None):
+        """
+        Open (or create) the spool tables at path, or on an open connection
+        (conn / lock of a LocalMirror).
+        """
+        self._owned = conn is None
+        if conn is None:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.path = path
+        self._conn = conn
+        self._lock = lock or threading.RLock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS write_spool (key TEXT PRIMARY KEY, row TEXT, seq INTEGER)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS write_dead_letters '
+                '(key TEXT PRIMARY KEY, row TEXT, error TEXT, attempts INTEGER, seq INTEGER)'
+            )
+
+    @staticmethod
+    def _dump(val):
+        return json.dumps(val, ensure_ascii=False, default=str)
+
+    def put(self, items):
+        """Store or replace pending rows: iterable of (key, row)."""
+        values = [(self._dump(list(key)), self._dump(row)) for key, row in items]
+        if not values:
+            return 0
+        with self._lock, self._conn:
+            seq = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM write_spool').fetchone()[0]
+            self._conn.executemany(
+                'INSERT INTO write_spool (key, row, seq) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET row = excluded.row',
+                [(k, r, seq + i + 1) for i, (k, r) in enumerate(values)]
+            )
+        return len(values)
+
+    def remove(self, keys):
+        """Drop pending rows that were written."""
+        values = [(self._dump(list(key)),) for key in keys]
+        if values:
+            with self._lock, self._conn:
+                self._conn.executemany('DELETE FROM write_spool WHERE key = ?', values)
+        return len(values)
+
+    def bury(self, key, row, error, attempts):
+        """Move a row from the pending rows to the dead letters."""
+        k = self._dump(list(key))
+        with self._lock, self._conn:
+            seq = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM write_dead_letters').fetchone()[0]
+            self._conn.execute('DELETE FROM write_spool WHERE key = ?', (k,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO write_dead_letters (key, row, error, attempts, seq) VALUES (?, ?, ?, ?, ?)',
+                (k, self._dump(row), str(error), attempts, seq + 1)
+            )
+
+    def clear_dead_letters(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM write_dead_letters')
+
+    def load(self):
+        """
+        Returns:
+            (pending, dead): [(key, row)] and [(key, {"row", "error", "attempts"})], oldest first
+        """
+        with self._lock:
+            pending = self._conn.execute('SELECT key, row FROM write_spool ORDER BY seq').fetchall()
+            dead = self._conn.execute(
+                'SELECT key, row, error, attempts FROM write_dead_letters ORDER BY seq'
+            ).fetchall()
+        return (
+            [(tuple(json.loads(k)), json.loads(r)) for k, r in pending],
+            [(tuple(json.loads(k)), {"row": json.loads(r), "error": e, "attempts": a}) for k, r, e, a in dead],
+        )
+
+    def close(self):
+        """Close the connection unless it belongs to a LocalMirror."""
+        if self._owned:
+            with self._lock:
+                self._conn.close()
@@ -0,0 +1,170 @@
+"""Parse Cache Module - LRU caches for repeated Coinglass blocks."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+DEFAULT_PARSE_CACHE_SIZE = 4096
+DEFAULT_ENRICH_CACHE_SIZE = 4096
+
+
+def _digest(payload):
+    """Short stable digest of a string."""
+    return hashlib.blake2b(payload.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def _copy_row(row):
+    """Copy of a candle dict, nested lists/dicts (e.g. missing_fields) included."""
+    return {k: (v.copy() if isinstance(v, (list, dict)) else v) for k, v in row.items()}
+
+
+def normalize_chunk(text):
+    """
+    Normalise a candle chunk for cache keys.
+    Only strip(): parse_raw_input keeps text.strip() as raw_data, so any
+    stronger normalisation would make a hit return a different raw_data.
+    """
+    return text.strip()
+
+
+def config_version(config):
+    """
+    Content fingerprint of a config dict from load_configurations.
+    Derived entries (threshold_index, config_version) are ignored.
+    """
+    if not config:
+        return ''
+
+    parts = []
+    for key in sorted(config, key=str):
+        if key in ('threshold_index', 'config_version'):
+            continue
+        val = config[key]
+        if isinstance(val, pd.DataFrame):
+            val = val.to_dict('split')
+        elif isinstance(val, dict):
+            val = sorted(val.items(), key=lambda kv: str(kv[0]))
+        parts.append(f"{key}={val!r}")
+    return _digest("\n".join(parts))
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss counters and a size bound."""
+
+    def __init__(self, maxsize):
+        """Initialize with max number of entries (0 disables caching)."""
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return cached value (marking it recent) or None."""
+        with self._lock:
+            val = self._data.get(key)
+            if val is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return val
+
+    def put(self, key, value):
+        """Store value, evicting least recently used entries over maxsize."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Counters as a plain dict."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hit_rate": (self.hits / total) if total else 0.0
+        }
+
+
+class ParseCache:
+    """
+    Caches the pure steps of PipelineProcessor for overlapping re-pastes:
+    - parsed: chunk text + config version -> parse_raw_input dict
+    - enriched: merged raw dict + config version -> calculate_metrics + notes + X-RAY
+    DB enrichment (fetch_and_merge) is not cached: DB rows can change between pastes.
+    Cached dicts are copied on the way in and out, callers may mutate them.
+    """
+
+    def __init__(self, maxsize=DEFAULT_PARSE_CACHE_SIZE, enrich_maxsize=DEFAULT_ENRICH_CACHE_SIZE):
+        """Initialize with size bounds for both caches."""
+        self.parsed = LRUCache(maxsize)
+        self.enriched = LRUCache(enrich_maxsize)
+
+    def parse(self, chunk, version, parser):
+        """
+        Return parser(chunk) from cache or compute and store it.
+
+        Args:
+            chunk: Raw candle chunk
+            version: config_version() of the active config
+            parser: Callable text -> dict (e.g. parse_raw_input)
+        """
+        key = _digest(f"{version}\x00{normalize_chunk(chunk)}")
+        cached = self.parsed.get(key)
+        if cached is not None:
+            return _copy_row(cached)
+
+        result = parser(chunk)
+        self.parsed.put(key, _copy_row(result))
+        return result
+
+    def enrich(self, raw_data, version, enricher):
+        """
+        Return enricher(raw_data) from cache or compute and store it.
+        Key covers every (field, value) pair in order, so any change in the
+        DB-merged row is a miss.
+        """
+        key = _digest(f"{version}\x00{list(raw_data.items())!r}")
+        cached = self.enriched.get(key)
+        if cached is not None:
+            return _copy_row(cached)
+
+        result = enricher(raw_data)
+        self.enriched.put(key, _copy_row(result))
+        return result
+
+    def clear(self):
+        """Drop both caches."""
+        self.parsed.clear()
+        self.enriched.clear()
+
+    def stats(self):
+        """Hit/miss counters for both caches."""
+        return {
+            "parsed": self.parsed.stats(),
+            "enriched": self.enriched.stats()
+        }
+
+
+# Process-wide cache: PipelineProcessor is rebuilt on every Streamlit rerun,
+# the module (and this cache) lives for the whole server process
+PARSE_CACHE = ParseCache()
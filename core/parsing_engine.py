@@ -9,7 +9,9 @@
 
 import re
 import math
+from dataclasses import dataclass
 from datetime import datetime, time
+from typing import Optional
 import pandas as pd
 
 
@@ -17,10 +19,29 @@ import pandas as pd
 # 1. ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 # =============================================================================
 
+# Быстрый путь parse_value_raw: типичные токены Coinglass ("2,500.43",
+# "-3.25M", "0.0100%", "+499.10K"). Всё остальное - через parse_value_raw_legacy.
+_RX_FAST_VALUE = re.compile(r' *([+-]?)([0-9][0-9,]*(?:\.[0-9,]*)?|\.[0-9][0-9,]*)([KMBkmb]?)%? *')
+_VALUE_MULTIPLIERS = {
+    '': 1.0,
+    'K': 1_000.0, 'k': 1_000.0,
+    'M': 1_000_000.0, 'm': 1_000_000.0,
+    'B': 1_000_000_000.0, 'b': 1_000_000_000.0,
+}
+# Мемоизация повторяющихся токенов ("0", "0.00", "-", "0.0100%")
+VALUE_CACHE_SIZE = 4096
+_VALUE_CACHE = {'': 0.0, '-': 0.0}
+
+
 def parse_value_raw(val_str):
     """
     Парсит строки с суффиксами K, M, B, %, запятыми в число float.
     
+    Результат бит-в-бит совпадает с parse_value_raw_legacy: быстрый путь
+    (одна регулярка + таблица множителей + кэш токенов) выполняет те же
+    float() и round() над той же очищенной строкой, а нестандартный ввод
+    (не str, пробелы внутри, экспонента, мусор) уходит в legacy.
+    
     Примеры:
         "1.5K" -> 1500.0
         "10M" -> 10000000.0
@@ -28,6 +49,37 @@ def parse_value_raw(val_str):
         "1,234.56" -> 1234.56
         "-" -> 0.0
     
+    Аргументы:
+        val_str: Строка для парсинга
+    
+    Возвращает:
+        float значение или None при ошибке
+    """
+    if val_str.__class__ is not str:
+        return parse_value_raw_legacy(val_str)
+    value = _VALUE_CACHE.get(val_str)
+    if value is not None:
+        return value
+    m = _RX_FAST_VALUE.fullmatch(val_str)
+    if m is None:
+        return parse_value_raw_legacy(val_str)
+    sign, digits, suffix = m.groups()
+    clean_str = digits.replace(',', '')
+    if sign == '-':
+        clean_str = '-' + clean_str
+    value = round(float(clean_str) * _VALUE_MULTIPLIERS[suffix], 2)
+    if len(_VALUE_CACHE) >= VALUE_CACHE_SIZE:
+        _VALUE_CACHE.clear()
+    _VALUE_CACHE[val_str] = value
+    return value
+
+
+def parse_value_raw_legacy(val_str):
+    """
+    Парсит строки с суффиксами K, M, B, %, запятыми в число float.
+    Эталонная реализация: общий случай parse_value_raw и база для
+    benchmarks/bench_parse_value_raw.py.
+    
     Аргументы:
         val_str: Строка для парсинга
     
@@ -109,7 +161,23 @@ def fmt_num(val, decimals=2, is_pct=False):
 # 2. ПАРСИНГ СЫРОГО ВВОДА
 # =============================================================================
 
-def parse_raw_input(text):
+# Режимы парсинга для parse_raw_input()
+PARSE_MODE_LEGACY = "legacy"
+PARSE_MODE_SINGLE_PASS = "single_pass"
+
+# Поля, без которых свеча помечается missing_fields
+CRITICAL_FIELDS = [
+    'ts', 'exchange', 'raw_symbol', 'symbol_clean', 'tf', 
+    'open', 'high', 'low', 'close', 'volume', 
+    'change_abs', 'change_pct', 'amplitude_abs', 'amplitude_pct', 
+    'buy_volume', 'sell_volume', 'abv_delta', 'abv_ratio', 
+    'buy_trades', 'sell_trades', 'trades_delta', 'trades_ratio', 
+    'oi_open', 'oi_high', 'oi_low', 'oi_close', 
+    'liq_long', 'liq_short'
+]
+
+
+def parse_raw_input(text, mode=PARSE_MODE_LEGACY):
     """
     Парсит сырой текст свечи в словарь Raw Input Dictionary.
     
@@ -119,6 +187,8 @@ def parse_raw_input(text):
     
     Аргументы:
         text: Многострочный текст с данными свечи
+        mode: "legacy" (отдельный re.search на каждое поле) или
+              "single_pass" (см. parse_raw_input_single_pass)
     
     Возвращает:
         Словарь с распарсенными полями:
@@ -129,6 +199,9 @@ def parse_raw_input(text):
         - Ликвидации: liq_long, liq_short
         - И др.
     """
+    if mode == PARSE_MODE_SINGLE_PASS:
+        return parse_raw_input_single_pass(text)
+
     data = {}
     data['raw_data'] = text.strip()
     REGEX_FLAGS = re.IGNORECASE | re.DOTALL
@@ -335,16 +408,7 @@ def parse_raw_input(text):
         data['liq_short'] = abs(parse_value_raw(liq_match.group(2)))
     
     # === ВАЛИДАЦИЯ: Проверка критических полей ===
-    critical_fields = [
-        'ts', 'exchange', 'raw_symbol', 'symbol_clean', 'tf', 
-        'open', 'high', 'low', 'close', 'volume', 
-        'change_abs', 'change_pct', 'amplitude_abs', 'amplitude_pct', 
-        'buy_volume', 'sell_volume', 'abv_delta', 'abv_ratio', 
-        'buy_trades', 'sell_trades', 'trades_delta', 'trades_ratio', 
-        'oi_open', 'oi_high', 'oi_low', 'oi_close', 
-        'liq_long', 'liq_short'
-    ]
-    missing = [f for f in critical_fields if data.get(f) is None]
+    missing = [f for f in CRITICAL_FIELDS if data.get(f) is None]
     if missing:
         data['missing_fields'] = missing
         # Строгий режим: НЕ заполняем нулями, оставляем None
@@ -352,10 +416,497 @@ def parse_raw_input(text):
     return data
 
 
+# -----------------------------------------------------------------------------
+# 2.1 SINGLE-PASS ПАРСЕР
+# -----------------------------------------------------------------------------
+# Legacy-парсер делает ~30 re.search по всему тексту, и каждый шаблон с
+# ведущим "Header.*?" заново сканирует блок с начала. Здесь текст проходится
+# один раз: сканер находит первое вхождение каждого заголовка секции, а
+# прекомпилированные шаблоны запускаются уже с этой позиции. Шаблоны те же,
+# что и в legacy, поэтому результат совпадает поле в поле.
+
+_RX_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Заголовки секций Coinglass (в нижнем регистре) -> ключ секции
+_SECTION_HEADERS = {
+    'change': 'change',
+    'amplitude': 'amplitude',
+    'active buy/sell volume': 'abv',
+    'active buy/sell trades': 'trades',
+    'open interest': 'oi',
+    'liquidation': 'liq',
+    'aggregated funding rate': 'agg_fr',
+    'funding rate': 'fr',
+    'basis': 'basis',
+    'long/short ratio': 'ls',
+    'index price': 'idx',
+    'net longs': 'net_longs',
+    'net shorts': 'net_shorts',
+}
+_SECTION_SCANNER = re.compile('|'.join(re.escape(h) for h in _SECTION_HEADERS))
+
+# Символы, которые re.IGNORECASE сопоставляет с ASCII-буквами, а str.lower() нет
+# (İ, ı -> i; ſ -> s). С ними сканер по lower() может пропустить заголовок.
+_CASEFOLD_UNSAFE = re.compile('[İıſ]')
+
+_RX_HEADER = re.compile(r'^\s*\d{1,2}\.\d{1,2}\.\d{4}\s+\d{1,2}:\d{2}(?::\d{2})?\s+(.+?)\s+·\s+(.+?)\s+·\s+(\w+)')
+_RX_TS = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?')
+_RX_OHLC = re.compile(r'O\s+([\d,.]+)\s+H\s+([\d,.]+)\s+L\s+([\d,.]+)\s+C\s+([\d,.]+)')
+_RX_VOLUME = re.compile(r'V ([\d,.]+[MKB]?)', _RX_FLAGS)
+
+# Шаблоны секций: (ключ секции, скомпилированный шаблон)
+_RX_SECTION = {
+    'change_full': ('change', re.compile(r'Change\s+([+\-]?[\d,.]+)\s*\(([+\-]?[\d,.]+)%\)', _RX_FLAGS)),
+    'change_abs': ('change', re.compile(r'Change\s+([+\-]?[\d,.]+)', _RX_FLAGS)),
+    'change_pct': ('change', re.compile(r'Change.*?([+\-]?[\d,.]+)%', _RX_FLAGS)),
+    'amplitude_full': ('amplitude', re.compile(r'Amplitude\s+([\d,.]+)\s*\(([\d,.]+)%\)', _RX_FLAGS)),
+    'amplitude_abs': ('amplitude', re.compile(r'Amplitude\s+([\d,.]+)', _RX_FLAGS)),
+    'amplitude_pct': ('amplitude', re.compile(r'Amplitude.*?([\d,.]+)%', _RX_FLAGS)),
+    'buy_volume': ('abv', re.compile(r'Active Buy/Sell Volume.*?Buy\s+([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'sell_volume': ('abv', re.compile(r'Active Buy/Sell Volume.*?Sell\s+([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'abv_delta': ('abv', re.compile(r'Active Buy/Sell Volume.*?Delta\s+([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'abv_ratio': ('abv', re.compile(r'Active Buy/Sell Volume.*?Ratio\s+([+\-]?[\d,.]+)', _RX_FLAGS)),
+    'buy_trades': ('trades', re.compile(r'Active Buy/Sell Trades.*?Buy ([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'sell_trades': ('trades', re.compile(r'Active Buy/Sell Trades.*?Sell ([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'trades_delta': ('trades', re.compile(r'Active Buy/Sell Trades.*?Delta\s+([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'trades_ratio': ('trades', re.compile(r'Active Buy/Sell Trades.*?Ratio\s+([+\-]?[\d,.]+)', _RX_FLAGS)),
+    'oi': ('oi', re.compile(r'Open Interest.*?O ([\d,.]+[MKB]?) H ([\d,.]+[MKB]?) L ([\d,.]+[MKB]?) C ([\d,.]+[MKB]?)', _RX_FLAGS)),
+    'liq_long': ('liq', re.compile(r'Liquidation Long ([\d,.]+[MKB]?)', _RX_FLAGS)),
+    'liq_short': ('liq', re.compile(r'Liquidation.*?Short ([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'fr': ('fr', re.compile(r'(?<!Aggregated )Funding Rate.*?O ([+\-]?[\d,.]+%?).*?H ([+\-]?[\d,.]+%?).*?L ([+\-]?[\d,.]+%?).*?C ([+\-]?[\d,.]+%?)', _RX_FLAGS)),
+    'agg_fr': ('agg_fr', re.compile(r'Aggregated Funding Rate.*?O ([+\-]?[\d,.]+%?).*?H ([+\-]?[\d,.]+%?).*?L ([+\-]?[\d,.]+%?).*?C ([+\-]?[\d,.]+%?)', _RX_FLAGS)),
+    'basis': ('basis', re.compile(r'Basis\s+([+\-]?[\d,.]+)', _RX_FLAGS)),
+    'ls': ('ls', re.compile(r'Long/Short Ratio.*?O ([+\-]?[\d,.]+).*?H ([+\-]?[\d,.]+).*?L ([+\-]?[\d,.]+).*?C ([+\-]?[\d,.]+)', _RX_FLAGS)),
+    'idx': ('idx', re.compile(r'Index Price.*?O ([\d,.]+).*?H ([\d,.]+).*?L ([\d,.]+).*?C ([\d,.]+)', _RX_FLAGS)),
+    'net_longs': ('net_longs', re.compile(r'Net Longs.*?O ([+\-]?[\d,.]+[MKB]?).*?C ([+\-]?[\d,.]+[MKB]?).*?(?:Delta|Δ) ([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'net_shorts': ('net_shorts', re.compile(r'Net Shorts.*?O ([+\-]?[\d,.]+[MKB]?).*?C ([+\-]?[\d,.]+[MKB]?).*?(?:Delta|Δ) ([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+    'liq_alt': ('liq', re.compile(r'Liquidation.*?Long ([+\-]?[\d,.]+[MKB]?).*?Short ([+\-]?[\d,.]+[MKB]?)', _RX_FLAGS)),
+}
+
+
+def scan_sections(text):
+    """
+    Один проход по тексту: позиция первого вхождения каждого заголовка секции.
+    
+    Сканер работает по text.lower() без IGNORECASE и после каждого совпадения
+    продолжает со следующего символа, поэтому находит и вложенные заголовки
+    ("Funding Rate" внутри "Aggregated Funding Rate").
+    
+    Возвращает:
+        dict {ключ секции: позиция} или None, если lower() небезопасен
+        для этого текста (тогда нужен legacy-парсер)
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text) or _CASEFOLD_UNSAFE.search(text):
+        return None
+    
+    sections = {}
+    search = _SECTION_SCANNER.search
+    pos = 0
+    while len(sections) < len(_SECTION_HEADERS):
+        match = search(lowered, pos)
+        if not match:
+            break
+        key = _SECTION_HEADERS[match.group()]
+        if key not in sections:
+            sections[key] = match.start()
+        pos = match.start() + 1
+    return sections
+
+
+def _section_match(name, text, sections):
+    """Запускает шаблон секции с позиции её заголовка (None, если секции нет)."""
+    section, pattern = _RX_SECTION[name]
+    start = sections.get(section)
+    if start is None:
+        return None
+    return pattern.search(text, start)
+
+
+def _section_extract(name, text, sections):
+    """Аналог extract() для шаблона секции."""
+    match = _section_match(name, text, sections)
+    if match:
+        return parse_value_raw(match.group(1))
+    return None
+
+
+def parse_raw_input_single_pass(text):
+    """
+    Single-pass вариант parse_raw_input(): тот же словарь, но текст
+    сканируется один раз, а шаблоны секций прекомпилированы.
+    
+    Аргументы:
+        text: Многострочный текст с данными свечи
+    
+    Возвращает:
+        Словарь, идентичный parse_raw_input(text, mode="legacy")
+    """
+    sections = scan_sections(text)
+    if sections is None:
+        return parse_raw_input(text, mode=PARSE_MODE_LEGACY)
+    
+    data = {}
+    data['raw_data'] = text.strip()
+
+    # === МЕТАДАННЫЕ (Exchange, Symbol, TF) ===
+    header_match = _RX_HEADER.search(text)
+    if header_match:
+        data['exchange'] = header_match.group(1).strip()
+        data['raw_symbol'] = header_match.group(2).strip()
+        data['tf'] = header_match.group(3).strip()
+    else:
+        data['exchange'] = None
+        data['raw_symbol'] = None
+        data['tf'] = None
+    
+    if data['raw_symbol']:
+        data['symbol_clean'] = data['raw_symbol'].split(' ')[0].replace('USDT', '').replace('PERP', '')
+    else:
+        data['symbol_clean'] = None
+    
+    # === ВРЕМЕННАЯ МЕТКА ===
+    ts_match = _RX_TS.search(text)
+    if ts_match:
+        try:
+            day, month, year, hour, minute, second = ts_match.groups()
+            ts_norm = f"{int(day):02d}.{int(month):02d}.{year} {int(hour):02d}:{minute}"
+            if second:
+                ts_norm += f":{second}"
+                fmt = "%d.%m.%Y %H:%M:%S"
+            else:
+                fmt = "%d.%m.%Y %H:%M"
+            
+            dt_obj = datetime.strptime(ts_norm, fmt)
+            data['ts'] = dt_obj.isoformat()
+            data['parsed_ts'] = data['ts'] 
+        except Exception as e:
+            print(f"⚠️ Warning: Timestamp parse failed: {e}")
+            data['ts'] = None
+
+    # === OHLC ===
+    ohlc_match = _RX_OHLC.search(text)
+    if ohlc_match:
+        data['open'] = parse_value_raw(ohlc_match.group(1))
+        data['high'] = parse_value_raw(ohlc_match.group(2))
+        data['low'] = parse_value_raw(ohlc_match.group(3))
+        data['close'] = parse_value_raw(ohlc_match.group(4))
+    else:
+        data['open'] = None
+        data['high'] = None
+        data['low'] = None
+        data['close'] = None
+    
+    # === ОБЪЁМ ===
+    vol_match = _RX_VOLUME.search(text)
+    data['volume'] = parse_value_raw(vol_match.group(1)) if vol_match else None
+    
+    # === ИЗМЕНЕНИЕ И АМПЛИТУДА ===
+    ch_match = _section_match('change_full', text, sections)
+    if ch_match:
+        data['change_abs'] = parse_value_raw(ch_match.group(1))
+        data['change_pct'] = parse_value_raw(ch_match.group(2))
+    else:
+        data['change_abs'] = _section_extract('change_abs', text, sections)
+        data['change_pct'] = _section_extract('change_pct', text, sections)
+
+    amp_match = _section_match('amplitude_full', text, sections)
+    if amp_match:
+        data['amplitude_abs'] = parse_value_raw(amp_match.group(1))
+        data['amplitude_pct'] = parse_value_raw(amp_match.group(2))
+    else:
+        data['amplitude_abs'] = _section_extract('amplitude_abs', text, sections)
+        data['amplitude_pct'] = _section_extract('amplitude_pct', text, sections)
+    
+    # === АКТИВНЫЙ ОБЪЁМ (Buy/Sell Volume) ===
+    data['buy_volume'] = _section_extract('buy_volume', text, sections)
+    data['sell_volume'] = _section_extract('sell_volume', text, sections)
+    if data['sell_volume'] is not None: 
+        data['sell_volume'] = abs(data['sell_volume'])
+    data['abv_delta'] = _section_extract('abv_delta', text, sections)
+    data['abv_ratio'] = _section_extract('abv_ratio', text, sections)
+    
+    if data['abv_delta'] is None and data['buy_volume'] is not None and data['sell_volume'] is not None:
+        data['abv_delta'] = data['buy_volume'] - data['sell_volume']
+    
+    # === СДЕЛКИ (Buy/Sell Trades) ===
+    data['buy_trades'] = _section_extract('buy_trades', text, sections)
+    data['sell_trades'] = _section_extract('sell_trades', text, sections)
+    if data['sell_trades'] is not None: 
+        data['sell_trades'] = abs(data['sell_trades'])
+    data['trades_delta'] = _section_extract('trades_delta', text, sections)
+    data['trades_ratio'] = _section_extract('trades_ratio', text, sections)
+    
+    if data['trades_delta'] is None and data['buy_trades'] is not None and data['sell_trades'] is not None:
+        data['trades_delta'] = data['buy_trades'] - data['sell_trades']
+
+    # === OPEN INTEREST ===
+    oi_match = _section_match('oi', text, sections)
+    if oi_match:
+        data['oi_open'] = parse_value_raw(oi_match.group(1))
+        data['oi_high'] = parse_value_raw(oi_match.group(2))
+        data['oi_low'] = parse_value_raw(oi_match.group(3))
+        data['oi_close'] = parse_value_raw(oi_match.group(4))
+
+    # === ЛИКВИДАЦИИ ===
+    data['liq_long'] = _section_extract('liq_long', text, sections)
+    data['liq_short'] = _section_extract('liq_short', text, sections)
+    if data['liq_short'] is not None: 
+        data['liq_short'] = abs(data['liq_short'])
+
+    # === ДОПОЛНИТЕЛЬНЫЕ ДАННЫЕ COINGLASS ===
+    fr_match = _section_match('fr', text, sections)
+    if fr_match:
+        data['fr_open'] = parse_value_raw(fr_match.group(1))
+        data['fr_high'] = parse_value_raw(fr_match.group(2))
+        data['fr_low'] = parse_value_raw(fr_match.group(3))
+        data['fr_close'] = parse_value_raw(fr_match.group(4))
+    
+    agg_fr_match = _section_match('agg_fr', text, sections)
+    if agg_fr_match:
+        data['agg_fr_open'] = parse_value_raw(agg_fr_match.group(1))
+        data['agg_fr_high'] = parse_value_raw(agg_fr_match.group(2))
+        data['agg_fr_low'] = parse_value_raw(agg_fr_match.group(3))
+        data['agg_fr_close'] = parse_value_raw(agg_fr_match.group(4))
+
+    data['basis'] = _section_extract('basis', text, sections)
+
+    ls_match = _section_match('ls', text, sections)
+    if ls_match:
+        data['ls_ratio_open'] = parse_value_raw(ls_match.group(1))
+        data['ls_ratio_high'] = parse_value_raw(ls_match.group(2))
+        data['ls_ratio_low'] = parse_value_raw(ls_match.group(3))
+        data['ls_ratio_close'] = parse_value_raw(ls_match.group(4))
+
+    idx_match = _section_match('idx', text, sections)
+    if idx_match:
+        data['idx_open'] = parse_value_raw(idx_match.group(1))
+        data['idx_high'] = parse_value_raw(idx_match.group(2))
+        data['idx_low'] = parse_value_raw(idx_match.group(3))
+        data['idx_close'] = parse_value_raw(idx_match.group(4))
+
+    nl_match = _section_match('net_longs', text, sections)
+    if nl_match:
+        data['net_longs_open'] = parse_value_raw(nl_match.group(1))
+        data['net_longs_close'] = parse_value_raw(nl_match.group(2))
+        data['net_longs_delta'] = parse_value_raw(nl_match.group(3))
+
+    ns_match = _section_match('net_shorts', text, sections)
+    if ns_match:
+        data['net_shorts_open'] = parse_value_raw(ns_match.group(1))
+        data['net_shorts_close'] = parse_value_raw(ns_match.group(2))
+        data['net_shorts_delta'] = parse_value_raw(ns_match.group(3))
+
+    liq_match = _section_match('liq_alt', text, sections)
+    if liq_match:
+        data['liq_long'] = abs(parse_value_raw(liq_match.group(1)))
+        data['liq_short'] = abs(parse_value_raw(liq_match.group(2)))
+    
+    # === ВАЛИДАЦИЯ ===
+    missing = [f for f in CRITICAL_FIELDS if data.get(f) is None]
+    if missing:
+        data['missing_fields'] = missing
+
+    return data
+
+
 # =============================================================================
 # 3. РАСЧЁТ МЕТРИК
 # =============================================================================
 
+@dataclass(frozen=True)
+class Thresholds:
+    """Пороговые параметры пары (актив, таймфрейм). None — нет данных в БД."""
+    base_sens: Optional[float] = None   # porog_doi[symbol] для TF
+    coeff: Optional[float] = None       # asset_coeffs[SYMBOL]
+    k_set: Optional[float] = None       # tf_params: множитель OI SET
+    k_ctr: Optional[float] = None       # tf_params: множитель OI COUNTER
+    k_unl: Optional[float] = None       # tf_params: множитель OI UNLOAD
+    tf_sens: Optional[float] = None     # tf_params: базовая чувствительность TF
+
+
+class ThresholdIndex(dict):
+    """
+    Неизменяемый индекс порогов: (symbol_clean, tf) -> Thresholds.
+    
+    Строится один раз в load_configurations() (build_threshold_index)
+    и превращает поиск порогов для свечи в один dict lookup. Ключи — те же
+    строки, что получает resolve_thresholds() (без нормализации регистра),
+    значения посчитаны тем же поиском по таблицам; пары вне индекса
+    ищутся по таблицам один раз и запоминаются отдельно (lookup()).
+    """
+    
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._misses = {}
+    
+    def lookup(self, symbol_key, tf_val, config):
+        """Пороги пары: из индекса или (один раз на пару) поиском по таблицам."""
+        key = (symbol_key, tf_val)
+        thr = self.get(key)
+        if thr is None:
+            thr = self._misses.get(key)
+            if thr is None:
+                thr = self._misses[key] = _lookup_thresholds(symbol_key, tf_val, config)
+        return thr
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("ThresholdIndex is immutable")
+    
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    
+    def __reduce__(self):
+        # Нужен для pickle (st.cache_data): обходим заблокированный __setitem__
+        return (ThresholdIndex, (dict(self),))
+
+
+def _tf_param(tf_data, name):
+    """Параметр из строки tf_params (строгий режим: нет ключа -> None)."""
+    return float(tf_data[name]) if name in tf_data else None
+
+
+def _porog_base(porog_df, symbol_key_lower, tf_val):
+    """base_sens из porog_doi: первая строка с совпавшим timeframe (без учёта регистра)."""
+    if not porog_df.empty and symbol_key_lower in porog_df.columns and 'timeframe' in porog_df.columns:
+        try:
+            mask = porog_df['timeframe'].astype(str).str.lower() == tf_val.lower()
+            row = porog_df.loc[mask]
+            if not row.empty:
+                return float(row[symbol_key_lower].values[0])
+        except Exception:
+            pass
+    return None
+
+
+def _tf_data(tf_params, tf_val):
+    """Строка tf_params: сначала точный ключ, затем первый ключ без учёта регистра."""
+    tf_data = tf_params.get(tf_val)
+    if not tf_data:
+        for k_tf, v_data in tf_params.items():
+            if str(k_tf).lower() == tf_val.lower():
+                tf_data = v_data
+                break
+    return tf_data
+
+
+def _lookup_thresholds(symbol_key, tf_val, config, base_cache=None):
+    """
+    Поиск порогов по porog_doi / asset_coeffs / tf_params (СТРОГИЙ РЕЖИМ).
+    
+    Аргументы:
+        symbol_key: str(symbol_clean or '')
+        tf_val: str(tf or '4h')
+        config: Конфигурация с porog_doi, asset_coeffs, tf_params
+        base_cache: Словарь (symbol_lower, tf_lower) -> base_sens для
+            повторных вызовов при построении индекса
+    
+    Возвращает:
+        Thresholds (поля None если нет в БД)
+    """
+    porog_df = config.get('porog_doi', pd.DataFrame())    # Пороги по активам/TF
+    asset_coeffs = config.get('asset_coeffs', {})          # Коэффициенты активов
+    tf_params = config.get('tf_params', {})                # Параметры по таймфреймам
+    
+    symbol_key_lower = symbol_key.lower()
+    symbol_key_upper = symbol_key.upper()
+    
+    # Получение базового порога из таблицы (porog_doi)
+    if base_cache is None:
+        base_sens = _porog_base(porog_df, symbol_key_lower, tf_val)
+    else:
+        base_key = (symbol_key_lower, tf_val.lower())
+        if base_key not in base_cache:
+            base_cache[base_key] = _porog_base(porog_df, symbol_key_lower, tf_val)
+        base_sens = base_cache[base_key]
+    
+    # Получение коэффициента актива (asset_coeffs)
+    coeff = asset_coeffs[symbol_key_upper] if symbol_key_upper in asset_coeffs else None
+    
+    # Поиск параметров таймфрейма; все параметры должны быть явно указаны в БД
+    tf_data = _tf_data(tf_params, tf_val)
+    if not tf_data:
+        return Thresholds(base_sens=base_sens, coeff=coeff)
+    return Thresholds(
+        base_sens=base_sens,
+        coeff=coeff,
+        k_set=_tf_param(tf_data, 'k_set'),
+        k_ctr=_tf_param(tf_data, 'k_ctr'),
+        k_unl=_tf_param(tf_data, 'k_unl'),
+        tf_sens=_tf_param(tf_data, 'sens'),
+    )
+
+
+def _case_variants(values):
+    """Строки values и их варианты в нижнем / верхнем регистре."""
+    out = set()
+    for v in values:
+        v = str(v)
+        out.update((v, v.lower(), v.upper()))
+    return out
+
+
+def build_threshold_index(config):
+    """
+    Компилирует porog_doi / asset_coeffs / tf_params в ThresholdIndex.
+    
+    Каждое значение считается _lookup_thresholds() — тем же поиском, что у
+    resolve_thresholds() без индекса, поэтому порядок разрешения совпадает
+    (точный ключ tf_params раньше варианта в другом регистре, пустая строка
+    не останавливает поиск). Индексируются символы из колонок porog_doi и
+    asset_coeffs и таймфреймы из porog_doi / tf_params, каждый в исходном,
+    нижнем и верхнем регистре, плюс символ '' и TF '4h' по умолчанию.
+    
+    Аргументы:
+        config: Конфигурация из load_configurations()
+    
+    Возвращает:
+        ThresholdIndex
+    """
+    porog_df = config.get('porog_doi', pd.DataFrame())
+    asset_coeffs = config.get('asset_coeffs', {})
+    tf_params = config.get('tf_params', {})
+    
+    symbols = {''} | _case_variants(asset_coeffs)
+    tfs = {'4h'} | _case_variants(tf_params)
+    if not porog_df.empty:
+        symbols |= _case_variants(col for col in porog_df.columns if col != 'timeframe')
+        if 'timeframe' in porog_df.columns:
+            tfs |= _case_variants(porog_df['timeframe'].astype(str).tolist())
+    
+    base_cache = {}
+    return ThresholdIndex({
+        (sym, tf_val): _lookup_thresholds(sym, tf_val, config, base_cache)
+        for sym in symbols for tf_val in tfs
+    })
+
+
+def resolve_thresholds(symbol_clean, tf, config):
+    """
+    Находит пороговые параметры для пары (актив, таймфрейм).
+    
+    Если в config есть 'threshold_index' (build_threshold_index) — O(1) lookup,
+    иначе поиск по porog_doi / tf_params.
+    
+    СТРОГИЙ РЕЖИМ: данные только из БД, без fallback-значений.
+    
+    Аргументы:
+        symbol_clean: Очищенный символ актива (например "ETH")
+        tf: Таймфрейм свечи (None -> "4h")
+        config: Конфигурация с porog_doi, asset_coeffs, tf_params
+    
+    Возвращает:
+        Thresholds (поля None если нет в БД)
+    """
+    symbol_key = str(symbol_clean or '')
+    tf_val = str(tf or '4h')
+    
+    index = config.get('threshold_index')
+    if index is not None:
+        return index.lookup(symbol_key, tf_val, config)
+    return _lookup_thresholds(symbol_key, tf_val, config)
+
+
 def calculate_metrics(raw_data, config):
     """
     Рассчитывает все производные метрики на основе сырых данных.
@@ -604,31 +1155,9 @@ def calculate_metrics(raw_data, config):
     # =========================================================================
     # 6. ПОРОГОВАЯ ЛОГИКА (из конфигурации)
     # =========================================================================
-    porog_df = config.get('porog_doi', pd.DataFrame())    # Пороги по активам/TF
-    asset_coeffs = config.get('asset_coeffs', {})          # Коэффициенты активов
-    tf_params = config.get('tf_params', {})                # Параметры по таймфреймам
-    
-    symbol_key_lower = str(m.get('symbol_clean') or '').lower()
-    symbol_key_upper = str(m.get('symbol_clean') or '').upper()
-    tf_val = str(m.get('tf') or '4h')
-    
-    # СТРОГИЙ РЕЖИМ: данные только из БД, без fallback-значений
-    base_sens = None
-    coeff = None
-    
-    # Получение базового порога из таблицы (porog_doi)
-    if not porog_df.empty and symbol_key_lower in porog_df.columns and 'timeframe' in porog_df.columns:
-        try:
-            mask = porog_df['timeframe'].astype(str).str.lower() == tf_val.lower()
-            row = porog_df.loc[mask]
-            if not row.empty:
-                base_sens = float(row[symbol_key_lower].values[0])
-        except Exception:
-            pass
-    
-    # Получение коэффициента актива (asset_coeffs)
-    if symbol_key_upper in asset_coeffs:
-        coeff = asset_coeffs[symbol_key_upper]
+    thr = resolve_thresholds(m.get('symbol_clean'), m.get('tf'), config)
+    base_sens = thr.base_sens
+    coeff = thr.coeff
     
     # Расчёт финального порога (только если оба значения из БД)
     if base_sens is not None and coeff is not None:
@@ -647,29 +1176,10 @@ def calculate_metrics(raw_data, config):
     
     # Коэффициенты для SET/COUNTER/UNLOAD
     # СТРОГИЙ РЕЖИМ: все должны быть в tf_params
-    k_set = None
-    k_ctr = None
-    k_unl = None
-    tf_sens_base = None
-    
-    # Поиск параметров таймфрейма
-    tf_data = tf_params.get(tf_val)
-    if not tf_data:
-        for k_tf, v_data in tf_params.items():
-            if str(k_tf).lower() == tf_val.lower():
-                tf_data = v_data
-                break
-    
-    # Получение параметров из tf_data (строгий режим)
-    if tf_data:
-        # Все параметры должны быть явно указаны в БД
-        k_set = float(tf_data['k_set']) if 'k_set' in tf_data else None
-        k_ctr = float(tf_data['k_ctr']) if 'k_ctr' in tf_data else None
-        k_unl = float(tf_data['k_unl']) if 'k_unl' in tf_data else None
-        
-        if 'sens' in tf_data:
-            tf_sens_base = float(tf_data['sens'])
-
+    k_set = thr.k_set
+    k_ctr = thr.k_ctr
+    k_unl = thr.k_unl
+    tf_sens_base = thr.tf_sens
 
     if tf_sens_base is not None and k_set is not None and k_ctr is not None and k_unl is not None:
         t_base = tf_sens_base
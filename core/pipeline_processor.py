@@ -1,25 +1,63 @@
 """Pipeline Processor Module - Centralized batch processing logic."""
 
 import re
-from core.parsing_engine import parse_raw_input, calculate_metrics
+from collections import OrderedDict
+from time import perf_counter
+from core.parsing_engine import parse_raw_input, calculate_metrics, PARSE_MODE_SINGLE_PASS
 from core.report_generator import generate_xray, generate_composite
+from core.parse_cache import PARSE_CACHE, config_version
+from core.pipeline_stats import PipelineStats, timed_iter
+
+# Candle start: a line beginning with date/time
+CHUNK_START_RE = re.compile(r'(?m)^(?=\d{1,2}\.\d{1,2}\.\d{4}\s+\d{1,2}:\d{2})')
+
+# How many open groups stream_batch holds before flushing the oldest ones
+STREAM_WINDOW = 64
+
+
+def iter_chunks(raw_text):
+    """
+    Lazily split raw text into candle chunks (same as re.split on CHUNK_START_RE).
+    
+    Args:
+        raw_text: Raw pasted text
+    
+    Yields:
+        str: Non-empty stripped chunks in text order
+    """
+    prev = 0
+    for m in CHUNK_START_RE.finditer(raw_text):
+        chunk = raw_text[prev:m.start()].strip()
+        if chunk:
+            yield chunk
+        prev = m.start()
+    chunk = raw_text[prev:].strip()
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(chunk):
+    """Parser used by the pipeline (single-pass mode)."""
+    return parse_raw_input(chunk, mode=PARSE_MODE_SINGLE_PASS)
 
 
 class PipelineProcessor:
     """Processes raw text batches through parsing, enrichment, and analysis."""
     
-    def __init__(self, db_manager, config_loader):
+    def __init__(self, db_manager, config_loader, cache=PARSE_CACHE):
         """
         Initialize with dependencies.
         
         Args:
             db_manager: DatabaseManager instance for DB operations
             config_loader: Callable that returns config dict (e.g., load_configurations)
+            cache: ParseCache for repeated chunks (None disables caching)
         """
         self.db = db_manager
         self.config_loader = config_loader
+        self.cache = cache
     
-    def process_batch(self, raw_text):
+    def process_batch(self, raw_text, return_stats=False):
         """
         Central function to process raw text input (Tab 1 & Tab 3).
         
@@ -32,77 +70,266 @@ class PipelineProcessor:
         6. X-RAY Generation
         7. Composite Analysis (Grouping & Validation)
         
+        Args:
+            raw_text: Raw pasted text
+            return_stats: Also return PipelineStats (per-step time/calls/items)
+        
         Returns:
-            tuple: (batch, orphan_errors)
+            tuple: (batch, orphan_errors) or (batch, orphan_errors, stats)
                 - batch (list): List of processed candle dictionaries
                 - orphan_errors (list): List of validation error strings
+                - stats (PipelineStats): Only with return_stats=True
         """
+        stats = PipelineStats()
         config = self.config_loader()
         if not config:
-            return [], ["Configuration load failed"]
-        
-        # 1. Split & Clean
-        raw_chunks = re.split(r'(?m)^(?=\d{1,2}\.\d{1,2}\.\d{4}\s+\d{1,2}:\d{2})', raw_text)
-        raw_chunks = [x.strip() for x in raw_chunks if x.strip()]
+            result = ([], ["Configuration load failed"])
+            return (*result, stats.finish()) if return_stats else result
         
+        version = config.get('config_version') or config_version(config)
         merged_groups = {}
         orphan_errors = []
         
-        # 2. Iterate & Parse
-        for chunk in raw_chunks:
-            base_data = parse_raw_input(chunk)
-            
-            # STRICT CHECK: If TS is missing -> Error
-            if not base_data.get('ts'):
-                err = f"• {base_data.get('exchange', 'Unknown')} {base_data.get('symbol_clean', 'Unknown')} -> CRITICAL: Missing Timestamp/Exchange"
-                orphan_errors.append(err)
-                continue
-            
-            # Grouping for DB Merge
-            key = (base_data.get('exchange'), base_data.get('symbol_clean'), 
-                   base_data.get('tf'), base_data.get('ts'))
-            
-            if key not in merged_groups:
-                merged_groups[key] = base_data
-            else:
-                existing = merged_groups[key]
-                for k, v in base_data.items():
-                    if v and (k not in existing or not existing[k]):
-                        existing[k] = v
+        # 1. Split & Clean / 2. Iterate & Parse
+        for chunk in timed_iter(iter_chunks(raw_text), stats, "split"):
+            self._merge_chunk(merged_groups, chunk, orphan_errors, version, stats)
         
         local_batch = list(merged_groups.values())
         
         # 3. DB Enrichment
+        t0 = perf_counter()
         final_batch_list = self.db.fetch_and_merge(local_batch)
+        stats.add("db_enrich", perf_counter() - t0, len(local_batch))
         
         # 4. Metric Calculation & X-RAY
-        temp_all_candles = []
-        for raw_data in final_batch_list:
-            full_data = calculate_metrics(raw_data, config)
-            
-            # Если есть пропущенные поля — записываем в note
-            if full_data.get('missing_fields'):
-                missing_note = f"⚠️ Нет данных: {', '.join(full_data['missing_fields'])}"
-                existing_note = full_data.get('note') or ''
-                if missing_note not in existing_note:
-                    full_data['note'] = (existing_note + ' ' + missing_note).strip()
-            
-            # Если есть дивергенция — записываем в note
-            if full_data.get('price_vs_delta') == 'div':
-                price_sign = full_data.get('price_sign', 0)
-                delta_sign = full_data.get('cvd_sign', 0)
-                price_arrow = '↑' if price_sign > 0 else '↓'
-                delta_arrow = '↑' if delta_sign > 0 else '↓'
-                diver_note = f"⚠️ ДИВЕР: цена {price_arrow} дельта {delta_arrow}"
-                existing_note = full_data.get('note') or ''
-                if diver_note not in existing_note:
-                    full_data['note'] = (existing_note + ' ' + diver_note).strip()
+        temp_all_candles = [self._enrich(raw_data, config, version, stats) for raw_data in final_batch_list]
+        
+        result = self.finalize_batch(temp_all_candles, orphan_errors, stats)
+        return (*result, stats.finish()) if return_stats else result
+    
+    def stream_batch(self, raw_text, errors=None, window=STREAM_WINDOW, stats=None):
+        """
+        Streaming variant of steps 1-6 of process_batch.
+        
+        Yields enriched candles (DB merge + metrics + X-RAY) as soon as their
+        (exchange, symbol, tf, ts) group is complete. A group counts as complete
+        once more than `window` newer groups have been seen; the oldest groups
+        are then enriched with a single fetch_and_merge and yielded.
+        
+        Memory stays bounded by the window: besides the open groups, only the
+        parsed groups of the last `window` yielded candles and the keys of all
+        yielded candles are kept. A late chunk of one of those recent candles
+        is merged into its group, and if that fills anything, a corrected
+        candle (a new dict with the same candle_key) is yielded later. Dicts
+        already yielded are never modified. A late chunk of an older candle
+        cannot be merged any more: it is reported in errors and skipped.
+        
+        Keeping the last candle per candle_key, in order of first appearance,
+        gives finalize_batch(...) == process_batch(text) whenever no late
+        chunk was reported.
+        
+        Step 7 (composite & orphan validation) needs every candle and is run
+        separately.
+        
+        Args:
+            raw_text: Raw pasted text
+            errors: Optional list that receives parse and late-chunk errors
+            window: Number of open (and recently yielded) groups kept
+            stats: Optional PipelineStats to record steps 1-6 into
+        
+        Yields:
+            dict: Enriched candles in order of completion
+        """
+        if errors is None:
+            errors = []
+        if stats is None:
+            stats = PipelineStats()
+        
+        config = self.config_loader()
+        if not config:
+            errors.append("Configuration load failed")
+            return
+        
+        version = config.get('config_version') or config_version(config)
+        window = max(1, window)
+        pending = {}           # key -> base_data, insertion order (oldest first)
+        recent = OrderedDict() # key -> parsed group of a recently yielded candle (LRU)
+        flushed = set()        # keys of every yielded candle
+        
+        for chunk in timed_iter(iter_chunks(raw_text), stats, "split"):
+            key = self._merge_chunk(pending, chunk, errors, version, stats)
             
-            # Генерируем X-RAY отчёт для всех свечей
-            full_data['x_ray'] = generate_xray(full_data)
+            if key in recent:
+                # Late chunk of a recent candle: merge, re-yield if it changed
+                group = recent.pop(key)
+                if self._fill_group(group, pending.pop(key)):
+                    pending[key] = group
+                    flushed.discard(key)
+                    stats.count("late_merges")
+                else:
+                    recent[key] = group
+            elif key in flushed:
+                # Its group is gone: the chunk can no longer be merged
+                del pending[key]
+                exchange, symbol, tf, ts = key
+                errors.append(f"• {exchange} {symbol} {tf} {ts} -> Late chunk skipped: "
+                              f"candle was processed more than {window} candles earlier")
+                stats.count("late_chunks_skipped")
             
-            temp_all_candles.append(full_data)
+            if len(pending) > window:
+                # Flush the older half of the window with one fetch_and_merge
+                flush_count = len(pending) - window // 2
+                ready_keys = list(pending)[:flush_count]
+                yield from self._flush_keys(ready_keys, pending, recent, flushed, window, config, version, stats)
         
+        if pending:
+            yield from self._flush_keys(list(pending), pending, recent, flushed, window, config, version, stats)
+    
+    @staticmethod
+    def candle_key(candle):
+        """(exchange, symbol_clean, tf, ts) of a streamed candle; corrections share it."""
+        return (candle.get('exchange'), candle.get('symbol_clean'), candle.get('tf'), candle.get('ts'))
+    
+    def _flush_keys(self, keys, pending, recent, flushed, window, config, version, stats):
+        """Flush the pending groups of keys, keeping the last `window` of them in recent."""
+        ready = [pending.pop(k) for k in keys]
+        for key, group, candle in zip(keys, ready, self._flush(ready, config, version, stats)):
+            flushed.add(key)
+            recent[key] = group
+            if len(recent) > window:
+                recent.popitem(last=False)
+            yield candle
+    
+    def _flush(self, ready, config, version, stats):
+        """DB-enrich a block of complete groups and yield enriched candles."""
+        t0 = perf_counter()
+        merged = self.db.fetch_and_merge(ready)
+        stats.add("db_enrich", perf_counter() - t0, len(ready))
+        for raw_data in merged:
+            yield self._enrich(raw_data, config, version, stats)
+    
+    def cache_stats(self):
+        """Hit/miss counters of the parse cache (empty dict if disabled)."""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def _merge_chunk(self, merged_groups, chunk, orphan_errors, version, stats):
+        """Parse one chunk and merge it into its (exchange, symbol, tf, ts) group; returns the key."""
+        t0 = perf_counter()
+        if self.cache is not None:
+            parsed = []
+            def parser(text):
+                parsed.append(1)
+                return _parse_chunk(text)
+            base_data = self.cache.parse(chunk, version, parser)
+            if not parsed:
+                stats.count("parse_cache_hits")
+        else:
+            base_data = _parse_chunk(chunk)
+        t1 = perf_counter()
+        stats.add("parse", t1 - t0)
+        
+        key = self._group_chunk(merged_groups, base_data, orphan_errors, stats)
+        stats.add("filter_ts", perf_counter() - t1)
+        return key
+    
+    @staticmethod
+    def _group_chunk(merged_groups, base_data, orphan_errors, stats):
+        """Timestamp check and grouping of one parsed chunk; returns its key (None if rejected)."""
+        # STRICT CHECK: If TS is missing -> Error
+        if not base_data.get('ts'):
+            err = f"• {base_data.get('exchange', 'Unknown')} {base_data.get('symbol_clean', 'Unknown')} -> CRITICAL: Missing Timestamp/Exchange"
+            orphan_errors.append(err)
+            stats.count("missing_ts")
+            return None
+        
+        # Grouping for DB Merge
+        key = (base_data.get('exchange'), base_data.get('symbol_clean'), 
+               base_data.get('tf'), base_data.get('ts'))
+        
+        if key not in merged_groups:
+            merged_groups[key] = base_data
+        else:
+            PipelineProcessor._fill_group(merged_groups[key], base_data)
+        return key
+    
+    @staticmethod
+    def _fill_group(existing, base_data):
+        """Fill empty fields of a group from another chunk; True if anything changed."""
+        changed = False
+        for k, v in base_data.items():
+            if v and (k not in existing or not existing[k]):
+                existing[k] = v
+                changed = True
+        return changed
+    
+    def _enrich(self, raw_data, config, version, stats):
+        """Enrich one candle, through the cache when enabled."""
+        if self.cache is not None:
+            computed = []
+            def enricher(row):
+                computed.append(1)
+                return self._enrich_candle(row, config, stats)
+            full_data = self.cache.enrich(raw_data, version, enricher)
+            if not computed:
+                stats.count("enrich_cache_hits")
+            return full_data
+        return self._enrich_candle(raw_data, config, stats)
+    
+    @staticmethod
+    def _enrich_candle(raw_data, config, stats):
+        """Metrics, notes (missing fields / divergence) and X-RAY for one candle."""
+        t0 = perf_counter()
+        full_data = calculate_metrics(raw_data, config)
+        
+        # Если есть пропущенные поля — записываем в note
+        if full_data.get('missing_fields'):
+            missing_note = f"⚠️ Нет данных: {', '.join(full_data['missing_fields'])}"
+            existing_note = full_data.get('note') or ''
+            if missing_note not in existing_note:
+                full_data['note'] = (existing_note + ' ' + missing_note).strip()
+        
+        # Если есть дивергенция — записываем в note
+        if full_data.get('price_vs_delta') == 'div':
+            price_sign = full_data.get('price_sign', 0)
+            delta_sign = full_data.get('cvd_sign', 0)
+            price_arrow = '↑' if price_sign > 0 else '↓'
+            delta_arrow = '↑' if delta_sign > 0 else '↓'
+            diver_note = f"⚠️ ДИВЕР: цена {price_arrow} дельта {delta_arrow}"
+            existing_note = full_data.get('note') or ''
+            if diver_note not in existing_note:
+                full_data['note'] = (existing_note + ' ' + diver_note).strip()
+        
+        t1 = perf_counter()
+        stats.add("metrics", t1 - t0)
+        
+        # Генерируем X-RAY отчёт для всех свечей
+        full_data['x_ray'] = generate_xray(full_data)
+        stats.add("xray", perf_counter() - t1)
+        
+        return full_data
+    
+    def finalize_batch(self, temp_all_candles, orphan_errors, stats=None):
+        """
+        Step 7: Composite Analysis (Grouping & Validation).
+        
+        Args:
+            temp_all_candles: Enriched candles (from process_batch or stream_batch)
+            orphan_errors: Errors collected while parsing
+            stats: Optional PipelineStats to record step 7 into
+        
+        Returns:
+            tuple: (batch, orphan_errors), same as process_batch
+        """
+        if stats is None:
+            stats = PipelineStats()
+        t0 = perf_counter()
+        result = self._composite(temp_all_candles, orphan_errors, stats)
+        stats.add("composite", perf_counter() - t0, len(temp_all_candles))
+        return result
+    
+    @staticmethod
+    def _composite(temp_all_candles, orphan_errors, stats):
+        """Composite grouping, orphan validation and composite reports."""
         # 5. Composite Analysis (Strict Mode)
         final_save_list = []
         composite_errors = []
@@ -121,45 +348,48 @@ class PipelineProcessor:
             comp_groups[grp_key].append(row)
         
         # Separate Valid vs Orphans
-        valid_groups = []
+        valid_groups = []   # (key, group)
         orphans_groups = []
         
         for key, group in comp_groups.items():
             has_binance = any(c['exchange'] == 'Binance' for c in group)
             if has_binance:
-                valid_groups.append(group)
+                valid_groups.append((key, group))
             else:
-                orphans_groups.append(group)
+                orphans_groups.append((key, group))
+        
+        stats.count("composite_groups", len(comp_groups))
+        stats.count("orphan_groups", len(orphans_groups))
         
         # If orphans exist -> BLOCKING ERROR
         if orphans_groups:
-            for grp in orphans_groups:
+            # Indexes over valid keys: partial key -> first valid group (list order).
+            # A valid key differs from an orphan key in at least one part, so
+            # pair hits differ by exactly 1 part, single hits (without pair hits) by 2
+            pair_index = ({}, {}, {})    # (ts, sym), (ts, tf), (sym, tf)
+            single_index = ({}, {}, {})  # ts, sym, tf
+            for pos, ((ts, sym, tf), _) in enumerate(valid_groups):
+                for idx, part in zip(pair_index, ((ts, sym), (ts, tf), (sym, tf))):
+                    idx.setdefault(part, pos)
+                for idx, part in zip(single_index, (ts, sym, tf)):
+                    idx.setdefault(part, pos)
+            
+            for (o_ts, o_sym, o_tf), grp in orphans_groups:
                 orphan = grp[0]
                 
-                best_match = None
-                min_diff = 3
-                
-                o_ts = get_comp_key(orphan)[0]
-                o_sym = get_comp_key(orphan)[1]
-                o_tf = get_comp_key(orphan)[2]
+                # Best match: fewest differing parts, earliest valid group on ties
+                # (same pick as comparing against every valid group in order)
+                hits = [pos for idx, part in zip(pair_index, ((o_ts, o_sym), (o_ts, o_tf), (o_sym, o_tf)))
+                        if (pos := idx.get(part)) is not None]
+                if not hits:
+                    hits = [pos for idx, part in zip(single_index, (o_ts, o_sym, o_tf))
+                            if (pos := idx.get(part)) is not None]
                 
-                for v_grp in valid_groups:
-                    target = next((c for c in v_grp if c['exchange'] == 'Binance'), v_grp[0])
-                    t_ts = get_comp_key(target)[0]
-                    t_sym = get_comp_key(target)[1]
-                    t_tf = get_comp_key(target)[2]
-                    
-                    curr_diff = 0
-                    if o_ts != t_ts:
-                        curr_diff += 1
-                    if o_sym != t_sym:
-                        curr_diff += 1
-                    if o_tf != t_tf:
-                        curr_diff += 1
-                    
-                    if curr_diff < min_diff:
-                        min_diff = curr_diff
-                        best_match = target
+                best_match = None
+                best_key = None
+                if hits:
+                    best_key, v_grp = valid_groups[min(hits)]
+                    best_match = next((c for c in v_grp if c['exchange'] == 'Binance'), v_grp[0])
                 
                 err_msg = f"• {orphan.get('exchange')} {o_sym} {o_ts}"
                 members_str = ", ".join([f"{m.get('exchange')}" for m in grp])
@@ -167,9 +397,7 @@ class PipelineProcessor:
                 
                 if best_match:
                     reasons = []
-                    bm_ts = get_comp_key(best_match)[0]
-                    bm_sym = get_comp_key(best_match)[1]
-                    bm_tf = get_comp_key(best_match)[2]
+                    bm_ts, bm_sym, bm_tf = best_key
                     
                     if o_ts != bm_ts:
                         reasons.append(f"Время ({o_ts} vs {bm_ts})")
@@ -189,7 +417,7 @@ class PipelineProcessor:
         
         else:
             # No orphans - process valid groups
-            for group in valid_groups:
+            for _, group in valid_groups:
                 target_candle = next((c for c in group if c['exchange'] == 'Binance'), None)
                 if not target_candle:
                     target_candle = group[0]
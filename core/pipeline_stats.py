@@ -0,0 +1,76 @@
+"""Pipeline Stats Module - per-stage timing and counters for PipelineProcessor."""
+
+import json
+from time import perf_counter
+
+
+# The seven documented steps of PipelineProcessor.process_batch
+STAGES = (
+    "split",       # 1. Splitting by Exchange
+    "parse",       # 2. Parsing (parse_raw_input)
+    "filter_ts",   # 3. Timestamp filtering/forwarding
+    "db_enrich",   # 4. DB Enrichment (fetch_and_merge)
+    "metrics",     # 5. Metric Calculation
+    "xray",        # 6. X-RAY Generation
+    "composite",   # 7. Composite Analysis (Grouping & Validation)
+)
+
+
+class PipelineStats:
+    """Wall time, call counts and item counts per stage, plus free-form counters."""
+
+    def __init__(self):
+        """Initialize empty stats for all STAGES."""
+        self.stages = {name: {"seconds": 0.0, "calls": 0, "items": 0} for name in STAGES}
+        self.counters = {}
+        self._started = perf_counter()
+        self.total_seconds = 0.0
+
+    def add(self, name, seconds, items=1):
+        """Record one call of a stage that took `seconds` and handled `items`."""
+        st = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "items": 0})
+        st["seconds"] += seconds
+        st["calls"] += 1
+        st["items"] += items
+
+    def count(self, name, n=1):
+        """Increment a counter."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        """Freeze total wall time (since creation)."""
+        self.total_seconds = perf_counter() - self._started
+        return self
+
+    def to_dict(self):
+        """Plain dict: stages (with ms) + counters + total."""
+        return {
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "stages": {
+                name: {
+                    "ms": round(st["seconds"] * 1000, 3),
+                    "calls": st["calls"],
+                    "items": st["items"]
+                }
+                for name, st in self.stages.items()
+            },
+            "counters": dict(self.counters)
+        }
+
+    def to_json(self, indent=2):
+        """JSON export of to_dict()."""
+        return json.dumps(self.to_dict(), indent=indent, ensure_ascii=False)
+
+
+def timed_iter(iterable, stats, name):
+    """Yield from iterable, recording the time spent producing each item under `name`."""
+    it = iter(iterable)
+    while True:
+        t0 = perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            stats.add(name, perf_counter() - t0, items=0)
+            return
+        stats.add(name, perf_counter() - t0)
+        yield item
@@ -0,0 +1,189 @@
+"""Query Cache Module - read-through TTL cache for DatabaseManager reads."""
+
+import threading
+import time as time_mod
+from collections import OrderedDict
+from datetime import datetime, time
+
+import pandas as pd
+
+from core.local_mirror import ts_sort_key
+
+
+DEFAULT_QUERY_CACHE_SIZE = 256
+DEFAULT_QUERY_CACHE_TTL = 60
+
+# Columns the read filters look at: changing them can move a row between results
+FILTER_COLUMNS = frozenset({'ts', 'tf', 'symbol_clean'})
+
+
+class QueryScope:
+    """
+    What a cached result depends on.
+
+    Row queries: the filter footprint (date range, TFs, symbols) and the ids
+    returned. Distinct queries (symbol list): the set of values returned.
+    """
+
+    def __init__(self, start_date=None, end_date=None, tfs=None, symbols=None, ids=(), values=None):
+        """
+        Args:
+            start_date, end_date, tfs, symbols: Filters as in load_candles
+            ids: ids present in the result
+            values: Distinct symbol_clean values (symbol list queries)
+        """
+        self.start = ts_sort_key(start_date) if start_date else None
+        self.end = ts_sort_key(datetime.combine(end_date, time(23, 59, 59))) if end_date else None
+        self.tfs = frozenset(t.lower() for t in tfs) if tfs else None
+        self.symbols = frozenset(symbols) if symbols else None
+        self.ids = frozenset(ids)
+        self.values = frozenset(values) if values is not None else None
+
+    def matches_row(self, row):
+        """True if writing row could change this result."""
+        if self.values is not None:
+            return row.get('symbol_clean') not in self.values
+        if self.tfs is not None and str(row.get('tf', '')).lower() not in self.tfs:
+            return False
+        if self.symbols is not None and row.get('symbol_clean') not in self.symbols:
+            return False
+        if self.start or self.end:
+            key = ts_sort_key(row.get('ts'))
+            if key is None:
+                return True
+            if self.start and key < self.start:
+                return False
+            if self.end and key > self.end:
+                return False
+        return True
+
+    def matches_ids(self, ids, changes=None):
+        """
+        True if updating (changes) or deleting (changes=None) ids could change
+        this result.
+        """
+        if self.values is not None:
+            return changes is None or 'symbol_clean' in changes
+        if changes is not None and FILTER_COLUMNS.intersection(changes):
+            # Row may move into results that did not contain it
+            return True
+        return not self.ids.isdisjoint(ids)
+
+
+def _copy_result(value):
+    """Copy of a cached result: callers (UI tabs) mutate DataFrames and lists."""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class QueryCache:
+    """
+    Thread-safe LRU + TTL cache of query results with scoped invalidation.
+    Keys are tuples of query parameters; each entry keeps its QueryScope so
+    writes drop only the results they can affect.
+    """
+
+    def __init__(self, maxsize=DEFAULT_QUERY_CACHE_SIZE, ttl=DEFAULT_QUERY_CACHE_TTL):
+        """Initialize with max entries and time-to-live in seconds (0 disables)."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+
+    def get(self, key):
+        """Return a copy of the cached result or None (missing / expired)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value, _ = entry
+            if time_mod.monotonic() >= expires:
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return _copy_result(value)
+
+    def put(self, key, value, scope):
+        """Store result with its scope, evicting least recently used entries."""
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time_mod.monotonic() + self.ttl, _copy_result(value), scope)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader, scope_of):
+        """
+        Read-through: cached result or loader() stored under key.
+
+        Args:
+            key: Hashable query parameters
+            loader: Callable () -> result
+            scope_of: Callable result -> QueryScope
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        result = loader()
+        self.put(key, result, scope_of(result))
+        return result
+
+    def _drop(self, predicate):
+        with self._lock:
+            stale = [k for k, (_, _, scope) in self._data.items() if predicate(scope)]
+            for k in stale:
+                del self._data[k]
+            self.invalidated += len(stale)
+        return len(stale)
+
+    def invalidate_rows(self, rows):
+        """Drop results that written (upserted) rows could change."""
+        rows = list(rows or [])
+        if not rows:
+            return 0
+        return self._drop(lambda scope: any(scope.matches_row(r) for r in rows))
+
+    def invalidate_ids(self, ids, changes=None):
+        """Drop results affected by updating (changes) or deleting (None) ids."""
+        ids = set(ids or [])
+        if not ids:
+            return 0
+        return self._drop(lambda scope: scope.matches_ids(ids, changes))
+
+    def clear(self):
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.expired = 0
+            self.invalidated = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Counters as a plain dict."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "invalidated": self.invalidated,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hit_rate": (self.hits / total) if total else 0.0
+        }
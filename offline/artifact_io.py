@@ -0,0 +1,561 @@
+"""
+Artifact I/O for offline/data: how stages 1-6 write and read their outputs.
+
+Two kinds of artifacts:
+- Record sets (Stage 1 `_clean`, Stage 2 `_features`): lists of segment
+  records, each with one nested list of rows (candles / steps). Stored
+  columnar in `.npz`, in blocks of up to BLOCK_ROWS rows / BLOCK_RECORDS
+  records: one typed array per row field, plus segment offsets and lengths;
+  the record-level part is compact JSON. Blocks are streamed into the archive
+  as they fill, and iter_records reads them back one at a time, so neither
+  side holds a whole set. Loading returns exactly the records that were
+  written (same keys, order, types, None / NaN).
+- Metadata (bins, rules, stats, manifests): compact JSON. Without indent the
+  stdlib json uses its C encoder (indent=2 falls back to the pure-Python one),
+  and NaN / big ints round-trip exactly, unlike third-party encoders.
+
+OFFLINE_ARTIFACT_FORMAT=json switches record sets back to indented JSON;
+OFFLINE_ARTIFACT_DEBUG_JSON=1 additionally writes every artifact as indented
+JSON (the old format) for inspection. Writing a record set removes its file
+in the other format, so readers (which take whichever file exists, preferring
+the configured format) never pick up a stale one.
+"""
+
+import json
+import os
+import zipfile
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_JSON = "json"
+FORMAT_NPZ = "npz"
+ARTIFACT_FORMAT = os.getenv("OFFLINE_ARTIFACT_FORMAT", FORMAT_NPZ)
+DEBUG_JSON = os.getenv("OFFLINE_ARTIFACT_DEBUG_JSON", "") == "1"
+DATA_DIR = Path(__file__).parent / "data"
+
+# Path of the nested row list inside each record
+CLEAN_ROWS = ("data", "CONTEXT", "DATA")
+FEATURES_ROWS = ("steps",)
+
+# Column kinds: bool / int64 / float64 / anything else (JSON)
+_KIND_BOOL = "b"
+_KIND_INT = "i"
+_KIND_FLOAT = "f"
+_KIND_JSON = "o"
+_ARRAY_CODES = {_KIND_BOOL: "b", _KIND_INT: "q", _KIND_FLOAT: "d"}
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# npz block size: a block is written out once either limit is reached
+BLOCK_ROWS = 1 << 16
+BLOCK_RECORDS = 4096
+
+
+# =============================================================================
+# PATHS & JSON
+# =============================================================================
+
+def artifact_base(symbol, tf, exchange, name):
+    """offline/data/<symbol>_<tf>_<exchange>_<name> (no extension)."""
+    clean_symbol = symbol.replace("/", "").replace(":", "")
+    clean_tf = tf.replace("/", "")
+    clean_ex = exchange.replace("/", "")
+    return DATA_DIR / f"{clean_symbol}_{clean_tf}_{clean_ex}_{name}"
+
+
+def _with_ext(base, ext):
+    return Path(f"{base}.{ext}")
+
+
+def dumps(obj, indent=False):
+    """JSON text: compact (C encoder) or, with indent=True, indent=2."""
+    if indent:
+        return json.dumps(obj, indent=2, default=str)
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+def loads(text):
+    return json.loads(text)
+
+
+def _replace_file(path, text):
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def save_json(path, obj, indent=None):
+    """Metadata artifact: compact JSON (indented when DEBUG_JSON or indent=True)."""
+    _replace_file(path, dumps(obj, indent=DEBUG_JSON if indent is None else indent))
+
+
+def load_json(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+# =============================================================================
+# RECORD SET WRITERS
+# =============================================================================
+
+def _remove(paths):
+    """Deletes files superseded by a new artifact (the other format of a record set)."""
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+
+
+def _indent_json(obj, level):
+    """json.dumps(indent=2) of obj as it appears nested `level` deep."""
+    return json.dumps(obj, indent=2, default=str).replace("\n", "\n" + "  " * level)
+
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array item by item (same bytes as json.dump(list, indent=2)
+    at the given nesting level) into a temp file; close() moves it into place
+    (and removes the `replaces` paths), abort() discards it, so a failed run
+    never leaves a half-written file.
+    """
+
+    def __init__(self, path, level=1, replaces=()):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self.level = level
+        self.replaces = replaces
+        self.count = 0
+        self._f = open(self.tmp, "w")
+        self._f.write("[")
+
+    def write(self, item):
+        self._f.write(("\n" if self.count == 0 else ",\n") + "  " * self.level + _indent_json(item, self.level))
+        self.count += 1
+
+    def close(self):
+        if self.count:
+            self._f.write("\n" + "  " * (self.level - 1))
+        self._f.write("]")
+        self._f.close()
+        os.replace(self.tmp, self.path)
+        _remove(self.replaces)
+
+    def abort(self):
+        self._f.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+class _Column:
+    """One row field: typed array while values share a kind, else a list."""
+
+    __slots__ = ("kind", "values", "none_mask", "has_none")
+
+    def __init__(self):
+        self.kind = None
+        self.values = None
+        self.none_mask = bytearray()
+        self.has_none = False
+
+    @staticmethod
+    def _kind_of(val):
+        t = type(val)
+        if t is bool:
+            return _KIND_BOOL
+        if t is int:
+            return _KIND_INT if _INT64_MIN <= val <= _INT64_MAX else _KIND_JSON
+        if t is float:
+            return _KIND_FLOAT
+        return _KIND_JSON
+
+    def _to_json_kind(self):
+        vals = self.values.tolist() if self.values is not None else [None] * len(self.none_mask)
+        if self.kind == _KIND_BOOL:
+            vals = [bool(v) for v in vals]
+        self.values = [None if n else v for v, n in zip(vals, self.none_mask)]
+        self.kind = _KIND_JSON
+
+    def append(self, val):
+        if val is None:
+            self.none_mask.append(1)
+            self.has_none = True
+            if self.kind is not None:
+                self.values.append(None if self.kind == _KIND_JSON else 0)
+            return
+        kind = self._kind_of(val)
+        if self.kind is None:
+            self.kind = kind
+            if kind == _KIND_JSON:
+                self.values = [None] * len(self.none_mask)
+            else:
+                self.values = array(_ARRAY_CODES[kind], bytes(len(self.none_mask) * array(_ARRAY_CODES[kind]).itemsize))
+        elif kind != self.kind and self.kind != _KIND_JSON:
+            self._to_json_kind()
+        self.none_mask.append(0)
+        self.values.append(val)
+
+
+def _flatten(row, prefix=(), out=None):
+    """Leaf (path, value) pairs of a row dict, in key order; {} is a leaf."""
+    if out is None:
+        out = []
+    for key, val in row.items():
+        path = prefix + (key,)
+        if type(val) is dict and val:
+            _flatten(val, path, out)
+        else:
+            out.append((path, val))
+    return out
+
+
+class ColumnarWriter:
+    """
+    Record-set writer for the npz format (same write / close / abort / count
+    interface as JsonArrayWriter). Rows are appended to per-field typed
+    arrays as records arrive; every BLOCK_ROWS rows / BLOCK_RECORDS records
+    the block is written into the temp archive and dropped, so memory holds
+    at most one block. close() adds the top-level meta and moves the archive
+    into place (removing the `replaces` paths).
+    """
+
+    def __init__(self, path, rows_path, replaces=(), block_rows=BLOCK_ROWS, block_records=BLOCK_RECORDS):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        self.rows_path = tuple(rows_path)
+        self.replaces = replaces
+        self.block_rows = block_rows
+        self.block_records = block_records
+        self.count = 0
+        self.blocks = 0
+        self._zip = zipfile.ZipFile(self.tmp, "w", allowZip64=True)
+        self._new_block()
+
+    def _new_block(self):
+        self._records = []
+        self._lengths = array("q")
+        self._row_layout = array("i")
+        self._layouts = {}
+        self._columns = {}
+
+    def _strip(self, record):
+        """(record with the row list replaced by None, rows or None)."""
+        node = record
+        for key in self.rows_path:
+            if type(node) is not dict or key not in node:
+                return record, None
+            node = node[key]
+        if type(node) is not list or not all(type(r) is dict for r in node):
+            return record, None
+        stripped = dict(record)
+        parent = stripped
+        for key in self.rows_path[:-1]:
+            parent[key] = dict(parent[key])
+            parent = parent[key]
+        parent[self.rows_path[-1]] = None
+        return stripped, node
+
+    def write(self, record):
+        stripped, rows = self._strip(record)
+        self._records.append(dumps(stripped))
+        self._lengths.append(-1 if rows is None else len(rows))
+        for row in rows or ():
+            leaves = _flatten(row)
+            layout = tuple(path for path, _ in leaves)
+            idx = self._layouts.get(layout)
+            if idx is None:
+                idx = self._layouts[layout] = len(self._layouts)
+                for path in layout:
+                    self._columns.setdefault(path, _Column())
+            self._row_layout.append(idx)
+            for path, val in leaves:
+                self._columns[path].append(val)
+        self.count += 1
+        if len(self._row_layout) >= self.block_rows or len(self._records) >= self.block_records:
+            self._write_block()
+
+    def _write_array(self, name, arr):
+        # Same member layout as np.savez (stored .npy entries)
+        with self._zip.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(arr), allow_pickle=False)
+
+    def _write_block(self):
+        prefix = f"b{self.blocks}."
+        paths = list(self._columns)
+        col_index = {p: k for k, p in enumerate(paths)}
+        specs = []
+        for k, path in enumerate(paths):
+            col = self._columns[path]
+            kind = col.kind or _KIND_JSON
+            if kind == _KIND_JSON:
+                values = col.values if col.values is not None else [None] * len(col.none_mask)
+                self._write_array(f"{prefix}c{k}", np.frombuffer(dumps(values).encode(), dtype=np.uint8))
+            else:
+                dtype = {_KIND_BOOL: np.bool_, _KIND_INT: np.int64, _KIND_FLOAT: np.float64}[kind]
+                self._write_array(f"{prefix}c{k}",
+                                  np.frombuffer(col.values, dtype=np.int8 if kind == _KIND_BOOL else dtype).astype(dtype))
+                if col.has_none:
+                    self._write_array(f"{prefix}m{k}",
+                                      np.frombuffer(bytes(col.none_mask), dtype=np.uint8).astype(np.bool_))
+            specs.append({"path": list(path), "kind": kind, "has_none": col.has_none and kind != _KIND_JSON})
+        meta = {
+            "rows_path": list(self.rows_path),
+            "columns": specs,
+            "layouts": [[col_index[p] for p in layout] for layout in self._layouts],
+        }
+        lengths = np.frombuffer(self._lengths, dtype=np.int64) if self._lengths else np.zeros(0, np.int64)
+        self._write_array(f"{prefix}lengths", lengths)
+        self._write_array(f"{prefix}offsets", np.concatenate([[0], np.cumsum(np.maximum(lengths, 0))[:-1]])
+                          .astype(np.int64) if len(lengths) else np.zeros(0, np.int64))
+        self._write_array(f"{prefix}row_layout", np.frombuffer(self._row_layout, dtype=np.int32).astype(np.int32)
+                          if self._row_layout else np.zeros(0, np.int32))
+        self._write_array(f"{prefix}meta", np.frombuffer(dumps(meta).encode(), dtype=np.uint8))
+        self._write_array(f"{prefix}records",
+                          np.frombuffer(("[" + ",".join(self._records) + "]").encode(), dtype=np.uint8))
+        self.blocks += 1
+        self._new_block()
+
+    def close(self):
+        if self._records:
+            self._write_block()
+        meta = {"version": 2, "rows_path": list(self.rows_path), "blocks": self.blocks}
+        self._write_array("meta", np.frombuffer(dumps(meta).encode(), dtype=np.uint8))
+        self._zip.close()
+        os.replace(self.tmp, self.path)
+        _remove(self.replaces)
+
+    def abort(self):
+        self._zip.close()
+        self.tmp.unlink(missing_ok=True)
+        self._new_block()
+
+
+class TeeWriter:
+    """Writes every record to several writers (npz + debug JSON export)."""
+
+    def __init__(self, *writers):
+        self.writers = writers
+
+    @property
+    def count(self):
+        return self.writers[0].count
+
+    def write(self, record):
+        for w in self.writers:
+            w.write(record)
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+
+    def abort(self):
+        for w in self.writers:
+            w.abort()
+
+
+def open_records(base, rows_path, fmt=None, debug_json=None):
+    """
+    Writer for a record set at base (+ .npz / .json).
+
+    Args:
+        base: Path without extension (artifact_base)
+        rows_path: Keys of the nested row list (CLEAN_ROWS / FEATURES_ROWS)
+        fmt: FORMAT_NPZ / FORMAT_JSON (default: ARTIFACT_FORMAT)
+        debug_json: Also write indented JSON (default: DEBUG_JSON)
+
+    Returns:
+        Writer with write(record) / close() / abort() / count; close()
+        removes the set's file in the other format (unless debug_json)
+    """
+    fmt = fmt or ARTIFACT_FORMAT
+    debug_json = DEBUG_JSON if debug_json is None else debug_json
+    npz_path, json_path = _with_ext(base, "npz"), _with_ext(base, "json")
+    if fmt == FORMAT_JSON:
+        return JsonArrayWriter(json_path, replaces=(npz_path,))
+    if debug_json:
+        return TeeWriter(ColumnarWriter(npz_path, rows_path), JsonArrayWriter(json_path))
+    return ColumnarWriter(npz_path, rows_path, replaces=(json_path,))
+
+
+def save_records(base, records, rows_path, fmt=None, debug_json=None):
+    """Writes a whole record set (see open_records)."""
+    writer = open_records(base, rows_path, fmt, debug_json)
+    try:
+        for record in records:
+            writer.write(record)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.count
+
+
+# =============================================================================
+# RECORD SET READERS
+# =============================================================================
+
+class _Subtree(list):
+    """Nested dict level of a layout tree: [(key, values | _Subtree)]."""
+
+
+def _build_rows(tree, n):
+    """
+    Rows from a layout tree, n rows; nested dicts are built level by level
+    with zip so the work stays in C loops.
+    """
+    keys = []
+    columns = []
+    for key, node in tree:
+        keys.append(key)
+        columns.append(_build_rows(node, n) if isinstance(node, _Subtree) else node)
+    if not keys:
+        return [{} for _ in range(n)]
+    return [dict(zip(keys, vals)) for vals in zip(*columns)]
+
+
+def _layout_tree(paths, values_of):
+    """Layout tree (_Subtree) of leaf paths, in path order."""
+    tree = _Subtree()
+    index = {}
+    for path in paths:
+        node, idx = tree, index
+        for key in path[:-1]:
+            if key not in idx:
+                sub = _Subtree()
+                idx[key] = (sub, {})
+                node.append((key, sub))
+            node, idx = idx[key]
+        node.append((path[-1], values_of(path)))
+    return tree
+
+
+def _blocks(z):
+    """(key prefix, block meta) of every block of an open npz set, in order."""
+    meta = loads(z["meta"].tobytes())
+    if meta.get("version") == 1:
+        # Single-block archive of the first npz writer
+        yield "", meta
+        return
+    for j in range(meta["blocks"]):
+        yield f"b{j}.", loads(z[f"b{j}.meta"].tobytes())
+
+
+def _block_columns(z, prefix, meta):
+    """
+    Raw columnar view of one block.
+
+    Returns:
+        dict: meta, lengths, offsets, row_layout, records (list), and
+        columns {path tuple: (ndarray or list, none mask or None)}
+    """
+    columns = {}
+    for k, spec in enumerate(meta["columns"]):
+        if spec["kind"] == _KIND_JSON:
+            values = loads(z[f"{prefix}c{k}"].tobytes())
+        else:
+            values = z[f"{prefix}c{k}"]
+        mask = z[f"{prefix}m{k}"] if spec["has_none"] else None
+        columns[tuple(spec["path"])] = (values, mask)
+    return {
+        "meta": meta,
+        "lengths": z[f"{prefix}lengths"],
+        "offsets": z[f"{prefix}offsets"],
+        "row_layout": z[f"{prefix}row_layout"],
+        "records": loads(z[f"{prefix}records"].tobytes()),
+        "columns": columns,
+    }
+
+
+def _decode_block(view):
+    """Records of one block with their row lists rebuilt."""
+    meta = view["meta"]
+    row_layout = view["row_layout"]
+    specs = [tuple(s["path"]) for s in meta["columns"]]
+
+    # Python values per column (None restored from the mask)
+    col_values = []
+    for path in specs:
+        values, mask = view["columns"][path]
+        values = values.tolist() if isinstance(values, np.ndarray) else values
+        if mask is not None:
+            values = [None if m else v for v, m in zip(values, mask.tolist())]
+        col_values.append(values)
+
+    # Rows per layout: a column holds values of every layout that has the field
+    rows = [None] * len(row_layout)
+    layouts = meta["layouts"]
+    if len(layouts) == 1:
+        rows = _build_rows(_layout_tree([specs[k] for k in layouts[0]],
+                                        dict(zip(specs, col_values)).__getitem__), len(row_layout))
+    elif layouts:
+        has_col = np.zeros((len(layouts), len(specs)), dtype=bool)
+        for li, cols in enumerate(layouts):
+            has_col[li, cols] = True
+        for li, cols in enumerate(layouts):
+            row_idx = np.nonzero(row_layout == li)[0]
+            picked = {}
+            for k in cols:
+                pos = np.cumsum(has_col[row_layout, k]) - 1
+                picked[specs[k]] = [col_values[k][p] for p in pos[row_idx].tolist()]
+            built = _build_rows(_layout_tree([specs[k] for k in cols], picked.__getitem__), len(row_idx))
+            for r, row in zip(row_idx.tolist(), built):
+                rows[r] = row
+
+    rows_path = meta["rows_path"]
+    records = view["records"]
+    for record, start, n in zip(records, view["offsets"].tolist(), view["lengths"].tolist()):
+        if n < 0:
+            continue
+        node = record
+        for key in rows_path[:-1]:
+            node = node[key]
+        node[rows_path[-1]] = rows[start:start + n]
+    return records
+
+
+def _iter_npz(path, rows=True):
+    with np.load(path, allow_pickle=False) as z:
+        for prefix, meta in _blocks(z):
+            if rows:
+                yield from _decode_block(_block_columns(z, prefix, meta))
+            else:
+                yield from loads(z[f"{prefix}records"].tobytes())
+
+
+def find_records(base, fmt=None):
+    """Existing file of a record set (configured format first) or None."""
+    fmt = fmt or ARTIFACT_FORMAT
+    order = ("npz", "json") if fmt == FORMAT_NPZ else ("json", "npz")
+    for ext in order:
+        path = _with_ext(base, ext)
+        if path.exists():
+            return path
+    return None
+
+
+def iter_records(base, fmt=None, rows=True):
+    """
+    Records of the set at base in stored order (nothing if there is no
+    file). An npz set is decoded one block at a time; a JSON set is parsed
+    whole. rows=False as in load_records.
+    """
+    path = find_records(base, fmt)
+    if path is None:
+        return
+    if path.suffix == ".npz":
+        yield from _iter_npz(path, rows)
+    else:
+        yield from load_json(path)
+
+
+def load_records(base, fmt=None, rows=True):
+    """
+    Record set at base as a list of dicts (None if there is no file).
+    rows=False skips rebuilding the nested row lists of an npz set (they are
+    left as None) for stages that read rows from the candle tensor; JSON sets
+    are always returned whole.
+    """
+    path = find_records(base, fmt)
+    if path is None:
+        return None
+    if path.suffix == ".npz":
+        return list(_iter_npz(path, rows))
+    return load_json(path)
@@ -0,0 +1,306 @@
+"""
+Packed candle tensor for offline stages (Stage 1 output next to _clean).
+
+Stages 2, 5 and 6 only need a handful of numeric candle fields. Stage 1 packs
+them into one 2-D float64 array (total_candles x TENSOR_FIELDS), saved as
+`<symbol>_<tf>_<exchange>_candles.npy`, with the candle ts as a
+datetime64[s] array in `_candles_ts.npy` (both memory-mapped on load), plus
+`_candles_index.npz` with per-segment offsets / lengths and segment ids.
+A stage then slices contiguous rows of one segment instead of walking
+seg["data"]["CONTEXT"]["DATA"] dicts, and loads _clean without rebuilding
+its row lists. The writer streams both .npy files in blocks of BLOCK_ROWS
+candles, so Stage 1 memory does not grow with the number of candles.
+
+Exactness: a segment is packed only if every value converts to float and
+back unchanged (None -> NaN; ints / bools / strings / NaN in value fields are
+not packed) and every ts is None or an ISO 'YYYY-MM-DDTHH:MM:SS' string
+(as parse_raw_input writes it). Such segments are flagged and the stages
+fall back to the dict path for them, so results and raised errors are the
+same either way.
+"""
+
+import math
+import os
+import struct
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from .artifact_io import BLOCK_ROWS, dumps, load_records, loads
+except ImportError:
+    from artifact_io import BLOCK_ROWS, dumps, load_records, loads
+
+# Compared with 0 only (Stage 2 div_type); must be present
+SIGN_FIELDS = ("price_sign", "cvd_sign")
+# Stored as int(bool(value)) with missing -> 0 (Stage 2 oi_flags)
+FLAG_FIELDS = ("oi_set", "oi_unload", "oi_counter", "oi_in_sens")
+# Float or None (NaN in the tensor)
+VALUE_FIELDS = (
+    "cvd_pct", "clv_pct", "upper_tail_pct", "lower_tail_pct",   # Stage 2 CORE_STATE / td
+    "volume", "doi_pct", "liq_long", "liq_short",                # Stage 2 BOOST, STATS
+    "oi_close", "high", "low", "close",                          # STATS
+)
+TENSOR_FIELDS = SIGN_FIELDS + FLAG_FIELDS + VALUE_FIELDS
+FIELD_INDEX = {f: k for k, f in enumerate(TENSOR_FIELDS)}
+
+_NAN = float("nan")
+_NAT = np.datetime64("NaT", "s").astype(np.int64).item()
+TS_DTYPE = np.dtype("datetime64[s]")
+
+
+def tensor_paths(base):
+    """(values .npy, ts .npy, index .npz) for an artifact_base(..., "candles")."""
+    return Path(f"{base}.npy"), Path(f"{base}_ts.npy"), Path(f"{base}_index.npz")
+
+
+def _candles_of(record):
+    """seg["data"]["CONTEXT"]["DATA"] if it is a list of dicts, else None."""
+    node = record
+    for key in ("data", "CONTEXT", "DATA"):
+        if type(node) is not dict:
+            return None
+        node = node.get(key)
+    if type(node) is not list or not all(type(c) is dict for c in node):
+        return None
+    return node
+
+
+def _pack_candle(c, out):
+    """Appends one tensor row to out; False if a value would not round-trip."""
+    for f in SIGN_FIELDS:
+        v = c.get(f)
+        if type(v) not in (int, float) or v != v:
+            return False
+        out.append(float(v))
+    for f in FLAG_FIELDS:
+        out.append(1.0 if c.get(f, 0) else 0.0)
+    for f in VALUE_FIELDS:
+        v = c.get(f)
+        if v is None:
+            out.append(_NAN)
+        elif type(v) is float and v == v:
+            out.append(v)
+        else:
+            return False
+    return True
+
+
+def _pack_ts(ts, out):
+    """Appends ts as datetime64[s] seconds to out; False if it would not round-trip."""
+    if ts is None:
+        out.append(_NAT)
+        return True
+    if type(ts) is not str or len(ts) != 19 or ts[10] != "T":
+        return False
+    try:
+        dt = np.datetime64(ts, "s")
+    except ValueError:
+        return False
+    if str(dt) != ts:
+        return False
+    out.append(dt.astype(np.int64).item())
+    return True
+
+
+class _NpyStream:
+    """
+    .npy file written in appended blocks of rows: a fixed-size header is
+    reserved up front and filled in with the final shape on close.
+    """
+
+    HEADER_SIZE = 128
+
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp.npy")
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self._file = open(self.tmp, "wb")
+        self._file.write(b"\0" * self.HEADER_SIZE)
+
+    def append(self, buf, rows):
+        self._file.write(memoryview(buf).cast("B"))
+        self.rows += rows
+
+    def close(self):
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                       "shape": (self.rows,) + self.row_shape})
+        # magic + version 1.0 + uint16 length, header padded with spaces to HEADER_SIZE
+        header = header.ljust(self.HEADER_SIZE - 10 - 1) + "\n"
+        self._file.seek(0)
+        self._file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        self._file.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+class CandleTensorWriter:
+    """
+    Builds the tensor from clean records as Stage 1 writes them (same
+    write / close / abort / count interface as the artifact_io writers).
+    Candle values and ts are flushed to the .npy files every block_rows
+    candles; only the per-segment index (lengths, packed flags, ids) stays
+    in memory until close.
+    """
+
+    def __init__(self, base, block_rows=BLOCK_ROWS):
+        self.values_path, self.ts_path, self.index_path = tensor_paths(base)
+        self.block_rows = block_rows
+        self.count = 0
+        self._values_file = _NpyStream(self.values_path, np.float64, (len(TENSOR_FIELDS),))
+        self._ts_file = _NpyStream(self.ts_path, TS_DTYPE)
+        self._values = array("d")
+        self._ts = array("q")
+        self._lengths = array("q")
+        self._packed = array("b")
+        self._ids = []
+
+    def write(self, record):
+        candles = _candles_of(record)
+        row, ts = array("d"), array("q")
+        packed = candles is not None and all(_pack_candle(c, row) and _pack_ts(c.get("ts"), ts)
+                                             for c in candles)
+        if packed:
+            self._values.extend(row)
+            self._ts.extend(ts)
+        self._lengths.append(len(candles) if packed else 0)
+        self._packed.append(packed)
+        self._ids.append(record.get("id") if type(record) is dict else None)
+        self.count += 1
+        if len(self._ts) >= self.block_rows:
+            self._write_block()
+
+    def _write_block(self):
+        self._values_file.append(self._values, len(self._ts))
+        self._ts_file.append(self._ts, len(self._ts))
+        self._values = array("d")
+        self._ts = array("q")
+
+    def _ids_array(self):
+        """Segment ids as a str / int64 array, or JSON bytes (ids_json) for mixed ids."""
+        ids = self._ids
+        if all(type(i) is str for i in ids):
+            return "ids", np.array(ids, dtype=str) if ids else np.zeros(0, "U1")
+        if all(type(i) is int and -2 ** 63 <= i < 2 ** 63 for i in ids):
+            return "ids", np.array(ids, dtype=np.int64)
+        return "ids_json", np.frombuffer(dumps(ids).encode(), dtype=np.uint8)
+
+    def close(self):
+        self._write_block()
+        lengths = np.frombuffer(self._lengths, dtype=np.int64) if self._lengths else np.zeros(0, np.int64)
+        ids_key, ids = self._ids_array()
+
+        # Columns first: the index is what makes a tensor visible to readers
+        self._values_file.close()
+        self._ts_file.close()
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp.npz")
+        np.savez(
+            tmp,
+            lengths=lengths,
+            offsets=np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64) if len(lengths)
+            else np.zeros(0, np.int64),
+            packed=np.frombuffer(self._packed, dtype=np.int8).astype(np.bool_) if self._packed
+            else np.zeros(0, np.bool_),
+            fields=np.frombuffer(dumps(list(TENSOR_FIELDS)).encode(), dtype=np.uint8),
+            **{ids_key: ids},
+        )
+        os.replace(tmp, self.index_path)
+        self.abort()
+
+    def abort(self):
+        self._values_file.abort()
+        self._ts_file.abort()
+        self._values = array("d")
+        self._ts = array("q")
+
+
+class CandleTensor:
+    """
+    Loaded tensor: values (total_candles x fields) and ts (datetime64[s],
+    NaT for a missing ts) are read-only memmaps; segment k owns rows
+    offsets[k]:offsets[k] + lengths[k].
+    """
+
+    def __init__(self, values, offsets, lengths, packed, ids, ts):
+        self.values = values
+        self.offsets = offsets.tolist()
+        self.lengths = lengths.tolist()
+        self.packed = packed.tolist()
+        self.ids = ids
+        self.ts = ts
+        self.complete = all(self.packed)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def matches(self, segments):
+        """True if the tensor was built from exactly these segments, in order."""
+        return len(segments) == len(self) and all(
+            (seg.get("id") if type(seg) is dict else None) == seg_id for seg, seg_id in zip(segments, self.ids)
+        )
+
+    def columns(self, k):
+        """
+        Candle fields of segment k as {field: list} (Python floats, None for
+        missing values; "ts" holds candle timestamps), or None if the
+        segment is not packed and must be read from its dicts.
+        """
+        if not self.packed[k]:
+            return None
+        start, n = self.offsets[k], self.lengths[k]
+        block = self.values[start:start + n].T.tolist()
+        cols = dict(zip(TENSOR_FIELDS, block))
+        for f in VALUE_FIELDS:
+            col = cols[f]
+            if any(math.isnan(v) for v in col):
+                cols[f] = [None if math.isnan(v) else v for v in col]
+        ts = self.ts[start:start + n]
+        cols["ts"] = np.datetime_as_string(ts, unit="s").tolist()
+        if np.isnat(ts).any():
+            cols["ts"] = [None if t == "NaT" else t for t in cols["ts"]]
+        return cols
+
+
+def load_candle_tensor(base):
+    """CandleTensor at base (artifact_base(..., "candles")) or None if absent / unreadable."""
+    paths = tensor_paths(base)
+    if not all(p.exists() for p in paths):
+        return None
+    values_path, ts_path, index_path = paths
+    try:
+        with np.load(index_path, allow_pickle=False) as z:
+            if tuple(loads(z["fields"].tobytes())) != TENSOR_FIELDS:
+                return None
+            index = {k: z[k] for k in ("offsets", "lengths", "packed")}
+            ids = z["ids"].tolist() if "ids" in z else loads(z["ids_json"].tobytes())
+        values = np.load(values_path, mmap_mode="r", allow_pickle=False)
+        ts = np.load(ts_path, mmap_mode="r", allow_pickle=False)
+    except (OSError, ValueError, KeyError):
+        return None
+    rows = int(index["lengths"].sum())
+    if values.ndim != 2 or values.shape[0] != rows or ts.dtype != TS_DTYPE or ts.shape != (rows,):
+        return None
+    return CandleTensor(values, index["offsets"], index["lengths"], index["packed"], ids, ts)
+
+
+def load_clean_segments(clean_base, tensor_base):
+    """
+    Clean segments with their tensor: (segments, CandleTensor or None), or
+    (None, None) if there is no clean set. Row lists are rebuilt only when
+    the tensor is missing, stale or leaves some segments unpacked.
+    """
+    tensor = load_candle_tensor(tensor_base)
+    segments = load_records(clean_base, rows=tensor is None or not tensor.complete)
+    if segments is None or tensor is None:
+        return segments, None
+    if not isinstance(segments, list) or not tensor.matches(segments):
+        print("[WARN] Candle tensor does not match clean data, reading candle dicts")
+        return load_records(clean_base), None
+    return segments, tensor
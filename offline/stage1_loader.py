@@ -1,11 +1,23 @@
 import os
 import sys
 import json
+import shutil
+import time
 import tomllib
 from pathlib import Path
 from supabase import create_client, Client
 import math
 
+# Artifact I/O (npz record sets, compact JSON metadata)
+try:
+    from .artifact_io import (CLEAN_ROWS, JsonArrayWriter, TeeWriter, artifact_base, find_records,
+                              iter_records, load_json, open_records, save_json)
+    from .candle_tensor import CandleTensorWriter, tensor_paths
+except ImportError:
+    from artifact_io import (CLEAN_ROWS, JsonArrayWriter, TeeWriter, artifact_base, find_records,
+                             iter_records, load_json, open_records, save_json)
+    from candle_tensor import CandleTensorWriter, tensor_paths
+
 # Core numerical fields that must NOT be None
 # CORE_STATE обязательные поля (PATCH: NULL/NaN -> DROP setup)
 CORE_FIELDS_CHECK = [
@@ -34,6 +46,28 @@ Y_SIZE_MAP = {
     "L": "L",
 }
 
+# Rows per request (Supabase caps responses at 1000 rows by default)
+SEGMENTS_PAGE_SIZE = 1000
+
+# Incremental runs only fetch segments created after the watermark, so edits
+# of older segments are only seen by a full reload; one is forced when the
+# last is older than this many seconds (0 = every run)
+FULL_RELOAD_MAX_AGE = int(os.getenv("STAGE1_FULL_RELOAD_SEC", 24 * 3600))
+
+# Drop categories, in the order they appear in the drop log stats
+DROP_CATEGORIES = [
+    "NO_DATA_JSON",
+    "BAD_SCHEMA",
+    "BAD_META",
+    "NO_CANDLES",
+    "DROP_SEGMENT_TOO_LONG",
+    "DROP_CORE_MISSING",
+    "DROP_CORE_INVALID_DOMAIN",
+    "DROP_NAN_PRESENT",
+    "DROP_LABEL_MISSING",
+    "DROP_LABEL_INVALID",
+]
+
 def load_secrets():
     """Load Supabase credentials from env vars or .streamlit/secrets.toml."""
     # 1. Try Env Vars (Railway)
@@ -150,111 +184,363 @@ def is_valid_segment(seg):
 
     return True, None
 
-def run_pipeline(symbol, tf, exchange="Binance", limit=10000):
+def iter_segment_pages(supabase, symbol, tf, exchange="Binance", page_size=SEGMENTS_PAGE_SIZE, limit=None,
+                       since=None, columns="*"):
+    """
+    Keyset-paginated fetch over segments: yields one list of rows per page.
+    Walks id with a cursor (id > last id, ordered by id) instead of one
+    capped select, so the server row limit cannot truncate the result.
+    limit: stop after this many rows (None = all).
+    since: only rows with created_at >= since (incremental refresh).
+    columns: select list (must include id).
+    """
+    last_id = None
+    fetched = 0
+    while limit is None or fetched < limit:
+        size = page_size if limit is None else min(page_size, limit - fetched)
+        query = supabase.table("segments")\
+            .select(columns)\
+            .eq("symbol", symbol)\
+            .eq("tf", tf)\
+            .eq("exchange", exchange)
+        if since is not None:
+            query = query.gte("created_at", since)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(size).execute().data or []
+        if not rows:
+            return
+        fetched += len(rows)
+        yield rows
+        if len(rows) < size:
+            return
+        last_id = rows[-1]["id"]
+
+def count_segments(supabase, symbol, tf, exchange="Binance"):
+    """Number of segments on the server (exact count, no rows transferred)."""
+    res = supabase.table("segments")\
+        .select("id", count="exact")\
+        .eq("symbol", symbol)\
+        .eq("tf", tf)\
+        .eq("exchange", exchange)\
+        .limit(1)\
+        .execute()
+    return res.count
+
+def write_dropped_file(path, stats, details_path):
+    """Drop log {"stats", "details"}: details array is copied from details_path."""
+    tmp = Path(str(path) + ".tmp")
+    with open(tmp, "w") as out, open(details_path) as details:
+        out.write('{\n  "stats": ' + json.dumps(stats, indent=2).replace("\n", "\n  ") + ',\n  "details": ')
+        shutil.copyfileobj(details, out)
+        out.write("\n}")
+    os.replace(tmp, path)
+    Path(details_path).unlink(missing_ok=True)
+
+def data_path(symbol, tf, exchange, suffix):
+    """offline/data/<symbol>_<tf>_<exchange>_<suffix>.json (JSON artifacts)."""
+    return Path(f"{artifact_base(symbol, tf, exchange, suffix)}.json")
+
+def open_clean_writer(symbol, tf, exchange):
+    """Writer for the clean record set and its packed candle tensor (candle_tensor)."""
+    return TeeWriter(open_records(artifact_base(symbol, tf, exchange, "clean"), CLEAN_ROWS),
+                     CandleTensorWriter(artifact_base(symbol, tf, exchange, "candles")))
+
+def load_manifest(symbol, tf, exchange="Binance"):
+    """
+    Stage 1 manifest (None if there was no run yet):
+    watermark.created_at - newest created_at loaded so far;
+    mode - "full" or "incremental";
+    full_at - unix time of the last full reload;
+    new_ids - clean segments added or changed by the last run (None after a
+    full run: every segment is new);
+    removed_ids - segments that left the clean set in the last run.
+    """
+    path = data_path(symbol, tf, exchange, "manifest")
+    if not path.exists():
+        return None
+    try:
+        return load_json(path)
+    except (OSError, ValueError):
+        return None
+
+def save_manifest(symbol, tf, exchange, manifest):
+    save_json(data_path(symbol, tf, exchange, "manifest"), manifest, indent=True)
+
+def _max_created(watermark, rows):
+    """Newest created_at among rows and the current watermark."""
+    values = [r["created_at"] for r in rows if r.get("created_at")]
+    if watermark:
+        values.append(watermark)
+    return max(values) if values else None
+
+def _drop_entry(seg, reason):
+    return {
+        "segment_id": seg.get("id"),
+        "reason": reason,
+        "symbol": seg.get("symbol"),
+        "tf": seg.get("tf"),
+    }
+
+def _drop_stats(details):
+    """Drop log stats recomputed from the details entries."""
+    stats = {category: 0 for category in DROP_CATEGORIES}
+    for entry in details:
+        category = entry["reason"].split(":")[0]
+        stats[category] = stats.get(category, 0) + 1
+    return stats
+
+def _merge_clean(clean_base, delta_clean, delta_dropped, live, writer):
+    """
+    Streams the existing clean set (stored in id order) into writer, merged
+    with delta_clean (new versions win) and without ids that were dropped
+    now or are not in live (None = no deletion check).
+    Returns (new_ids, removed_ids) in id order, or None if the existing set
+    is not sorted by id and cannot be merged.
+    """
+    delta = iter(sorted(delta_clean.items()))
+    pending = next(delta, None)
+    new_ids, removed_ids = [], []
+    prev_id = None
+    for seg in iter_records(clean_base):
+        seg_id = seg["id"]
+        if prev_id is not None and not prev_id < seg_id:
+            return None
+        prev_id = seg_id
+        while pending is not None and pending[0] < seg_id:
+            writer.write(pending[1])
+            new_ids.append(pending[0])
+            pending = next(delta, None)
+        if pending is not None and pending[0] == seg_id:
+            if pending[1] != seg:
+                new_ids.append(seg_id)
+            writer.write(pending[1])
+            pending = next(delta, None)
+        elif seg_id in delta_dropped or (live is not None and seg_id not in live):
+            removed_ids.append(seg_id)
+        else:
+            writer.write(seg)
+    while pending is not None:
+        writer.write(pending[1])
+        new_ids.append(pending[0])
+        pending = next(delta, None)
+    return new_ids, removed_ids
+
+def _refresh_incremental(supabase, symbol, tf, exchange, since, page_size, manifest):
+    """
+    Fetches segments created at or after the watermark and merges them into
+    the existing clean / dropped files: the clean set is streamed in id order
+    and merged with the id-sorted new pages, so the result equals a full
+    reload without holding the whole set in memory.
+    Deletions: the server count is compared with the merged set; on a
+    mismatch the live ids are read with an id-only keyset scan and segments
+    gone from the server are removed.
+    Returns (success, message, count), or None if the existing clean set
+    cannot be merged (not in id order) and a full reload is needed.
+    """
+    clean_base = artifact_base(symbol, tf, exchange, "clean")
+    dropped_file = data_path(symbol, tf, exchange, "dropped")
+
+    delta_clean = {}
+    delta_dropped = {}
+    watermark = since
+    try:
+        print(f"[SUPABASE] Querying segments since {since}...")
+        for page in iter_segment_pages(supabase, symbol, tf, exchange, page_size=page_size, since=since):
+            watermark = _max_created(watermark, page)
+            for seg in page:
+                is_valid, reason = is_valid_segment(seg)
+                if is_valid:
+                    seg["setup_status"] = "USE"
+                    delta_clean[seg["id"]] = seg
+                else:
+                    delta_dropped[seg.get("id")] = _drop_entry(seg, reason)
+        server_count = count_segments(supabase, symbol, tf, exchange)
+    except Exception as e:
+        return False, f"Query Failed: {e}", 0
+
+    fetched = len(delta_clean) + len(delta_dropped)
+    print(f"[INFO] Fetched {fetched} new or changed segments.")
+
+    details = {e["segment_id"]: e for e in load_json(dropped_file).get("details", [])}
+    # Also rebuilds a missing candle tensor (clean file from an older run)
+    tensor_missing = not all(p.exists() for p in tensor_paths(artifact_base(symbol, tf, exchange, "candles")))
+    clean_count = manifest.get("clean_count")
+
+    new_ids, removed_ids = [], []
+    if fetched or tensor_missing or clean_count is None or server_count != clean_count + len(details):
+        live = None
+        while True:
+            clean_writer = open_clean_writer(symbol, tf, exchange)
+            try:
+                merged = _merge_clean(clean_base, delta_clean, delta_dropped, live, clean_writer)
+            except Exception:
+                clean_writer.abort()
+                raise
+            if merged is None:
+                clean_writer.abort()
+                print("[WARN] Clean set is not in id order, reloading everything")
+                return None
+            new_ids, removed_ids = merged
+
+            merged_details = {k: e for k, e in details.items()
+                              if k not in delta_clean and (live is None or k in live)}
+            merged_details.update(delta_dropped)
+            if live is not None or server_count == clean_writer.count + len(merged_details):
+                break
+            # Segments deleted on the server (or added meanwhile): reconcile by id
+            clean_writer.abort()
+            try:
+                print(f"[SUPABASE] {server_count} segments on the server, "
+                      f"{clean_writer.count + len(merged_details)} local: checking ids...")
+                live = set()
+                for page in iter_segment_pages(supabase, symbol, tf, exchange, page_size=page_size, columns="id"):
+                    live.update(row["id"] for row in page)
+            except Exception as e:
+                return False, f"Query Failed: {e}", 0
+
+        clean_count = clean_writer.count
+        if new_ids or removed_ids or tensor_missing or merged_details != details:
+            details = merged_details
+            dropped_writer = JsonArrayWriter(Path(str(dropped_file) + ".details"), level=2)
+            ordered_details = [details[k] for k in sorted(details)]
+            for entry in ordered_details:
+                dropped_writer.write(entry)
+            clean_writer.close()
+            dropped_writer.close()
+            write_dropped_file(dropped_file, _drop_stats(ordered_details), dropped_writer.path)
+        else:
+            clean_writer.abort()
+
+    save_manifest(symbol, tf, exchange, {
+        "watermark": {"created_at": watermark},
+        "mode": "incremental",
+        "fetched": fetched,
+        "clean_count": clean_count,
+        "dropped_count": len(details),
+        "new_ids": new_ids,
+        "removed_ids": removed_ids,
+        "full_at": manifest.get("full_at"),
+    })
+
+    report = (f"Инкрементально: {fetched} | Новых: {len(new_ids)} | Удалено: {len(removed_ids)} | "
+              f"Чистых: {clean_count}")
+    return True, report, clean_count
+
+def run_pipeline(symbol, tf, exchange="Binance", limit=None, supabase=None, page_size=SEGMENTS_PAGE_SIZE,
+                 full=False, full_max_age=FULL_RELOAD_MAX_AGE):
     """
     Executes Step 1.1: Load & Filter Data.
+    Segments are fetched page by page (iter_segment_pages), validated as they
+    arrive and streamed to the clean / dropped files, so memory does not grow
+    with the number of setups.
+    When a manifest with a watermark exists (and full=False, limit=None) only
+    segments created since the watermark are fetched and merged into the
+    existing files (segments deleted on the server are removed); the manifest
+    then lists new_ids / removed_ids for downstream stages. Segments edited
+    in place keep their created_at and are missed by that refresh: they are
+    picked up by a full reload (full=True, or automatically once the last
+    one is older than full_max_age seconds).
+    limit: max segments to load (None = all).
+    supabase: client to use (default: created from secrets).
+    full: ignore the manifest and reload everything.
+    full_max_age: max age of the last full reload (None = never forced).
     Returns: (success: bool, message: str, count: int)
     """
     print(f"[START] Loading data for {symbol} {tf}...")
     
     # 1. Setup
     try:
-        url, key = load_secrets()
-        supabase: Client = create_client(url, key)
+        if supabase is None:
+            url, key = load_secrets()
+            supabase = create_client(url, key)
     except Exception as e:
         return False, f"Connection Failed: {e}", 0
 
-    # 2. Extract (Fetch)
+    clean_base = artifact_base(symbol, tf, exchange, "clean")
+    dropped_file = data_path(symbol, tf, exchange, "dropped")
+    
+    dropped_file.parent.mkdir(parents=True, exist_ok=True)
+
+    # Incremental refresh from the watermark of the previous run
+    manifest = load_manifest(symbol, tf, exchange)
+    since = (manifest or {}).get("watermark", {}).get("created_at")
+    full_at = (manifest or {}).get("full_at")
+    if since and not full and full_max_age is not None and time.time() - (full_at or 0) >= full_max_age:
+        print(f"[INFO] Last full reload is older than {full_max_age}s, reloading everything")
+        full = True
+    if since and not full and limit is None and find_records(clean_base) and dropped_file.exists():
+        result = _refresh_incremental(supabase, symbol, tf, exchange, since, page_size, manifest)
+        if result is not None:
+            return result
+
+    dropped_stats = {category: 0 for category in DROP_CATEGORIES}
+    clean_writer = open_clean_writer(symbol, tf, exchange)
+    # Audit log entries (details array of the drop log, level 2 inside the object)
+    dropped_writer = JsonArrayWriter(Path(str(dropped_file) + ".details"), level=2)
+    total = 0
+    watermark = None
+
+    # 2. Extract (Fetch) + 3. Transform & Filter (Strict Mode) + 4. Load, page by page
     try:
         print("[SUPABASE] Querying segments...")
-        res = supabase.table("segments")\
-            .select("*")\
-            .eq("symbol", symbol)\
-            .eq("tf", tf)\
-            .eq("exchange", exchange)\
-            .limit(limit)\
-            .execute()
-        
-        raw_segments = res.data or []
+        for page in iter_segment_pages(supabase, symbol, tf, exchange, page_size=page_size, limit=limit):
+            total += len(page)
+            watermark = _max_created(watermark, page)
+            for seg in page:
+                is_valid, reason = is_valid_segment(seg)
+                if is_valid:
+                    seg["setup_status"] = "USE"
+                    clean_writer.write(seg)
+                else:
+                    category = reason.split(":")[0]
+                    dropped_stats[category] = dropped_stats.get(category, 0) + 1
+                    dropped_writer.write(_drop_entry(seg, reason))
     except Exception as e:
+        clean_writer.abort()
+        dropped_writer.abort()
         return False, f"Query Failed: {e}", 0
 
-    print(f"[INFO] Fetched {len(raw_segments)} raw segments.")
-    
-    # 3. Transform & Filter (Strict Mode)
-    clean_segments = []
-    dropped_log = []  # Detailed audit log
-    dropped_stats = {
-        "NO_DATA_JSON": 0,
-        "BAD_SCHEMA": 0,
-        "BAD_META": 0,
-        "NO_CANDLES": 0,
-        "DROP_SEGMENT_TOO_LONG": 0,
-        "DROP_CORE_MISSING": 0,
-        "DROP_CORE_INVALID_DOMAIN": 0,
-        "DROP_NAN_PRESENT": 0,
-        "DROP_LABEL_MISSING": 0,
-        "DROP_LABEL_INVALID": 0,
-    }
-    
-    for seg in raw_segments:
-        is_valid, reason = is_valid_segment(seg)
-        if is_valid:
-            seg["setup_status"] = "USE"
-            clean_segments.append(seg)
-        else:
-            seg["setup_status"] = reason.split(":")[0]
-            seg["drop_reason"] = reason
-            
-            category = reason.split(":")[0]
-            if category in dropped_stats:
-                dropped_stats[category] += 1
-            else:
-                dropped_stats[category] = dropped_stats.get(category, 0) + 1
-            
-            # Audit log entry
-            dropped_log.append({
-                "segment_id": seg.get("id"),
-                "reason": reason,
-                "symbol": seg.get("symbol"),
-                "tf": seg.get("tf"),
-            })
-
-    # 4. Load (Save Locally)
-    clean_symbol = symbol.replace("/", "").replace(":", "")
-    clean_tf = tf.replace("/", "")
-    clean_ex = exchange.replace("/", "")
-    
-    outfile = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_clean.json"
-    dropped_file = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_dropped.json"
-    
-    outfile.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(outfile, "w") as f:
-        json.dump(clean_segments, f, indent=2, default=str)
+    print(f"[INFO] Fetched {total} raw segments.")
+    clean_writer.close()
+    dropped_writer.close()
     
     # Save drop log for audit
-    with open(dropped_file, "w") as f:
-        json.dump({"stats": dropped_stats, "details": dropped_log}, f, indent=2, default=str)
+    write_dropped_file(dropped_file, dropped_stats, dropped_writer.path)
     
+    clean_count = clean_writer.count
+    dropped_count = dropped_writer.count
+    # A limited load is not a complete snapshot: no watermark to continue from
+    save_manifest(symbol, tf, exchange, {
+        "watermark": {"created_at": watermark if limit is None else None},
+        "mode": "full",
+        "fetched": total,
+        "clean_count": clean_count,
+        "dropped_count": dropped_count,
+        "new_ids": None,
+        "removed_ids": [],
+        "full_at": time.time() if limit is None else None,
+    })
+
     # Warning for insufficient data
-    if len(clean_segments) < 10:
-        print(f"[WARN] Too few samples ({len(clean_segments)}) for reliable training!")
+    if clean_count < 10:
+        print(f"[WARN] Too few samples ({clean_count}) for reliable training!")
         
-    report = f"Загружено: {len(raw_segments)} | Чистых: {len(clean_segments)} | Отброшено: {len(raw_segments)-len(clean_segments)}"
-    return True, report, len(clean_segments)
+    report = f"Загружено: {total} | Чистых: {clean_count} | Отброшено: {total - clean_count}"
+    return True, report, clean_count
 
 if __name__ == "__main__":
     import sys
     
     if len(sys.argv) < 4:
-        print("Usage: python stage1_loader.py <symbol> <tf> <exchange>")
+        print("Usage: python stage1_loader.py <symbol> <tf> <exchange> [--full]")
         print("Example: python stage1_loader.py ETH 1D Binance")
         sys.exit(1)
     
     symbol = sys.argv[1]
     tf = sys.argv[2]
     exchange = sys.argv[3]
+    full = "--full" in sys.argv[4:]
     
-    res, msg, cnt = run_pipeline(symbol, tf, exchange)
+    res, msg, cnt = run_pipeline(symbol, tf, exchange, full=full)
     print(f"[{'OK' if res else 'ERROR'}] {msg}")
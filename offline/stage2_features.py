@@ -10,9 +10,9 @@ Per ТЗ v2.1 + PATCH-10:
 - td = tail dominance (U/L/N) calculated via get_tail_dom()
 """
 
-import json
 import math
 import sys
+from bisect import bisect_left, insort
 from pathlib import Path
 
 # Add offline directory to path for tokenizer import
@@ -21,6 +21,8 @@ if str(_offline_dir) not in sys.path:
     sys.path.insert(0, str(_offline_dir))
 
 from tokenizer import get_tail_dom
+from artifact_io import FEATURES_ROWS, artifact_base, load_json, load_records, save_records
+from candle_tensor import load_clean_segments
 
 # --- HELPERS ---
 
@@ -102,64 +104,180 @@ def top1_share(values):
     return max(valid) / total
 
 
+class BoostHistory:
+    """
+    Incremental history of one BOOST series. After each append, rank(x) and
+    top1_share() equal percentile_rank(x, values) and top1_share(values) over
+    everything appended so far: valid values are kept sorted (bisect) for
+    ranks, O(log n) comparisons per step instead of O(n). top1_share() takes
+    the builtin sum() of the valid values in append order, as the definition
+    does, only when read (cached until the next append), so the share is the
+    same on every Python version (sum() is compensated since 3.12).
+    """
+
+    def __init__(self):
+        self._values = []   # valid values, in append order
+        self._sorted = []   # valid values, ascending
+        self._max = None
+        self._share = None  # cached top1_share()
+
+    def append(self, v):
+        """Adds a value (None is part of the history but never counted)."""
+        if v is None:
+            return
+        self._values.append(v)
+        insort(self._sorted, v)
+        # Strict '>' keeps the first maximum, as max() does
+        if self._max is None or v > self._max:
+            self._max = v
+        self._share = None
+
+    def rank(self, x):
+        """percentile_rank(x, history): share of valid values < x, None if < 5 valid."""
+        if x is None:
+            return None
+        n = len(self._sorted)
+        if n < 5:
+            return None
+        return bisect_left(self._sorted, x) / n
+
+    def top1_share(self):
+        """top1_share(history): max / sum of valid values, 0 if none or sum is 0."""
+        if self._share is None:
+            total = sum(self._values) if self._values else 0
+            self._share = 0.0 if total == 0 else self._max / total
+        return self._share
+
+
 # --- MAIN LOGIC ---
 
 def load_clean_data(symbol, tf, exchange):
-    """Load cleaned segments from Stage 1 output."""
-    clean_symbol = symbol.replace("/", "").replace(":", "")
-    clean_tf = tf.replace("/", "")
-    clean_ex = exchange.replace("/", "")
-    filepath = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_clean.json"
-    
+    """
+    Load cleaned segments from Stage 1 output.
+    Returns (segments, tensor, err); tensor is the Stage 1 candle tensor
+    (candle_tensor.CandleTensor) or None if it is missing / stale.
+    """
+    base = artifact_base(symbol, tf, exchange, "clean")
+    data, tensor = load_clean_segments(base, artifact_base(symbol, tf, exchange, "candles"))
+    if data is None:
+        return None, None, f"File not found: {base}.npz / .json"
+    return data, tensor, None
+
+
+def load_manifest(symbol, tf, exchange):
+    """Stage 1 manifest (see stage1_loader.load_manifest) or None."""
+    filepath = Path(f"{artifact_base(symbol, tf, exchange, 'manifest')}.json")
     if not filepath.exists():
-        return None, f"File not found: {filepath}"
-    
-    with open(filepath, "r") as f:
-        data = json.load(f)
-    return data, None
+        return None
+    try:
+        return load_json(filepath)
+    except (OSError, ValueError):
+        return None
+
+
+def load_reusable_features(symbol, tf, exchange, features_base):
+    """
+    Features from the previous run that are still valid after an incremental
+    Stage 1 refresh: every segment except the ones listed in new_ids.
+    Segments are insert-only, so ids missing from the old features file are
+    simply computed. Returns {id: features} (empty after a full Stage 1 run).
+    """
+    manifest = load_manifest(symbol, tf, exchange)
+    if not manifest or manifest.get("mode") != "incremental" or manifest.get("new_ids") is None:
+        return {}
+    previous = load_records(features_base)
+    if previous is None:
+        return {}
+    changed = set(manifest["new_ids"])
+    return {r["id"]: r for r in previous if r.get("id") not in changed}
 
 
-def process_segment(seg):
+def candle_inputs(c):
+    """
+    Per-candle inputs of build_features from a candle dict:
+    (ts, div_type, oi_flags, cvd_pct, clv_pct, td, volume, doi_pct, liq_long, liq_short).
+    """
+    # TD: fallback to "N" if calculation fails (NaN, type errors, etc.)
+    try:
+        td = get_tail_dom(c)
+    except Exception:
+        td = "N"
+    return (
+        c.get("ts"),
+        get_div_type(c.get("price_sign"), c.get("cvd_sign")),
+        get_oi_flags(c),
+        c.get("cvd_pct"),
+        c.get("clv_pct"),
+        td,
+        safe_get(c, "volume"),
+        safe_get(c, "doi_pct"),
+        safe_get(c, "liq_long"),
+        safe_get(c, "liq_short"),
+    )
+
+
+def packed_inputs(cols):
+    """
+    candle_inputs for every candle of a packed segment (CandleTensor.columns).
+    Packed values are floats or None (never NaN / strings), so get_tail_dom
+    and safe_get reduce to plain comparisons.
+    """
+    inputs = []
+    for ts, price_sign, cvd_sign, f0, f1, f2, f3, cvd, clv, upper, lower, vol, doi, liq_long, liq_short in zip(
+        cols["ts"], cols["price_sign"], cols["cvd_sign"],
+        cols["oi_set"], cols["oi_unload"], cols["oi_counter"], cols["oi_in_sens"],
+        cols["cvd_pct"], cols["clv_pct"], cols["upper_tail_pct"], cols["lower_tail_pct"],
+        cols["volume"], cols["doi_pct"], cols["liq_long"], cols["liq_short"],
+    ):
+        if upper is None or lower is None or upper == lower:
+            td = "N"
+        else:
+            td = "U" if upper > lower else "L"
+        oi_flags = int(f0) | (int(f1) << 1) | (int(f2) << 2) | (int(f3) << 3)
+        inputs.append((ts, get_div_type(price_sign, cvd_sign), oi_flags, cvd, clv, td,
+                       vol, doi, liq_long, liq_short))
+    return inputs
+
+
+def process_segment(seg, cols=None):
     """
     Process a single segment: iterate through candles, build CORE_STATE and BOOST.
+    cols: the segment's packed candles (CandleTensor.columns) instead of its dicts.
     Returns enriched segment with 'steps' array.
     """
-    candles = seg.get("data", {}).get("CONTEXT", {}).get("DATA", [])
-    if not candles:
+    if cols is not None:
+        inputs = packed_inputs(cols)
+    else:
+        candles = seg.get("data", {}).get("CONTEXT", {}).get("DATA", [])
+        inputs = [candle_inputs(c) for c in candles]
+    if not inputs:
         return None
-    
+    return build_features(seg, inputs)
+
+
+def build_features(seg, inputs):
+    """Steps (CORE_STATE + BOOST) of a segment from its candle inputs."""
     # History for BOOST metrics (None-safe)
-    V_hist = []    # volume
-    DOI_hist = []  # abs(doi_pct)
-    LIQ_hist = []  # liq_long + liq_short
+    V_hist = BoostHistory()    # volume
+    DOI_hist = BoostHistory()  # abs(doi_pct)
+    LIQ_hist = BoostHistory()  # liq_long + liq_short
     
     # Warnings counter for missing BOOST fields
     warnings = {"volume": 0, "doi_pct": 0, "liq_long": 0, "liq_short": 0}
     
     steps = []
     
-    for i, c in enumerate(candles):
+    for i, (ts, div_type, oi_flags, cvd_pct, clv_pct, td, vol, doi, liq_long, liq_short) in enumerate(inputs):
         # === CORE_STATE ===
-        # TD: fallback to "N" if calculation fails (NaN, type errors, etc.)
-        try:
-            td = get_tail_dom(c)
-        except Exception:
-            td = "N"
-        
         core_state = {
-            "div_type": get_div_type(c.get("price_sign"), c.get("cvd_sign")),
-            "oi_flags": get_oi_flags(c),
-            "cvd_pct": c.get("cvd_pct"),
-            "clv_pct": c.get("clv_pct"),
+            "div_type": div_type,
+            "oi_flags": oi_flags,
+            "cvd_pct": cvd_pct,
+            "clv_pct": clv_pct,
             "td": td,  # PATCH-10: tail dominance (U/L/N)
         }
         
         # === BOOST: Update history (None-safe) ===
-        vol = safe_get(c, "volume")
-        doi = safe_get(c, "doi_pct")
-        liq_long = safe_get(c, "liq_long")
-        liq_short = safe_get(c, "liq_short")
-        
         # Track missing fields
         if vol is None: warnings["volume"] += 1
         if doi is None: warnings["doi_pct"] += 1
@@ -167,8 +285,9 @@ def process_segment(seg):
         if liq_short is None: warnings["liq_short"] += 1
         
         # Add to history
+        abs_doi = abs(doi) if doi is not None else None
         V_hist.append(vol)
-        DOI_hist.append(abs(doi) if doi is not None else None)
+        DOI_hist.append(abs_doi)
         
         # For liquidations: use 0 if missing (user decision)
         liq_total = (liq_long or 0) + (liq_short or 0)
@@ -177,22 +296,22 @@ def process_segment(seg):
         # === BOOST: Calculate metrics ===
         # rank = None for i < 5 per ТЗ
         boost = {
-            "vol_top1_share": top1_share(V_hist),
+            "vol_top1_share": V_hist.top1_share(),
             "vol_rank": None,
-            "doi_top1_share": top1_share(DOI_hist),
+            "doi_top1_share": DOI_hist.top1_share(),
             "doi_rank": None,
-            "liq_top1_share": top1_share(LIQ_hist),
+            "liq_top1_share": LIQ_hist.top1_share(),
             "liq_rank": None,
         }
         
         if i >= 5:
-            boost["vol_rank"] = percentile_rank(vol, V_hist)
-            boost["doi_rank"] = percentile_rank(DOI_hist[-1], DOI_hist)
-            boost["liq_rank"] = percentile_rank(liq_total, LIQ_hist)
+            boost["vol_rank"] = V_hist.rank(vol)
+            boost["doi_rank"] = DOI_hist.rank(abs_doi)
+            boost["liq_rank"] = LIQ_hist.rank(liq_total)
         
         steps.append({
             "i": i,
-            "ts": c.get("ts"),
+            "ts": ts,
             "core_state": core_state,
             "boost": boost,
         })
@@ -206,15 +325,18 @@ def process_segment(seg):
     }
 
 
-def run_simulation(symbol, tf, exchange="Binance"):
+def run_simulation(symbol, tf, exchange="Binance", incremental=True):
     """
     Executes Step 1.2: Feature Engineering.
+    incremental: after an incremental Stage 1 refresh, reuse features of
+    segments that are not new (per the Stage 1 manifest) instead of
+    recomputing them.
     Returns: (success: bool, message: str, count: int)
     """
     print(f"[START] Feature Engineering for {symbol} {tf} ({exchange})...")
     
     # 1. Load
-    segments, err = load_clean_data(symbol, tf, exchange)
+    segments, tensor, err = load_clean_data(symbol, tf, exchange)
     if err:
         return False, err, 0
     if segments is None or len(segments) == 0:
@@ -222,13 +344,20 @@ def run_simulation(symbol, tf, exchange="Binance"):
     
     print(f"[INFO] Loaded {len(segments)} segments.")
     
+    features_base = artifact_base(symbol, tf, exchange, "features")
+    reusable = load_reusable_features(symbol, tf, exchange, features_base) if incremental else {}
+    
     # 2. Process
     enriched = []
     total_steps = 0
+    computed = 0
     total_warnings = {"volume": 0, "doi_pct": 0, "liq_long": 0, "liq_short": 0}
     
-    for seg in segments:
-        result = process_segment(seg)
+    for k, seg in enumerate(segments):
+        result = reusable.get(seg.get("id"))
+        if result is None:
+            result = process_segment(seg, tensor.columns(k) if tensor is not None else None)
+            computed += 1
         if result:
             enriched.append(result)
             total_steps += len(result["steps"])
@@ -238,20 +367,16 @@ def run_simulation(symbol, tf, exchange="Binance"):
                 total_warnings[key] += result["warnings"].get(key, 0)
     
     # 3. Save
-    clean_symbol = symbol.replace("/", "").replace(":", "")
-    clean_tf = tf.replace("/", "")
-    clean_ex = exchange.replace("/", "")
-    outfile = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_features.json"
-    
-    outfile.parent.mkdir(parents=True, exist_ok=True)
-    with open(outfile, "w") as f:
-        json.dump(enriched, f, indent=2, default=str)
+    features_base.parent.mkdir(parents=True, exist_ok=True)
+    save_records(features_base, enriched, FEATURES_ROWS)
     
     # Log warnings
     if any(v > 0 for v in total_warnings.values()):
         print(f"[WARN] Missing BOOST fields: {total_warnings}")
     
     report = f"Обработано {len(segments)} сегментов → {total_steps} шагов."
+    if reusable:
+        report += f" Пересчитано: {computed}, из прошлого запуска: {len(segments) - computed}."
     return True, report, len(enriched)
 
 
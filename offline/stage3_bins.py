@@ -10,7 +10,6 @@ Per ТЗ v2.1:
 - Artifact saved locally + Supabase upsert
 """
 
-import json
 import os
 import math
 import tomllib
@@ -19,6 +18,12 @@ from pathlib import Path
 from datetime import datetime, timezone
 from supabase import create_client, Client
 
+# Artifact I/O (npz record sets, compact JSON metadata)
+try:
+    from .artifact_io import artifact_base, load_records, save_json
+except ImportError:
+    from artifact_io import artifact_base, load_records, save_json
+
 # --- CONFIG ---
 PATCHLOG_VERSION = "PATCHLOG_v2.1@2026-01-10"
 BUILD_VERSION = datetime.now(timezone.utc).strftime("%Y-%m-%d")  # Auto-version by date
@@ -57,16 +62,10 @@ def load_secrets():
 
 def load_features(symbol, tf, exchange):
     """Load features from Stage 2 output."""
-    clean_symbol = symbol.replace("/", "").replace(":", "")
-    clean_tf = tf.replace("/", "")
-    clean_ex = exchange.replace("/", "")
-    filepath = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_features.json"
-    
-    if not filepath.exists():
-        return None, f"File not found: {filepath}"
-    
-    with open(filepath, "r") as f:
-        data = json.load(f)
+    base = artifact_base(symbol, tf, exchange, "features")
+    data = load_records(base)
+    if data is None:
+        return None, f"File not found: {base}.npz / .json"
     return data, None
 
 
@@ -142,14 +141,16 @@ def calculate_quantiles(pools):
     return bins, warnings
 
 
-def save_to_supabase(bins_data, symbol, tf, exchange):
+def save_to_supabase(bins_data, symbol, tf, exchange, supabase=None):
     """
     Save bins artifact to Supabase using upsert.
     artifact_key = bins_{symbol}_{tf}_{exchange}
+    supabase: client to use (default: created from secrets).
     """
     try:
-        url, key = load_secrets()
-        supabase: Client = create_client(url, key)
+        if supabase is None:
+            url, key = load_secrets()
+            supabase = create_client(url, key)
     except Exception as e:
         return False, f"Supabase connection failed: {e}"
     
@@ -230,8 +231,7 @@ def run_binning(symbol, tf, exchange="Binance"):
     outfile = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_bins.json"
     outfile.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(outfile, "w") as f:
-        json.dump(bins_artifact, f, indent=2)
+    save_json(outfile, bins_artifact)
     print(f"[INFO] Saved locally: {outfile}")
     
     # 6. Save to Supabase
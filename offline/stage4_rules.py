@@ -19,7 +19,6 @@ Per ТЗ v2.1 + PATCH-08/09/10:
 5. Build index for online matching
 """
 
-import json
 import os
 import math
 import sys
@@ -29,6 +28,12 @@ from datetime import datetime, timezone
 from collections import defaultdict
 from supabase import create_client, Client
 
+# Artifact I/O (npz record sets, compact JSON metadata)
+try:
+    from .artifact_io import artifact_base, load_json, load_records, save_json
+except ImportError:
+    from artifact_io import artifact_base, load_json, load_records, save_json
+
 # Add offline directory to path for tokenizer import
 _offline_dir = Path(__file__).parent
 if str(_offline_dir) not in sys.path:
@@ -68,16 +73,10 @@ def load_secrets():
 
 def load_features(symbol, tf, exchange):
     """Load features from Stage 2 output."""
-    clean_symbol = symbol.replace("/", "").replace(":", "")
-    clean_tf = tf.replace("/", "")
-    clean_ex = exchange.replace("/", "")
-    filepath = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_features.json"
-    
-    if not filepath.exists():
-        return None, f"File not found: {filepath}"
-    
-    with open(filepath, "r") as f:
-        data = json.load(f)
+    base = artifact_base(symbol, tf, exchange, "features")
+    data = load_records(base)
+    if data is None:
+        return None, f"File not found: {base}.npz / .json"
     return data, None
 
 
@@ -91,8 +90,7 @@ def load_bins(symbol, tf, exchange):
     if not filepath.exists():
         return None, f"File not found: {filepath}"
     
-    with open(filepath, "r") as f:
-        data = json.load(f)
+    data = load_json(filepath)
     return data, None
 
 
@@ -589,8 +587,7 @@ def run_mining(symbol, tf, exchange="Binance", profile="STRICT"):
     outfile = Path(__file__).parent / "data" / f"{clean_symbol}_{clean_tf}_{clean_ex}_rules_{profile}.json"
     outfile.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(outfile, "w") as f:
-        json.dump(rules_artifact, f, indent=2)
+    save_json(outfile, rules_artifact)
     print(f"[INFO] Saved locally: {outfile}")
     
     # 12. Save to Supabase
@@ -768,11 +765,15 @@ def run_mining(symbol, tf, exchange="Binance", profile="STRICT"):
     return True, f"Найдено {len(selected_rules)} правил."
 
 
-def save_to_supabase(rules_data, symbol, tf, exchange, profile):
-    """Save rules artifact to Supabase (with profile suffix per PATCH-11)."""
+def save_to_supabase(rules_data, symbol, tf, exchange, profile, supabase=None):
+    """
+    Save rules artifact to Supabase (with profile suffix per PATCH-11).
+    supabase: client to use (default: created from secrets).
+    """
     try:
-        url, key = load_secrets()
-        supabase: Client = create_client(url, key)
+        if supabase is None:
+            url, key = load_secrets()
+            supabase = create_client(url, key)
     except Exception as e:
         return False, f"Supabase connection failed: {e}"
     
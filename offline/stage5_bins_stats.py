@@ -12,7 +12,6 @@ Per ТЗ v2.1 PATCH-03/04/08:
 - Artifact saved locally + Supabase upsert
 """
 
-import json
 import os
 import tomllib
 import numpy as np
@@ -22,9 +21,17 @@ from supabase import create_client, Client
 
 # Import shared STATS calculations
 try:
-    from .stats_calc import STATS_FIELDS, MAX_SEGMENT_LENGTH, calculate_stats
+    from .stats_calc import STATS_FIELDS, MAX_SEGMENT_LENGTH, calculate_stats, calculate_stats_columns
 except ImportError:
-    from stats_calc import STATS_FIELDS, MAX_SEGMENT_LENGTH, calculate_stats
+    from stats_calc import STATS_FIELDS, MAX_SEGMENT_LENGTH, calculate_stats, calculate_stats_columns
+
+# Artifact I/O (npz record sets, compact JSON metadata, packed candle tensor)
+try:
+    from .artifact_io import artifact_base, save_json
+    from .candle_tensor import load_clean_segments
+except ImportError:
+    from artifact_io import artifact_base, save_json
+    from candle_tensor import load_clean_segments
 
 # --- CONFIG ---
 PATCHLOG_VERSION = "PATCHLOG_v2.1@2026-01-10"
@@ -51,20 +58,57 @@ def load_secrets():
 
 
 def load_clean_data(symbol: str, tf: str, exchange: str):
-    """Load cleaned segments from Stage 1 output."""
+    """
+    Load cleaned segments from Stage 1 output.
+    Returns (segments, tensor, err); tensor is the Stage 1 candle tensor
+    (candle_tensor.CandleTensor) or None if it is missing / stale.
+    """
+    base = artifact_base(symbol, tf, exchange, "clean")
+    segments, tensor = load_clean_segments(base, artifact_base(symbol, tf, exchange, "candles"))
+    if segments is None:
+        return None, None, f"File not found: {base}.npz / .json"
+    
+    return segments, tensor, None
+
+
+def save_to_supabase(artifact, symbol, tf, exchange, supabase=None):
+    """
+    Save STATS bins artifact to Supabase using upsert.
+    artifact_key = bins_stats_{symbol}_{tf}_{exchange}
+    supabase: client to use (default: created from secrets; connection
+    setup errors propagate, only a failed upsert returns (False, msg)).
+    """
+    if supabase is None:
+        url, key = load_secrets()
+        supabase = create_client(url, key)
+    
     clean_symbol = symbol.replace("/", "").replace(":", "")
     clean_tf = tf.replace("/", "")
     clean_ex = exchange.replace("/", "")
-    filename = f"{clean_symbol}_{clean_tf}_{clean_ex}_clean.json"
-    filepath = Path(__file__).parent / "data" / filename
     
-    if not filepath.exists():
-        return None, f"File not found: {filepath}"
+    artifact_key = f"bins_stats_{clean_symbol}_{clean_tf}_{clean_ex}"
     
-    with open(filepath, "r") as f:
-        segments = json.load(f)
+    record = {
+        "artifact_key": artifact_key,
+        "version": BUILD_VERSION,
+        "patchlog_version": PATCHLOG_VERSION,
+        "data_json": artifact,
+        "meta": {
+            "symbol": symbol,
+            "tf": tf,
+            "exchange": exchange,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "n_fields": len(artifact["fields"]),
+        }
+    }
     
-    return segments, None
+    try:
+        supabase.table("training_artifacts")\
+            .upsert(record, on_conflict="artifact_key,version")\
+            .execute()
+        return True, f"Saved to Supabase: {artifact_key}"
+    except Exception as e:
+        return False, f"Supabase save failed: {e}"
 
 
 def run_bins_stats(symbol: str, tf: str, exchange: str):
@@ -72,7 +116,7 @@ def run_bins_stats(symbol: str, tf: str, exchange: str):
     print(f"[START] Building STATS bins for {symbol} {tf} ({exchange})...")
     
     # 1. Load clean data
-    segments, err = load_clean_data(symbol, tf, exchange)
+    segments, tensor, err = load_clean_data(symbol, tf, exchange)
     if err:
         return False, err
     
@@ -90,32 +134,39 @@ def run_bins_stats(symbol: str, tf: str, exchange: str):
     processed_steps = 0
     
     for seg_idx, segment in enumerate(segments):
-        # Get RAW candles from _clean.json structure
-        raw_candles = segment.get("data", {}).get("CONTEXT", {}).get("DATA", [])
-        
-        # Type validation (defensive check)
-        if not isinstance(raw_candles, list):
-            raise ValueError(f"Segment {seg_idx}: CONTEXT.DATA must be a list, got {type(raw_candles).__name__}")
+        # Packed candles from the Stage 1 tensor, else RAW candle dicts from _clean
+        columns = tensor.columns(seg_idx) if tensor is not None else None
+        if columns is not None:
+            n_candles = tensor.lengths[seg_idx]
+        else:
+            raw_candles = segment.get("data", {}).get("CONTEXT", {}).get("DATA", [])
+            
+            # Type validation (defensive check)
+            if not isinstance(raw_candles, list):
+                raise ValueError(f"Segment {seg_idx}: CONTEXT.DATA must be a list, got {type(raw_candles).__name__}")
+            n_candles = len(raw_candles)
         
         # Strict check: Stage 1 contract violation
-        if len(raw_candles) > MAX_SEGMENT_LENGTH:
+        if n_candles > MAX_SEGMENT_LENGTH:
             raise ValueError(
-                f"Segment {seg_idx} too long ({len(raw_candles)} > {MAX_SEGMENT_LENGTH}) - Stage 1 bug"
+                f"Segment {seg_idx} too long ({n_candles} > {MAX_SEGMENT_LENGTH}) - Stage 1 bug"
             )
         
-        if len(raw_candles) == 0:
+        if n_candles == 0:
             continue
         
         processed_segments += 1
         
         # Process each step (sliding window up to current position)
-        for i in range(len(raw_candles)):
+        for i in range(n_candles):
             # Buffer: last min(i+1, MAX_SEGMENT_LENGTH) candles
             start = max(0, i - (MAX_SEGMENT_LENGTH - 1))
-            buffer = raw_candles[start:i+1]
             
             # Calculate all STATS
-            stats = calculate_stats(buffer)
+            if columns is not None:
+                stats = calculate_stats_columns(columns, start, i + 1)
+            else:
+                stats = calculate_stats(raw_candles[start:i+1])
             
             # Add to pools (skip None and NaN values, iterate by STATS_FIELDS for contract)
             for field in STATS_FIELDS:
@@ -171,37 +222,12 @@ def run_bins_stats(symbol: str, tf: str, exchange: str):
     local_filename = f"{clean_symbol}_{clean_tf}_{clean_ex}_bins_stats.json"
     local_path = Path(__file__).parent / "data" / local_filename
     
-    with open(local_path, "w") as f:
-        json.dump(artifact, f, indent=2)
+    save_json(local_path, artifact)
     print(f"[INFO] Saved locally: {local_path}")
     
     # 7. Save to Supabase
-    url, key = load_secrets()
-    supabase: Client = create_client(url, key)
-    
-    artifact_key = f"bins_stats_{clean_symbol}_{clean_tf}_{clean_ex}"
-    
-    record = {
-        "artifact_key": artifact_key,
-        "version": BUILD_VERSION,
-        "patchlog_version": PATCHLOG_VERSION,
-        "data_json": artifact,
-        "meta": {
-            "symbol": symbol,
-            "tf": tf,
-            "exchange": exchange,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "n_fields": len(bins_stats),
-        }
-    }
-    
-    try:
-        supabase.table("training_artifacts")\
-            .upsert(record, on_conflict="artifact_key,version")\
-            .execute()
-        print(f"[INFO] Saved to Supabase: {artifact_key}")
-    except Exception as e:
-        print(f"[WARN] Supabase save failed: {e}")
+    success, msg = save_to_supabase(artifact, symbol, tf, exchange)
+    print(f"[INFO] {msg}" if success else f"[WARN] {msg}")
     
     print(f"[OK] STATS bins built successfully.")
     
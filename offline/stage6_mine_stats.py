@@ -10,7 +10,6 @@ Per ТЗ v2.1 + Step 1.6 spec:
 - NULL conditions excluded from itemsets
 """
 
-import json
 import os
 import math
 import sys
@@ -24,9 +23,17 @@ from supabase import create_client, Client
 
 # Import shared STATS calculations
 try:
-    from .stats_calc import calculate_stats, STATS_FIELDS, MAX_SEGMENT_LENGTH
+    from .stats_calc import calculate_stats, calculate_stats_columns, STATS_FIELDS, MAX_SEGMENT_LENGTH
 except ImportError:
-    from stats_calc import calculate_stats, STATS_FIELDS, MAX_SEGMENT_LENGTH
+    from stats_calc import calculate_stats, calculate_stats_columns, STATS_FIELDS, MAX_SEGMENT_LENGTH
+
+# Artifact I/O (npz record sets, compact JSON metadata, packed candle tensor)
+try:
+    from .artifact_io import artifact_base, load_json, save_json
+    from .candle_tensor import load_clean_segments
+except ImportError:
+    from artifact_io import artifact_base, load_json, save_json
+    from candle_tensor import load_clean_segments
 
 # --- CONFIG ---
 PATCHLOG_VERSION = "PATCHLOG_v2.1@2026-01-10"
@@ -59,24 +66,21 @@ def load_secrets():
 
 
 def load_clean_data(symbol: str, tf: str, exchange: str):
-    """Load cleaned segments from Stage 1 output."""
-    clean_symbol = symbol.replace("/", "").replace(":", "")
-    clean_tf = tf.replace("/", "")
-    clean_ex = exchange.replace("/", "")
-    filename = f"{clean_symbol}_{clean_tf}_{clean_ex}_clean.json"
-    filepath = Path(__file__).parent / "data" / filename
-     
-    if not filepath.exists():
-        return None, f"File not found: {filepath}"
-    
-    with open(filepath, "r") as f:
-        segments = json.load(f)
+    """
+    Load cleaned segments from Stage 1 output.
+    Returns (segments, tensor, err); tensor is the Stage 1 candle tensor
+    (candle_tensor.CandleTensor) or None if it is missing / stale.
+    """
+    base = artifact_base(symbol, tf, exchange, "clean")
+    segments, tensor = load_clean_segments(base, artifact_base(symbol, tf, exchange, "candles"))
+    if segments is None:
+        return None, None, f"File not found: {base}.npz / .json"
     
     # Validate: must be list
     if not isinstance(segments, list):
-        return None, f"Clean file must contain list of segments, got {type(segments).__name__}"
+        return None, None, f"Clean file must contain list of segments, got {type(segments).__name__}"
     
-    return segments, None
+    return segments, tensor, None
 
 
 def load_bins_stats(symbol: str, tf: str, exchange: str):
@@ -90,8 +94,7 @@ def load_bins_stats(symbol: str, tf: str, exchange: str):
     if not filepath.exists():
         return None, f"File not found: {filepath}"
     
-    with open(filepath, "r") as f:
-        bins_stats = json.load(f)
+    bins_stats = load_json(filepath)
     
     return bins_stats, None
 
@@ -147,12 +150,52 @@ def parse_key(rule_key):
 
 # --- MAIN ---
 
+def save_to_supabase(artifact, symbol, tf, exchange, supabase=None):
+    """
+    Save STATS rules artifact to Supabase using upsert.
+    artifact_key = rules_stats_{symbol}_{tf}_{exchange}
+    supabase: client to use (default: created from secrets; connection
+    setup errors propagate, only a failed upsert returns (False, msg)).
+    """
+    if supabase is None:
+        url, key = load_secrets()
+        supabase = create_client(url, key)
+    
+    clean_symbol = symbol.replace("/", "").replace(":", "")
+    clean_tf = tf.replace("/", "")
+    clean_ex = exchange.replace("/", "")
+    
+    artifact_key = f"rules_stats_{clean_symbol}_{clean_tf}_{clean_ex}"
+    
+    record = {
+        "artifact_key": artifact_key,
+        "version": BUILD_VERSION,
+        "patchlog_version": PATCHLOG_VERSION,
+        "data_json": artifact,
+        "meta": {
+            "symbol": symbol,
+            "tf": tf,
+            "exchange": exchange,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "n_rules": len(artifact["rules"]),
+        }
+    }
+    
+    try:
+        supabase.table("training_artifacts")\
+            .upsert(record, on_conflict="artifact_key,version")\
+            .execute()
+        return True, f"Saved to Supabase: {artifact_key}"
+    except Exception as e:
+        return False, f"Supabase save failed: {e}"
+
+
 def run_mine_stats(symbol: str, tf: str, exchange: str):
     """Main function to mine STATS rules."""
     print(f"[START] Mining STATS rules for {symbol} {tf} ({exchange})...")
     
     # 1. Load data
-    segments, err = load_clean_data(symbol, tf, exchange)
+    segments, tensor, err = load_clean_data(symbol, tf, exchange)
     if err:
         return False, err
     
@@ -220,31 +263,39 @@ def run_mine_stats(symbol: str, tf: str, exchange: str):
     # 4. Collect rule coverage (presence semantic: rule counted once per setup)
     rule_setups = defaultdict(set)  # rule_key → set(setup_ids)
     
-    for segment in segments:
+    for seg_idx, segment in enumerate(segments):
         setup_id = segment.get("id")
         # Only process valid setups (already in y_dirs)
         if setup_id not in y_dirs:
             continue
         
-        candles = segment.get("data", {}).get("CONTEXT", {}).get("DATA", [])
-        
-        if not isinstance(candles, list):
-            print(f"[WARN] Segment {setup_id}: CONTEXT.DATA is not list, skipping")
-            continue
+        # Packed candles from the Stage 1 tensor, else RAW candle dicts from _clean
+        columns = tensor.columns(seg_idx) if tensor is not None else None
+        if columns is not None:
+            n_candles = tensor.lengths[seg_idx]
+        else:
+            candles = segment.get("data", {}).get("CONTEXT", {}).get("DATA", [])
+            
+            if not isinstance(candles, list):
+                print(f"[WARN] Segment {setup_id}: CONTEXT.DATA is not list, skipping")
+                continue
+            n_candles = len(candles)
         
         # Strict check: segment too long is a Stage 1 bug
-        if len(candles) > MAX_SEGMENT_LENGTH:
-            raise ValueError(f"Segment {setup_id} too long ({len(candles)} > {MAX_SEGMENT_LENGTH}) - Stage 1 bug")
+        if n_candles > MAX_SEGMENT_LENGTH:
+            raise ValueError(f"Segment {setup_id} too long ({n_candles} > {MAX_SEGMENT_LENGTH}) - Stage 1 bug")
         
         seen_in_setup = set()  # Dedup within setup (presence semantic)
         
-        for i in range(len(candles)):
+        for i in range(n_candles):
             # Buffer as in Stage 5
             start = max(0, i - (MAX_SEGMENT_LENGTH - 1))
-            buffer = candles[start:i+1]
             
             # Calculate STATS (with None protection)
-            stats = calculate_stats(buffer)
+            if columns is not None:
+                stats = calculate_stats_columns(columns, start, i + 1)
+            else:
+                stats = calculate_stats(candles[start:i+1])
             if not isinstance(stats, dict):
                 continue  # skip if calculate_stats returned None or invalid
             
@@ -346,8 +397,7 @@ def run_mine_stats(symbol: str, tf: str, exchange: str):
     local_filename = f"{clean_symbol}_{clean_tf}_{clean_ex}_rules_stats.json"
     local_path = Path(__file__).parent / "data" / local_filename
     
-    with open(local_path, "w") as f:
-        json.dump(artifact, f, indent=2)
+    save_json(local_path, artifact)
     print(f"[INFO] Saved locally: {local_path}")
     
     # 7.1 Save mining log to separate file
@@ -367,37 +417,12 @@ def run_mine_stats(symbol: str, tf: str, exchange: str):
     }
     log_filename = f"{clean_symbol}_{clean_tf}_{clean_ex}_mining_log.json"
     log_path = Path(__file__).parent / "data" / log_filename
-    with open(log_path, "w") as f:
-        json.dump(log_data, f, indent=2)
+    save_json(log_path, log_data)
     print(f"[INFO] Mining log: {log_path}")
     
     # 8. Save to Supabase
-    url, key = load_secrets()
-    supabase: Client = create_client(url, key)
-    
-    artifact_key = f"rules_stats_{clean_symbol}_{clean_tf}_{clean_ex}"
-    
-    record = {
-        "artifact_key": artifact_key,
-        "version": BUILD_VERSION,
-        "patchlog_version": PATCHLOG_VERSION,
-        "data_json": artifact,
-        "meta": {
-            "symbol": symbol,
-            "tf": tf,
-            "exchange": exchange,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "n_rules": len(candidates),
-        }
-    }
-    
-    try:
-        supabase.table("training_artifacts")\
-            .upsert(record, on_conflict="artifact_key,version")\
-            .execute()
-        print(f"[INFO] Saved to Supabase: {artifact_key}")
-    except Exception as e:
-        print(f"[WARN] Supabase save failed: {e}")
+    success, msg = save_to_supabase(artifact, symbol, tf, exchange)
+    print(f"[INFO] {msg}" if success else f"[WARN] {msg}")
     
     print(f"[OK] STATS rules mining complete. Found {len(candidates)} rules.")
     
@@ -228,3 +228,73 @@ def calculate_stats(buffer: List[Dict]) -> Dict[str, Optional[float]]:
         "body_range_pct": calc_body_range_pct(buffer),
         "liq_dominance_ratio": calc_liq_dominance_ratio(buffer),
     }
+
+
+# --- PACKED CANDLES (candle_tensor) ---
+
+def _window(columns: Dict[str, List], field: str, start: int, stop: int) -> Optional[List[float]]:
+    """Values of a field in [start, stop), or None if any is missing (as safe_get_all)."""
+    values = columns[field][start:stop]
+    if None in values:
+        return None
+    return values
+
+
+def calculate_stats_columns(columns: Dict[str, List], start: int, stop: int) -> Dict[str, Optional[float]]:
+    """Calculate all 8 STATS fields for candles [start, stop) of a packed segment.
+    
+    Same result as calculate_stats(candles[start:stop]) for a segment from
+    candle_tensor.CandleTensor.columns(): values there are already validated
+    floats (segments with NaN / strings / bools are never packed).
+    
+    Args:
+        columns: {field: list of float | None} for one segment
+        start, stop: Buffer bounds (stop > start)
+    """
+    cvd = _window(columns, "cvd_pct", start, stop)
+    liq_long = _window(columns, "liq_long", start, stop)
+    liq_short = _window(columns, "liq_short", start, stop)
+    upper = _window(columns, "upper_tail_pct", start, stop)
+    lower = _window(columns, "lower_tail_pct", start, stop)
+    highs = _window(columns, "high", start, stop)
+    lows = _window(columns, "low", start, stop)
+    
+    oi_first = columns["oi_close"][start]
+    oi_last = columns["oi_close"][stop - 1]
+    if oi_first is None or oi_last is None:
+        net_oi_change = None
+    elif oi_first == 0:
+        net_oi_change = 0.0
+    else:
+        net_oi_change = ((oi_last - oi_first) / oi_first) * 100
+    
+    body_start = columns["close"][start]
+    body_end = columns["close"][stop - 1]
+    if highs is None or lows is None or body_start is None or body_end is None:
+        body_range_pct = None
+    else:
+        max_high = max(highs)
+        min_low = min(lows)
+        body_range_pct = 0.0 if max_high == min_low else abs(body_end - body_start) / (max_high - min_low) * 100
+    
+    sum_long = None if liq_long is None else sum(liq_long)
+    sum_short = None if liq_short is None else sum(liq_short)
+    if sum_long is None or sum_short is None:
+        liq_dominance_ratio = None
+    elif sum_short > 0:
+        liq_dominance_ratio = sum_long / sum_short
+    elif sum_long > 0:
+        liq_dominance_ratio = None
+    else:
+        liq_dominance_ratio = 1.0
+    
+    return {
+        "sum_cvd_pct": None if cvd is None else sum(cvd),
+        "net_oi_change": net_oi_change,
+        "sum_liq_long": sum_long,
+        "sum_liq_short": sum_short,
+        "avg_upper_tail_pct": None if upper is None else sum(upper) / len(upper),
+        "avg_lower_tail_pct": None if lower is None else sum(lower) / len(lower),
+        "body_range_pct": body_range_pct,
+        "liq_dominance_ratio": liq_dominance_ratio,
+    }
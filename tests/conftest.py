@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Tests import the app packages (core, offline, benchmarks) from the repo root
+_root_dir = Path(__file__).parent.parent
+if str(_root_dir) not in sys.path:
+    sys.path.insert(0, str(_root_dir))
@@ -0,0 +1,77 @@
+"""Record sets: ColumnarWriter blocks read back by iter_records / load_records exactly as written."""
+
+import random
+
+from offline.artifact_io import (CLEAN_ROWS, FEATURES_ROWS, FORMAT_JSON, FORMAT_NPZ, ColumnarWriter,
+                                 find_records, iter_records, load_records, save_records)
+
+LEAVES = [0, 1, -7, 2 ** 63, -2 ** 70, True, False, 0.5, -0.0, float("nan"), float("inf"), 1e300,
+          None, "", "ETH", "тест", [1, None, "x"], {"a": 1}]
+
+
+def make_records(seed=0, n=40):
+    rnd = random.Random(seed)
+    records = []
+    for k in range(n):
+        rows = []
+        for i in range(rnd.choice([0, 1, 3, 9])):
+            row = {"ts": f"2025-01-01T{i:02d}:00:00", "close": float(i), "oi_set": bool(i % 2)}
+            for key in ("x", "y"):
+                if rnd.random() < 0.7:          # keys missing in some rows: several layouts
+                    row[key] = rnd.choice(LEAVES)
+            if rnd.random() < 0.3:
+                row["nested"] = {"deep": {"v": rnd.choice(LEAVES)}, "w": i}
+            rows.append(row)
+        data = {"CONTEXT": {"DATA": rows, "META": {"k": k}}, "TARGETS": {"y_dir": "UP"}}
+        if k % 11 == 5:
+            data["CONTEXT"]["DATA"] = None        # no row list
+        if k % 13 == 7:
+            data = "not a dict"
+        records.append({"id": f"seg-{k}", "setup_status": "USE", "data": data})
+    return records
+
+
+def same(a, b):
+    # repr tells 1 / 1.0 / True and -0.0 / 0.0 apart and compares NaN
+    return repr(a) == repr(b)
+
+
+def test_round_trip_across_blocks(tmp_path):
+    records = make_records()
+    path = tmp_path / "clean.npz"
+    writer = ColumnarWriter(path, CLEAN_ROWS, block_rows=7, block_records=5)
+    for r in records:
+        writer.write(r)
+    writer.close()
+    assert writer.blocks > 5
+    assert same(load_records(tmp_path / "clean"), records)
+    assert same(list(iter_records(tmp_path / "clean")), records)
+
+
+def test_rows_false_and_empty_set(tmp_path):
+    records = make_records(seed=1, n=12)
+    save_records(tmp_path / "clean", records, CLEAN_ROWS, fmt=FORMAT_NPZ, debug_json=False)
+    light = load_records(tmp_path / "clean", rows=False)
+    assert [r["id"] for r in light] == [r["id"] for r in records]
+    for got, want in zip(light, records):
+        if isinstance(want["data"], dict) and isinstance(want["data"]["CONTEXT"]["DATA"], list):
+            assert got["data"]["CONTEXT"]["DATA"] is None
+            assert got["data"]["CONTEXT"]["META"] == want["data"]["CONTEXT"]["META"]
+
+    save_records(tmp_path / "empty", [], FEATURES_ROWS, fmt=FORMAT_NPZ, debug_json=False)
+    assert load_records(tmp_path / "empty") == [] and list(iter_records(tmp_path / "missing")) == []
+
+
+def test_formats_replace_each_other(tmp_path):
+    records = make_records(seed=2, n=6)
+    base = tmp_path / "features"
+    save_records(base, records, CLEAN_ROWS, fmt=FORMAT_JSON, debug_json=False)
+    assert find_records(base, FORMAT_NPZ).suffix == ".json"
+    save_records(base, records, CLEAN_ROWS, fmt=FORMAT_NPZ, debug_json=False)
+    assert not base.with_suffix(".json").exists()
+    assert same(load_records(base, FORMAT_JSON), records)
+
+    writer = ColumnarWriter(tmp_path / "aborted.npz", CLEAN_ROWS)
+    writer.write(records[0])
+    writer.abort()
+    assert list(tmp_path.glob("aborted*")) == []
@@ -0,0 +1,58 @@
+"""BoostHistory must equal percentile_rank / top1_share(values), i.e. the builtin sum(), on any Python."""
+
+import random
+import struct
+
+from offline.stage2_features import BoostHistory, percentile_rank, top1_share
+
+# Sums where plain left-to-right addition and 3.12+ compensated sum() differ
+ADVERSARIAL = [
+    [1e16, 1.0, -1e16],
+    [0.1] * 10,
+    [1e100, 1.0, -1e100, 1.0],
+    [2.0 ** 53, 1.0, 1.0, 1.0],
+    [1e308, 1e308, -1e308],
+    [float("inf"), 1.0, 0.5],
+    [-0.0, -0.0],
+    [0, 1e16, 1, -1e16, 0.5],
+    [True, 2 ** 62, 2 ** 62, 0.1, 0.2],
+    [2 ** 63, 0.1, 0.2, 0.3],
+]
+
+
+def _same(a, b):
+    """Bit-identical floats (including -0.0 and NaN), equal values otherwise."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, float):
+        return struct.pack("<d", a) == struct.pack("<d", b) or (a != a and b != b)
+    return a == b
+
+
+def _random_float(rnd):
+    if rnd.random() < 0.3:
+        return rnd.choice([1e16, -1e16, 1e-16, 0.1, 0.2, 0.3, -0.0, 2.0 ** 53])
+    return rnd.uniform(-1.0, 1.0) * 10.0 ** rnd.randint(-16, 16)
+
+
+def test_top1_share_matches_definition():
+    rnd = random.Random(1)
+    sequences = ADVERSARIAL + [[_random_float(rnd) for _ in range(rnd.randint(1, 40))] for _ in range(500)]
+    for seq in sequences:
+        hist = BoostHistory()
+        for i, v in enumerate(seq):
+            hist.append(v)
+            assert _same(hist.top1_share(), top1_share(seq[:i + 1])), seq[:i + 1]
+            assert _same(hist.top1_share(), top1_share(seq[:i + 1])), seq[:i + 1]   # cached
+
+
+def test_rank_matches_definition():
+    rnd = random.Random(2)
+    for _ in range(300):
+        seq = [None if rnd.random() < 0.1 else rnd.choice([0, 1, 2.5, -1.0, rnd.random()])
+               for _ in range(rnd.randint(1, 40))]
+        hist = BoostHistory()
+        for i, v in enumerate(seq):
+            hist.append(v)
+            for x in (v, 1, 0.5):
+                assert hist.rank(x) == percentile_rank(x, seq[:i + 1])
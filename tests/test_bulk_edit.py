@@ -0,0 +1,27 @@
+"""update_candles_bulk: grouped updates only, rows deleted meanwhile stay deleted."""
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.db_manager import DatabaseManager
+
+
+def make_rows(n):
+    return [{"id": i, "exchange": "Binance", "symbol_clean": "ETH", "tf": "4h",
+             "ts": f"2024-01-{i:02d}T00:00:00", "note": None} for i in range(1, n + 1)]
+
+
+def test_bulk_edit_updates_only():
+    client = FakeSupabase({"candles": make_rows(6)})
+    db = DatabaseManager(client)
+    client.tables["candles"][:] = [r for r in client.tables["candles"] if r["id"] != 5]   # deleted elsewhere
+
+    updates = {1: {"note": "checked"}, 2: {"note": "checked"}, 3: {"note": "a"},
+               4: {"note": "b"}, 5: {"note": "c"}, 6: {}}
+    client.reset_stats()
+    assert db.update_candles_bulk(updates) == 4
+    assert set(client.stats()["by_call"]) == {"candles.update"}
+    assert client.requests == 4                  # one in_ group + three single ids
+
+    rows = {r["id"]: r for r in client.tables["candles"]}
+    assert sorted(rows) == [1, 2, 3, 4, 6]
+    assert [rows[i]["note"] for i in (1, 2, 3, 4, 6)] == ["checked", "checked", "a", "b", None]
+    assert rows[3]["ts"] == "2024-01-03T00:00:00"
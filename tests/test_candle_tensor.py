@@ -0,0 +1,82 @@
+"""CandleTensorWriter: streamed .npy blocks read back exactly, unpackable segments fall back to dicts."""
+
+import math
+
+import numpy as np
+
+from offline.candle_tensor import (FIELD_INDEX, FLAG_FIELDS, TENSOR_FIELDS, CandleTensorWriter, load_candle_tensor,
+                                   tensor_paths)
+
+
+def make_candle(i, ts):
+    c = {"price_sign": (-1, 0, 1)[i % 3], "cvd_sign": 1, "oi_set": bool(i % 2), "ts": ts}
+    for k, f in enumerate(TENSOR_FIELDS[6:]):
+        c[f] = None if (i + k) % 7 == 0 else i * 1.5 + k / 3
+    return c
+
+
+def make_segment(seg_id, n, day, ts=None):
+    candles = [make_candle(i, ts if ts is not None else f"2025-01-{day:02d}T{i:02d}:00:00") for i in range(n)]
+    return {"id": seg_id, "data": {"CONTEXT": {"DATA": candles}}}
+
+
+def write(base, segments, block_rows):
+    writer = CandleTensorWriter(base, block_rows=block_rows)
+    for seg in segments:
+        writer.write(seg)
+    writer.close()
+    return load_candle_tensor(base)
+
+
+def expected_columns(seg):
+    candles = seg["data"]["CONTEXT"]["DATA"]
+    cols = {f: [float(bool(c.get(f))) if f in FLAG_FIELDS else None if c[f] is None else float(c[f])
+                for c in candles] for f in TENSOR_FIELDS}
+    cols["ts"] = [c["ts"] for c in candles]
+    return cols
+
+
+def test_round_trip_across_blocks(tmp_path):
+    segments = [make_segment(f"s{k}", n, k + 1) for k, n in enumerate([5, 0, 13, 1, 24, 7])]
+    segments[3]["data"]["CONTEXT"]["DATA"][0]["ts"] = None
+    tensor = write(tmp_path / "candles", segments, block_rows=8)
+
+    assert tensor.complete and tensor.ids == [seg["id"] for seg in segments]
+    assert isinstance(tensor.values, np.memmap) and isinstance(tensor.ts, np.memmap)
+    assert tensor.values.shape == (50, len(TENSOR_FIELDS))
+    for k, seg in enumerate(segments):
+        cols = tensor.columns(k)
+        for f, col in expected_columns(seg).items():
+            assert cols[f] == col, (k, f)
+    assert tensor.columns(3)["ts"] == [None]
+    assert not any(p.with_name(p.name + ".tmp.npy").exists() for p in tensor_paths(tmp_path / "candles")[:2])
+
+
+def test_unpackable_segments_and_ids(tmp_path):
+    bad_ts = make_segment(2, 3, 2, ts="2025-01-02 00:00:00+00:00")
+    bad_value = make_segment(3, 2, 3)
+    bad_value["data"]["CONTEXT"]["DATA"][1]["close"] = 7         # int: would come back as 7.0
+    segments = [make_segment(1, 4, 1), bad_ts, bad_value, make_segment(4, 2, 4)]
+    tensor = write(tmp_path / "candles", segments, block_rows=3)
+
+    assert tensor.packed == [True, False, False, True] and not tensor.complete
+    assert tensor.ids == [1, 2, 3, 4] and tensor.matches(segments)
+    assert tensor.columns(1) is None and tensor.columns(2) is None
+    assert tensor.columns(3)["ts"] == ["2025-01-04T00:00:00", "2025-01-04T01:00:00"]
+    assert tensor.values.shape[0] == 6
+
+    mixed = write(tmp_path / "mixed", [make_segment("a", 1, 1), make_segment(5, 1, 2), {"id": None}], 4)
+    assert mixed.ids == ["a", 5, None] and mixed.packed == [True, True, False]
+
+
+def test_nan_values_and_abort(tmp_path):
+    seg = make_segment("x", 3, 1)
+    tensor = write(tmp_path / "candles", [seg], block_rows=2)
+    col = tensor.values[:, FIELD_INDEX["cvd_pct"]]
+    assert [math.isnan(v) for v in col] == [v is None for v in expected_columns(seg)["cvd_pct"]]
+
+    writer = CandleTensorWriter(tmp_path / "aborted", block_rows=1)
+    writer.write(seg)
+    writer.abort()
+    assert list(tmp_path.glob("aborted*")) == []
+    assert load_candle_tensor(tmp_path / "aborted") is None
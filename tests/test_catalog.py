@@ -0,0 +1,106 @@
+"""candle_catalog: used only once backfilled, pruned on delete / key edits, transient errors do not disable it."""
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.db_manager import CATALOG_BACKFILLED, CATALOG_KEY, CATALOG_TABLE, DatabaseManager
+
+MARKER = dict(zip(CATALOG_KEY, CATALOG_BACKFILLED))
+
+
+class FlakyError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+class FlakyClient(FakeSupabase):
+    """FakeSupabase whose next table(name) calls raise the queued errors."""
+
+    def __init__(self, tables=None):
+        super().__init__(tables)
+        self.failures = {}
+
+    def fail_next(self, name, error):
+        self.failures.setdefault(name, []).append(error)
+
+    def table(self, name):
+        if self.failures.get(name):
+            raise self.failures[name].pop(0)
+        return super().table(name)
+
+
+def candles(*keys):
+    return [{"id": i + 1, "exchange": ex, "symbol_clean": sym, "tf": tf, "ts": f"2024-01-01T{i:02d}:00:00"}
+            for i, (ex, sym, tf) in enumerate(keys)]
+
+
+def catalog_keys(client):
+    return {tuple(r[k] for k in CATALOG_KEY) for r in client.tables[CATALOG_TABLE]}
+
+
+def test_partial_catalog_is_not_used_until_marked():
+    client = FakeSupabase({
+        "candles": candles(("Binance", "ETH", "4h"), ("Binance", "BTC", "4h")),
+        CATALOG_TABLE: [{"exchange": "Binance", "symbol_clean": "ETH", "tf": "4h"}],
+    })
+    assert DatabaseManager(client)._get_unique_symbols() == ["BTC", "ETH"]
+    assert DatabaseManager(client).get_catalog() is None
+
+    client.tables[CATALOG_TABLE].append(dict(MARKER))
+    client.tables[CATALOG_TABLE].append({"exchange": "Bybit", "symbol_clean": "SOL", "tf": "1h"})
+    client.reset_stats()
+    assert DatabaseManager(client)._get_unique_symbols() == ["ETH", "SOL"]
+    assert client.stats()["by_call"] == {f"{CATALOG_TABLE}.select": 1}
+
+
+def test_delete_and_key_edits_prune_catalog():
+    client = FakeSupabase({
+        "candles": candles(("Binance", "ETH", "4h"), ("Binance", "ETH", "4h"), ("Binance", "BTC", "4h"),
+                           ("Bybit", "SOL", "1h")),
+        CATALOG_TABLE: [dict(MARKER)],
+    })
+    db = DatabaseManager(client)
+    db.register_catalog(client.tables["candles"])
+    assert db.get_unique_symbols() == ["BTC", "ETH", "SOL"]
+
+    db.delete_candles([1])                       # ETH still has candle 2
+    assert ("Binance", "ETH", "4h") in catalog_keys(client)
+    db.delete_candles([2, 3])
+    assert catalog_keys(client) == {CATALOG_BACKFILLED, ("Bybit", "SOL", "1h")}
+    assert db.get_unique_symbols() == ["SOL"]
+
+    db.update_candle(4, {"symbol_clean": "XRP"})
+    assert catalog_keys(client) == {CATALOG_BACKFILLED, ("Bybit", "XRP", "1h")}
+
+    client.tables["candles"].extend(candles(("Bybit", "XRP", "1h"), ("Bybit", "XRP", "1h"))[1:])
+    client.tables["candles"][-1]["id"] = 9
+    db.update_candles_bulk({4: {"tf": "4h"}, 9: {"tf": "4h"}})
+    assert catalog_keys(client) == {CATALOG_BACKFILLED, ("Bybit", "XRP", "4h")}
+    assert db.get_unique_symbols() == ["XRP"]
+
+
+def test_transient_errors_fall_back_per_call():
+    client = FlakyClient({
+        "candles": candles(("Binance", "ETH", "4h")),
+        CATALOG_TABLE: [dict(MARKER), {"exchange": "Binance", "symbol_clean": "ETH", "tf": "4h"}],
+    })
+    db = DatabaseManager(client)
+    client.fail_next(CATALOG_TABLE, FlakyError("upstream timeout", "503"))
+    assert db.get_catalog() is None
+    assert db.get_catalog() == [{"exchange": "Binance", "symbol_clean": "ETH", "tf": "4h"}]
+
+    client.fail_next(CATALOG_TABLE, ConnectionError("reset"))
+    assert db.register_catalog(candles(("Bybit", "SOL", "1h"))) == 0
+    # Not remembered as registered: the next write sends it again
+    assert db.register_catalog(candles(("Bybit", "SOL", "1h"))) == 1
+    assert ("Bybit", "SOL", "1h") in catalog_keys(client)
+
+
+def test_missing_table_disables_catalog():
+    client = FlakyClient({"candles": candles(("Binance", "ETH", "4h"))})
+    db = DatabaseManager(client)
+    client.fail_next(CATALOG_TABLE, FlakyError('relation "public.candle_catalog" does not exist', "42P01"))
+    assert db.get_catalog() is None
+    client.reset_stats()
+    assert db.register_catalog(candles(("Bybit", "SOL", "1h"))) == 0
+    assert db._get_unique_symbols() == ["ETH"]
+    assert CATALOG_TABLE + ".select" not in client.stats()["by_call"]
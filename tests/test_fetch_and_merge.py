@@ -0,0 +1,61 @@
+"""fetch_and_merge: batched exact-key lookup merges the same rows as the per-range queries."""
+
+from datetime import datetime, timedelta
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.db_manager import FETCH_MERGE_MAX_KEYS, MERGE_COLUMNS, DatabaseManager
+
+T0 = datetime(2024, 1, 1)
+KEYS = [("Binance", "ETH", "5m"), ("Bybit", "ETH", "5m"), ("Binance", "1000PEPE,X:Y", "1h")]
+
+
+def make_db_rows(n):
+    rows = []
+    for k, (ex, sym, tf) in enumerate(KEYS):
+        for i in range(n):
+            row = {col: None for col in MERGE_COLUMNS}
+            row.update(id=k * n + i + 1, exchange=ex, symbol_clean=sym, tf=tf,
+                       ts=(T0 + timedelta(minutes=5 * i)).isoformat(), close=100.0 + i,
+                       oi_open=None if i % 4 == 0 else 0.0 if i % 4 == 1 else 5.0, note=f"db {i}")
+            rows.append(row)
+    return rows
+
+
+def make_batch(n, stride=3):
+    return [{"exchange": ex, "symbol_clean": sym, "tf": tf, "ts": (T0 + timedelta(minutes=5 * i)).isoformat(),
+             "close": 1.0, "oi_open": 7.0, "note": "new"}
+            for ex, sym, tf in KEYS for i in range(0, n, stride)]
+
+
+def merged_view(rows):
+    return [{k: r.get(k) for k in MERGE_COLUMNS} for r in rows]
+
+
+def test_batched_matches_ranges():
+    client = FakeSupabase({"candles": make_db_rows(60)})
+    batch = make_batch(60) + [{"exchange": None, "symbol_clean": "ETH", "tf": "5m", "ts": T0.isoformat()},
+                              {"exchange": "Binance", "symbol_clean": "ETH", "tf": "5m", "ts": "2030-01-01T00:00:00"}]
+    db = DatabaseManager(client)
+    client.reset_stats()
+    batched = db.fetch_and_merge(batch)
+    assert client.requests <= 2                      # column probe + one lookup
+    ranges = db.fetch_and_merge(batch, batched=False)
+    assert merged_view(batched) == merged_view(ranges)
+
+    by_ts = {(r["symbol_clean"], r["ts"]): r for r in batched if r.get("id")}
+    assert by_ts[("ETH", T0.isoformat())]["oi_open"] == 7.0        # NULL filled from the batch
+    assert by_ts[("ETH", (T0 + timedelta(minutes=15)).isoformat())]["oi_open"] == 5.0   # kept
+    assert by_ts[("ETH", T0.isoformat())]["note"] == "db 0"
+    assert batched[-2:] == batch[-2:]                # NULL key part / not in the table: as given
+
+
+def test_requests_are_split_by_key_count():
+    n = FETCH_MERGE_MAX_KEYS
+    client = FakeSupabase({"candles": make_db_rows(n)})
+    db = DatabaseManager(client)
+    db.get_table_columns()
+    batch = make_batch(n, stride=1)
+    client.reset_stats()
+    merged = db.fetch_and_merge(batch)
+    assert client.requests == len(KEYS)
+    assert sum(1 for r in merged if r.get("id")) == len(batch)
@@ -0,0 +1,54 @@
+"""iter_candles keyset paging: duplicate ts across page borders, pages of exactly page_size rows."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.db_manager import CANDLES_PAGE_SIZE, DatabaseManager
+
+T0 = datetime(2024, 1, 1)
+
+
+def make_rows(n, per_ts=7):
+    # Ids shuffled against ts so (ts, id) order differs from insertion order
+    return [{"id": (i * 7919) % 100003, "ts": (T0 + timedelta(hours=i // per_ts)).isoformat(),
+             "tf": "1h" if i % 3 else "4h", "symbol_clean": "ETH", "close": float(i)} for i in range(n)]
+
+
+def ordered_ids(rows, descending=False):
+    return [r["id"] for r in sorted(rows, key=lambda r: (r["ts"], r["id"]), reverse=descending)]
+
+
+def paged(client, **kwargs):
+    client.reset_stats()
+    pages = list(DatabaseManager(client, cache=None).iter_candles(**kwargs))
+    return [len(p) for p in pages], [i for p in pages for i in p["id"]], client.requests
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_duplicate_ts_across_pages(descending):
+    rows = make_rows(100)
+    client = FakeSupabase({"candles": rows})
+    sizes, ids, _ = paged(client, page_size=9, descending=descending)   # 9 never divides the 7-row ts groups
+    assert ids == ordered_ids(rows, descending)
+    assert sizes == [9] * 11 + [1]
+
+
+def test_page_of_exactly_page_size_rows():
+    rows = make_rows(2 * CANDLES_PAGE_SIZE)
+    client = FakeSupabase({"candles": rows})
+    sizes, ids, requests = paged(client)
+    assert sizes == [CANDLES_PAGE_SIZE, CANDLES_PAGE_SIZE]
+    assert ids == ordered_ids(rows)
+    assert requests == 3          # the last full page needs one empty request to end
+
+    sizes, ids, requests = paged(client, limit=CANDLES_PAGE_SIZE)
+    assert sizes == [CANDLES_PAGE_SIZE] and requests == 1
+
+
+def test_filters_and_limit():
+    rows = make_rows(60)
+    client = FakeSupabase({"candles": rows})
+    _, ids, _ = paged(client, tfs=["1H"], page_size=4, limit=10)
+    assert ids == ordered_ids([r for r in rows if r["tf"] == "1h"])[:10]
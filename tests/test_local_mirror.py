@@ -0,0 +1,74 @@
+"""LocalMirror: upserts keep unset columns, full sync reconciles external changes, sync runs in the background."""
+
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.local_mirror import LocalMirror
+
+T0 = datetime(2024, 1, 1)
+
+
+def make_rows(n, start_id=1):
+    # Three rows per ts, so (ts, id) pages split inside a ts
+    return [
+        {"id": start_id + i, "ts": (T0 + timedelta(hours=4 * (i // 3))).isoformat(),
+         "symbol_clean": "ETH" if i % 2 else "BTC", "tf": "4h", "close": 100.0 + i,
+         "oi_set": bool(i % 3), "missing_fields": ["oi"] if i % 5 == 0 else None}
+        for i in range(n)
+    ]
+
+
+def mirrored(mirror):
+    return {r["id"]: r for r in mirror.query().to_dict("records")}
+
+
+def test_apply_rows_updates_only_given_columns():
+    mirror = LocalMirror(":memory:")
+    mirror.apply_rows(make_rows(3))
+    mirror.apply_rows([{"id": 2, "close": 1.5}, {"id": 3, "close": 2.5}])
+    rows = mirrored(mirror)
+    assert rows[2]["close"] == 1.5 and rows[2]["symbol_clean"] == "ETH" and rows[2]["ts"] == make_rows(3)[1]["ts"]
+    assert rows[1]["missing_fields"] == ["oi"] and rows[2]["oi_set"] is True
+    # _ts of a row updated without ts still orders it
+    assert list(mirror.query(columns=["id"], descending=True)["id"]) == [3, 2, 1]
+
+
+def test_full_sync_reconciles_updates_deletes_and_backfill():
+    supabase = FakeSupabase({"candles": make_rows(25)})
+    mirror = LocalMirror(":memory:")
+    assert mirror.sync(supabase, page_size=7) == 25
+    assert mirrored(mirror) == {r["id"]: r for r in supabase.tables["candles"]}
+
+    table = supabase.tables["candles"]
+    table[:] = [r for r in table if r["id"] not in (4, 11, 25)]          # deleted elsewhere
+    table[0]["close"] = -1.0                                              # edited in place
+    backfill = dict(make_rows(1, start_id=100)[0], ts=(T0 - timedelta(days=1)).isoformat())
+    table.append(backfill)                                                # below the watermark
+
+    # Incremental sync only looks past the watermark
+    assert mirror.sync(supabase, page_size=7) == 0
+    assert 4 in mirrored(mirror) and 100 not in mirrored(mirror)
+
+    mirror.sync(supabase, full=True, page_size=7)
+    assert mirrored(mirror) == {r["id"]: r for r in table}
+
+    # Emptied table: everything goes, watermark resets
+    table.clear()
+    mirror.sync(supabase, full=True, page_size=7)
+    assert mirror.count() == 0 and mirror.watermark is None
+
+
+def test_background_sync():
+    supabase = FakeSupabase({"candles": make_rows(10)})
+    mirror = LocalMirror(":memory:")
+    thread = mirror.start_background_sync(supabase, max_age=1, full_max_age=3600)
+    try:
+        assert mirror.start_background_sync(supabase) is thread
+        deadline = time.time() + 5
+        while not mirror.is_ready() and time.time() < deadline:
+            time.sleep(0.01)
+        assert mirror.count() == 10
+    finally:
+        mirror.stop_background_sync(timeout=5)
+    assert not thread.is_alive()
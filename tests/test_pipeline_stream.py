@@ -0,0 +1,71 @@
+"""stream_batch: bounded window, corrected candles for late chunks, no mutation of yielded dicts."""
+
+import copy
+
+from benchmarks.bench_calculate_metrics import make_config
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.synthetic_coinglass import generate_blocks
+from core.db_manager import DatabaseManager
+from core.pipeline_processor import PipelineProcessor
+from core.pipeline_stats import PipelineStats
+
+
+def make_processor():
+    return PipelineProcessor(DatabaseManager(FakeSupabase()), make_config, cache=None)
+
+
+def collect(stream):
+    """Last candle per candle_key in order of first appearance, plus snapshots taken at yield time."""
+    by_key, yielded = {}, []
+    for candle in stream:
+        yielded.append((candle, copy.deepcopy(candle)))
+        by_key[PipelineProcessor.candle_key(candle)] = candle
+    return list(by_key.values()), yielded
+
+
+def assert_not_mutated(yielded):
+    for candle, snapshot in yielded:
+        assert candle == snapshot
+
+
+def test_late_chunks_within_window_yield_corrected_candles():
+    # Every section dropped now and then: later chunks fill the gaps
+    sparse = generate_blocks(10, exchanges=("Binance", "Bybit"), tfs=("5m",), missing_rate=0.7, seed=1)
+    full = generate_blocks(10, exchanges=("Binance", "Bybit"), tfs=("5m",), seed=2)
+    # Chunks 12-15 come back after some of their candles were yielded
+    text = "\n".join(sparse[:20] + full[12:16])
+
+    processor = make_processor()
+    errors, stats = [], PipelineStats()
+    candles, yielded = collect(processor.stream_batch(text, errors, window=8, stats=stats))
+    batch, stream_errors = processor.finalize_batch(candles, errors)
+    expected, expected_errors = processor.process_batch(text)
+
+    assert stats.counters["late_merges"] > 0
+    assert len(yielded) == len(sparse) + stats.counters["late_merges"]
+    assert batch == expected
+    assert stream_errors == expected_errors
+    assert_not_mutated(yielded)
+
+
+def test_late_chunks_beyond_window_are_reported():
+    sparse = generate_blocks(20, exchanges=("Binance", "Bybit"), tfs=("5m",), missing_rate=0.7, seed=1)
+    full = generate_blocks(20, exchanges=("Binance", "Bybit"), tfs=("5m",), seed=2)
+    text = "\n".join(sparse + full[:6])
+
+    processor = make_processor()
+    errors = []
+    candles, yielded = collect(processor.stream_batch(text, errors, window=8))
+
+    assert len(yielded) == len(sparse)
+    assert len([e for e in errors if "Late chunk skipped" in e]) == 6
+    # The skipped chunks leave their candles as the first occurrence built them
+    assert processor.finalize_batch(candles, [])[0] == processor.process_batch("\n".join(sparse))[0]
+    assert_not_mutated(yielded)
+
+
+def test_stream_without_duplicates_matches_process_batch():
+    text = "\n".join(generate_blocks(40, exchanges=("Binance",), tfs=("5m", "1h"), seed=3))
+    processor = make_processor()
+    candles, _ = collect(processor.stream_batch(text, window=4))
+    assert processor.finalize_batch(candles, [])[0] == processor.process_batch(text)[0]
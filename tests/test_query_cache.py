@@ -0,0 +1,85 @@
+"""QueryCache: writes drop only the cached reads whose scope they touch."""
+
+from datetime import date, datetime, timedelta
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.db_manager import DatabaseManager
+from core.query_cache import QueryCache, QueryScope
+
+T0 = datetime(2024, 1, 1)
+
+
+def make_rows():
+    return [{"id": i + 1, "exchange": "Binance", "symbol_clean": sym, "tf": tf,
+             "ts": (T0 + timedelta(days=i)).isoformat(), "close": float(i), "note": ""}
+            for i, (sym, tf) in enumerate([("ETH", "1h"), ("ETH", "4h"), ("BTC", "1h"), ("BTC", "4h")] * 3)]
+
+
+def requests_for(client, read):
+    client.reset_stats()
+    read()
+    return client.requests
+
+
+def test_scope_matching():
+    scope = QueryScope(start_date=date(2024, 1, 2), end_date=date(2024, 1, 3), tfs=["1H"], symbols=["ETH"], ids=[5])
+    assert scope.matches_row({"ts": "2024-01-03T23:00:00", "tf": "1h", "symbol_clean": "ETH"})
+    assert not scope.matches_row({"ts": "2024-01-04T00:00:00", "tf": "1h", "symbol_clean": "ETH"})
+    assert not scope.matches_row({"ts": "2024-01-03T00:00:00", "tf": "4h", "symbol_clean": "ETH"})
+    assert not scope.matches_row({"ts": "2024-01-03T00:00:00", "tf": "1h", "symbol_clean": "BTC"})
+    assert scope.matches_ids([5], {"note": "x"}) and not scope.matches_ids([6], {"note": "x"})
+    assert scope.matches_ids([6], {"tf": "1h"})       # may move into the result
+    assert scope.matches_ids([5]) and not scope.matches_ids([6])
+
+    symbols = QueryScope(values=["ETH"])
+    assert not symbols.matches_row({"symbol_clean": "ETH"}) and symbols.matches_row({"symbol_clean": "SOL"})
+    assert symbols.matches_ids([1]) and symbols.matches_ids([1], {"symbol_clean": "X"})
+    assert not symbols.matches_ids([1], {"note": "x"})
+
+
+def test_db_writes_invalidate_by_scope():
+    client = FakeSupabase({"candles": make_rows()})
+    db = DatabaseManager(client, cache=QueryCache())
+    reads = {
+        "h1": lambda: db.load_candles(tfs=["1h"]),
+        "h4": lambda: db.load_candles(tfs=["4h"]),
+        "jan": lambda: db.load_candles(start_date=date(2024, 1, 1), end_date=date(2024, 1, 3)),
+        "symbols": db.get_unique_symbols,
+    }
+
+    def misses():
+        return {name for name, read in reads.items() if requests_for(client, read)}
+
+    assert misses() == set(reads)
+    assert misses() == set()
+
+    # New 4h row late in the month: only the 4h list
+    db.save_candles_batch([{"exchange": "Binance", "symbol_clean": "ETH", "tf": "4h",
+                            "ts": "2024-01-20T00:00:00", "close": 1.0}])
+    assert misses() == {"h4"}
+
+    # Note on a 1h row of the first days: results holding that id
+    db.update_candle(1, {"note": "checked"})
+    assert misses() == {"h1", "jan"}
+
+    # tf edit can move a row into any filtered result
+    db.update_candle(3, {"tf": "4h"})
+    assert misses() == {"h1", "h4", "jan"}
+
+    # New symbol: the symbol list only
+    db.save_candles_batch([{"exchange": "Binance", "symbol_clean": "SOL", "tf": "1d",
+                            "ts": "2024-02-01T00:00:00", "close": 1.0}])
+    assert misses() == {"symbols"}
+
+    db.delete_candles([2])
+    assert misses() == {"h4", "jan", "symbols"}
+
+
+def test_cached_results_are_copies():
+    client = FakeSupabase({"candles": make_rows()})
+    db = DatabaseManager(client, cache=QueryCache())
+    df = db.load_candles(tfs=["1h"])
+    df["close"] = -1.0
+    assert (db.load_candles(tfs=["1h"])["close"] >= 0).all()
+    db.get_unique_symbols().append("XXX")
+    assert db.get_unique_symbols() == ["BTC", "ETH"]
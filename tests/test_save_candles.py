@@ -0,0 +1,46 @@
+"""save_candles_batch: projected to the cached schema, chunked, PGRST204 fallback when the schema is unknown."""
+
+from benchmarks.fake_supabase import FakeSupabase
+from core.db_manager import SAVE_CHUNK_SIZE, DatabaseManager
+
+COLUMNS = {"id", "exchange", "symbol_clean", "tf", "ts", "close", "note"}
+
+
+def make_candles(n, start=0):
+    return [{"id": 999, "exchange": "Binance", "symbol_clean": "ETH", "tf": "5m",
+             "ts": f"2024-01-01T00:00:{i:06d}", "close": float(i), "parsed_ts": "x", "x_ray": "y"}
+            for i in range(start, start + n)]
+
+
+def seed_row():
+    return {"id": 1, "exchange": "Bybit", "symbol_clean": "BTC", "tf": "1h", "ts": "2023-01-01T00:00:00",
+            "close": 1.0, "note": ""}
+
+
+def test_projected_and_chunked():
+    client = FakeSupabase({"candles": [seed_row()]}, schema={"candles": COLUMNS})
+    db = DatabaseManager(client)
+    candles = make_candles(SAVE_CHUNK_SIZE * 2 + 1)
+    client.reset_stats()
+    assert db.save_candles_batch(candles)
+    by_call = client.stats()["by_call"]
+    assert by_call["candles.upsert"] == 3          # no retries for parsed_ts / x_ray
+    assert len(client.tables["candles"]) == len(candles) + 1
+    saved = client.tables["candles"][-1]
+    assert set(saved) <= COLUMNS and saved["note"] == "" and saved["id"] != 999
+    assert "x_ray" in candles[0]                   # caller's rows untouched
+
+    # Same keys again: updated in place
+    db.save_candles_batch([dict(candles[0], close=-1.0)])
+    assert len(client.tables["candles"]) == len(candles) + 1
+    assert [r["close"] for r in client.tables["candles"] if r["ts"] == candles[0]["ts"]] == [-1.0]
+
+
+def test_unknown_schema_drops_missing_columns_once():
+    client = FakeSupabase({"candles": []}, schema={"candles": COLUMNS})
+    db = DatabaseManager(client)
+    client.reset_stats()
+    assert db.save_candles_batch(make_candles(SAVE_CHUNK_SIZE + 5))
+    # Empty table: no schema to project to. Each missing column fails once, in the first chunk only
+    assert client.stats()["by_call"]["candles.upsert"] == 2 + 2
+    assert all("x_ray" not in r and "parsed_ts" not in r for r in client.tables["candles"])
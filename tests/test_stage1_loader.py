@@ -0,0 +1,53 @@
+"""Stage 1: keyset segment paging and incremental refresh equal to a full reload."""
+
+import copy
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from benchmarks.bench_io_paths import BENCH_SYMBOL, build_segment_rows
+from benchmarks.fake_supabase import FakeSupabase
+from offline import artifact_io, stage1_loader
+from offline.artifact_io import artifact_base, load_json, load_records
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_io, "DATA_DIR", tmp_path)
+    return tmp_path
+
+
+def state():
+    base = lambda name: artifact_base(BENCH_SYMBOL, "1D", "Binance", name)
+    dropped = load_json(f"{base('dropped')}.json")
+    return load_records(base("clean")), dropped["details"], dropped["stats"]
+
+
+def test_pages_of_exactly_page_size():
+    rows = build_segment_rows(1)[:20]
+    client = FakeSupabase({"segments": rows})
+    pages = list(stage1_loader.iter_segment_pages(client, BENCH_SYMBOL, "1D", page_size=10))
+    assert [len(p) for p in pages] == [10, 10] and client.requests == 3
+    assert [r["id"] for p in pages for r in p] == sorted(r["id"] for r in rows)
+    assert [len(p) for p in stage1_loader.iter_segment_pages(client, BENCH_SYMBOL, "1D", page_size=10, limit=15)] == [10, 5]
+
+
+def test_incremental_refresh_matches_full_reload(data_dir):
+    rows = build_segment_rows(2)
+    for i, r in enumerate(rows):
+        r["created_at"] = f"2025-01-{1 + i % 20:02d}T00:00:00"
+        if i % 9 == 0:
+            r["y_dir"] = None                      # dropped
+    client = FakeSupabase({"segments": [copy.deepcopy(r) for r in rows if r["created_at"] < "2025-01-15"]})
+    assert stage1_loader.run_pipeline(BENCH_SYMBOL, "1D", "Binance", supabase=client, page_size=7)[0]
+
+    table = client.tables["segments"]
+    table[:] = table[3:]                                                    # deleted on the server
+    table.extend(copy.deepcopy(r) for r in rows if r["created_at"] >= "2025-01-15")
+    ok, msg, _ = stage1_loader.run_pipeline(BENCH_SYMBOL, "1D", "Binance", supabase=client, page_size=7)
+    assert ok and msg.startswith("Инкрементально")
+    incremental = state()
+
+    assert stage1_loader.run_pipeline(BENCH_SYMBOL, "1D", "Binance", supabase=client, page_size=7, full=True)[0]
+    assert incremental == state()
@@ -0,0 +1,80 @@
+"""resolve_thresholds must give the same result with and without threshold_index."""
+
+import pickle
+import random
+
+import pandas as pd
+import pytest
+
+from benchmarks.bench_calculate_metrics import make_config, make_raw
+from core.parsing_engine import build_threshold_index, calculate_metrics, resolve_thresholds
+
+A = {"sens": 1.0, "k_set": 1.2, "k_ctr": 0.8, "k_unl": 1.1}
+B = {"sens": 2.0, "k_set": 1.5, "k_ctr": 0.5, "k_unl": 0.9}
+
+# tf_params with keys that differ only in case, empty rows and odd key types
+ALIASED_TF_PARAMS = [
+    {"1h": A, "1H": B},
+    {"1H": B, "1h": A},
+    {"4H": {}, "4h": A},
+    {"4h": {}, "4H": A},
+    {"4h": None, "4H": {}, "4H ": B},
+    {"1d": {"sens": 3.0}, "1D": B},
+    {5: A, "5M": B},
+]
+
+SYMBOLS = [None, "", "ETH", "eth", "Eth", "BTC", "btc", "SOL", "XRP"]
+TFS = [None, "", "4h", "4H", "1h", "1H", "1d", "1D", "5", "5m", "5M", "4H ", "15m"]
+
+
+def make_aliased_config(tf_params):
+    return {
+        "asset_coeffs": {"ETH": 1.0, "BTC": 0.8, "sol": 2.0},
+        "porog_doi": pd.DataFrame([
+            {"timeframe": "4h", "eth": 1.5, "btc": 1.2, "SOL": 3.0},
+            {"timeframe": "1H", "eth": 0.9, "btc": None, "SOL": 3.0},
+            {"timeframe": "4H", "eth": 9.9, "btc": 9.9, "SOL": 3.0},
+            {"timeframe": "1d", "eth": "bad", "btc": 2.5, "SOL": 3.0},
+        ]),
+        "tf_params": tf_params,
+    }
+
+
+@pytest.mark.parametrize("tf_params", ALIASED_TF_PARAMS)
+def test_index_matches_table_lookup(tf_params):
+    plain = make_aliased_config(tf_params)
+    indexed = dict(plain, threshold_index=build_threshold_index(plain))
+    for sym in SYMBOLS:
+        for tf in TFS:
+            # repr: an empty porog cell resolves to NaN on both paths
+            assert repr(resolve_thresholds(sym, tf, indexed)) == repr(resolve_thresholds(sym, tf, plain)), (sym, tf)
+
+
+def test_exact_tf_key_wins_over_case_variant():
+    config = make_aliased_config({"1h": A, "1H": B})
+    config["threshold_index"] = build_threshold_index(config)
+    assert resolve_thresholds("ETH", "1H", config).tf_sens == B["sens"]
+    assert resolve_thresholds("ETH", "1h", config).tf_sens == A["sens"]
+
+
+def test_empty_exact_entry_falls_back_to_case_variant():
+    config = make_aliased_config({"4h": A, "4H": {}})
+    config["threshold_index"] = build_threshold_index(config)
+    assert resolve_thresholds("ETH", "4H", config).tf_sens == A["sens"]
+
+
+def test_calculate_metrics_identical_with_index():
+    rnd = random.Random(7)
+    raws = [make_raw(rnd) for _ in range(2000)]
+    plain, indexed = make_config(indexed=False), make_config()
+    for raw in raws:
+        assert repr(calculate_metrics(raw, indexed)) == repr(calculate_metrics(raw, plain))
+
+
+def test_index_is_immutable_and_picklable():
+    index = build_threshold_index(make_config(indexed=False))
+    with pytest.raises(TypeError):
+        index |= {}
+    with pytest.raises(TypeError):
+        index[("eth", "4h")] = None
+    assert pickle.loads(pickle.dumps(index)) == index
@@ -0,0 +1,65 @@
+"""CandleWriteQueue spool: unsaved and dead-lettered rows survive a restart."""
+
+from core.db_manager import CandleWriteQueue
+from core.local_mirror import LocalMirror, WriteSpool
+
+
+class RecordingDB:
+    """save_candles_batch stand-in: raises the given error or records the rows."""
+
+    def __init__(self, error=None, reject=()):
+        self.error = error
+        self.reject = set(reject)
+        self.saved = []
+
+    def save_candles_batch(self, rows):
+        if self.error is not None:
+            raise self.error
+        if any(r["ts"] in self.reject for r in rows):
+            raise ValueError("violates check constraint")
+        self.saved.extend(rows)
+        return True
+
+
+def candle(ts, **extra):
+    return {"exchange": "Binance", "symbol_clean": "ETH", "tf": "4h", "ts": ts, **extra}
+
+
+def test_unsaved_rows_are_restored_from_spool(tmp_path):
+    path = str(tmp_path / "spool.sqlite")
+    queue = CandleWriteQueue(RecordingDB(ConnectionError("offline")), base_delay=60, spool=WriteSpool(path))
+    queue.submit([candle("t1", close=1.0), candle("t2", close=2.0)])
+    queue.submit([candle("t1", note="x")])
+    queue.close(timeout=5)
+    assert WriteSpool(path).load()[0] == [
+        (("Binance", "ETH", "4h", "t1"), candle("t1", close=1.0, note="x")),
+        (("Binance", "ETH", "4h", "t2"), candle("t2", close=2.0)),
+    ]
+
+    db = RecordingDB()
+    queue = CandleWriteQueue(db, spool=WriteSpool(path))
+    assert queue.stats()["restored"] == 2
+    assert queue.flush(timeout=5)
+    assert sorted(r["ts"] for r in db.saved) == ["t1", "t2"]
+    assert WriteSpool(path).load() == ([], [])
+    queue.close()
+
+
+def test_dead_letters_are_spooled_and_retried():
+    mirror = LocalMirror(":memory:")
+    spool = mirror.write_spool()
+    queue = CandleWriteQueue(RecordingDB(reject={"bad"}), base_delay=0.001, max_attempts=2, spool=spool)
+    queue.submit([candle("ok"), candle("bad")])
+    assert queue.flush(timeout=5)
+    pending, dead = spool.load()
+    assert pending == [] and [entry["row"]["ts"] for _, entry in dead] == ["bad"]
+    queue.close()
+
+    db = RecordingDB()
+    queue = CandleWriteQueue(db, spool=spool)
+    assert queue.stats()["dead_letters"] == 1
+    assert queue.retry_dead_letters() == 1
+    assert queue.flush(timeout=5)
+    assert [r["ts"] for r in db.saved] == ["bad"]
+    assert spool.load() == ([], [])
+    queue.close()
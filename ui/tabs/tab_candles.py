@@ -65,6 +65,10 @@ def render(db):
     # === СЕКЦИЯ 2: ЗАГРУЗКА ДАННЫХ ===
     df = db.load_candles(limit=limit_rows, start_date=start_d, end_date=end_d, tfs=selected_tfs, symbols=selected_symbols)
 
+    # Кэш чтения: повторные rerun с теми же фильтрами не ходят в БД
+    cache_stats = db.cache_stats()
+    st.caption(f"⚡ Кэш: hit-rate {cache_stats['hit_rate']:.0%} · {cache_stats['hits']} hits · {cache_stats['misses']} misses · {cache_stats['size']} entries")
+
     if not df.empty:
         # Добавляем колонку note если её нет
         if 'note' not in df.columns:
@@ -89,17 +93,16 @@ def render(db):
                 if "db_editor" in st.session_state and "edited_rows" in st.session_state["db_editor"]:
                     changes_map = st.session_state["db_editor"]["edited_rows"]
                     if changes_map:
-                        count = 0
+                        updates = {}
                         for idx, changes in changes_map.items():
                             # Исключаем колонку delete из изменений
                             valid_changes = {k: v for k, v in changes.items() if k != 'delete'}
                             if valid_changes:
-                                row_id = df.iloc[idx]['id']
-                                db.update_candle(row_id, valid_changes)
-                                count += 1
+                                updates[df.iloc[idx]['id']] = valid_changes
+                        # Все правки одним пакетом (несколько запросов вместо одного на строку)
+                        count = db.update_candles_bulk(updates) if updates else 0
                         if count > 0:
                             st.toast(f"✅ Обновлено {count} свечей")
-                            st.cache_data.clear()
                             st.rerun()
                         else:
                             st.info("Нет смысловых изменений.")
@@ -128,7 +131,6 @@ def render(db):
                 if ids_to_del:
                     if db.delete_candles(ids_to_del):
                         st.toast(f"Удалено {len(ids_to_del)} записей!")
-                        st.cache_data.clear()
                         st.rerun()
                 else:
                     st.warning("Ничего не выделено.")
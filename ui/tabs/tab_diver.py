@@ -9,6 +9,7 @@ import streamlit as st
 from datetime import datetime
 from core.parsing_engine import parse_raw_input, calculate_metrics, fmt_num
 from core import diver_engine
+from core.db_manager import RAW_COLUMNS
 
 
 def render(db, processor, config_loader, supabase):
@@ -133,7 +134,11 @@ def render(db, processor, config_loader, supabase):
         elif len(filter_dates) == 1:
             d_start = filter_dates[0]
              
-        db_df = db.load_candles(limit=500, start_date=d_start, end_date=d_end, tfs=filter_tfs)
+        # Сырые поля (для calculate_metrics) + отчёты, без raw_data и служебных колонок
+        db_df = db.load_candles_paged(
+            columns=RAW_COLUMNS + ['x_ray', 'x_ray_composite'], limit=500, descending=True,
+            start_date=d_start, end_date=d_end, tfs=filter_tfs
+        )
         
         selected_metrics = None
         
@@ -220,9 +225,8 @@ def render(db, processor, config_loader, supabase):
                         c_id = m_data.get('id')
                         if c_id:
                             try:
-                                supabase.table('candles').update({
-                                    'report_diver': report_txt
-                                }).eq('id', c_id).execute()
+                                # Через db: обновляет зеркало и кэш чтения
+                                db.update_candle(c_id, {'report_diver': report_txt})
                                 st.toast("Отчет сохранен в БД! ✅", icon="✅")
                             except Exception as e:
                                 st.error(f"Ошибка сохранения: {e}")
@@ -5,10 +5,16 @@ Tab Lab - UI модуль для лаборатории загрузки batch-
 Позволяет парсить и загружать обучающие сегменты с метками.
 """
 
+import os
 import streamlit as st
 import pandas as pd
 from core import batch_parser
 
+# Процессы для парсинга больших вставок: 1 = последовательно (по умолчанию),
+# 0 = по числу CPU. Пул запускается внутри процесса Streamlit, поэтому
+# включается только явно - там, где есть свободные ядра
+LAB_PARSE_WORKERS = int(os.getenv("LAB_PARSE_WORKERS", "1")) or (os.cpu_count() or 1)
+
 
 def render(supabase, config_loader):
     """
@@ -36,7 +42,7 @@ def render(supabase, config_loader):
                 st.warning("Введите текст.")
             else:
                 lab_config = config_loader()
-                st.session_state['lab_segments'], st.session_state['lab_candles'], st.session_state['lab_warnings'] = batch_parser.parse_batch_with_labels(lab_text, config=lab_config)
+                st.session_state['lab_segments'], st.session_state['lab_candles'], st.session_state['lab_warnings'] = batch_parser.parse_batch_with_labels(lab_text, config=lab_config, workers=LAB_PARSE_WORKERS)
                 st.session_state['lab_checked'] = True
                 st.rerun()
 
@@ -7,16 +7,49 @@ Tab Levels - UI модуль для расчёта уровней поддерж
 
 import streamlit as st
 import pandas as pd
-from datetime import timedelta
 from core import levels_engine
 
+# Колонки для build_levels (OHLCV + время)
+LEVELS_COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
 
-def render(supabase):
+# История без выбранного периода: последние N свечей TF
+DEFAULT_LOOKBACK = {"4h": 180, "1d": 365}
+FALLBACK_LOOKBACK = 300
+
+
+def load_level_candles(db, tf, d_start=None, d_end=None):
+    """
+    Свечи TF для build_levels, от старых к новым.
+    
+    Идёт через keyset-пагинацию db.load_candles_paged (или локальное
+    зеркало), поэтому период любой длины не обрезается лимитом PostgREST.
+    Без периода - последние DEFAULT_LOOKBACK свечей.
+    
+    Аргументы:
+        db: Инстанс DatabaseManager
+        tf: Таймфрейм (регистр не важен)
+        d_start, d_end: Период (включительно) или None
+    
+    Возвращает:
+        Список словарей свечей (пропуски - None, как в ответе БД)
+    """
+    limit = None if d_start else DEFAULT_LOOKBACK.get(tf, FALLBACK_LOOKBACK)
+    df = db.load_candles_paged(
+        columns=LEVELS_COLUMNS, start_date=d_start, end_date=d_end, tfs=[tf],
+        limit=limit, descending=True
+    )
+    if df.empty:
+        return []
+    df = df.iloc[::-1]
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def render(db):
     """
     Отрисовывает вкладку "Уровни".
     
     Аргументы:
-        supabase: Клиент Supabase для запросов к БД
+        db: Инстанс DatabaseManager для работы с БД
     """
     
     # === СЕКЦИЯ 1: ФИЛЬТРЫ ===
@@ -60,29 +93,7 @@ def render(supabase):
                         levels_results = {}
                         
                         for tf in selected_tfs_lvl:
-                            # Query с поддержкой регистра (4h и 4H)
-                            query = supabase.table("candles").select("*").in_("tf", [tf.lower(), tf.upper()]).order("ts", desc=True)
-                            
-                            if d_start:
-                                query = query.gte("ts", d_start.isoformat())
-                            if d_end:
-                                d_end_full = d_end + timedelta(days=1)
-                                query = query.lt("ts", d_end_full.isoformat())
-                            
-                            # Динамические лимиты
-                            if not d_start:
-                                if tf == "4h":
-                                    limit_val = 180
-                                elif tf == "1d":
-                                    limit_val = 365
-                                else:
-                                    limit_val = 300
-                                query = query.limit(limit_val)
-                            else:
-                                query = query.limit(1000)
-
-                            res = query.execute()
-                            candles = res.data[::-1] if res.data else []
+                            candles = load_level_candles(db, tf, d_start, d_end)
                             
                             if candles:
                                 mx = 8 if tf == "1d" else 10
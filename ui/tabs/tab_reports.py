@@ -5,8 +5,10 @@ Tab Reports - UI модуль для парсинга и отображения
 Позволяет вставлять сырые данные свечей, парсить их и отображать X-RAY отчёты.
 """
 
+import json
 import streamlit as st
 from datetime import datetime
+from core.pipeline_stats import PipelineStats
 
 
 def fmt_num(val):
@@ -25,6 +27,52 @@ def fmt_num(val):
         return str(val)
 
 
+def render_candle(full_data):
+    """
+    Отрисовывает одну свечу: expander с X-RAY (и COMPOSITE, если есть).
+    
+    Аргументы:
+        full_data: Обогащённая свеча из PipelineProcessor
+    """
+    # Формируем красивую метку времени
+    try:
+        ts_obj = datetime.fromisoformat(full_data['ts'])
+        ts_str = ts_obj.strftime('%d.%m.%Y %H:%M')
+    except:
+        ts_str = str(full_data.get('ts'))
+    
+    # Формируем заголовок expandera с предупреждением если есть пропущенные поля
+    warn_icon = " ⚠️" if full_data.get('missing_fields') else ""
+    label = f"{ts_str} · {full_data.get('exchange')} · {full_data.get('symbol_clean')} · {full_data.get('tf')} · O {fmt_num(full_data.get('open'))}{warn_icon}"
+    
+    # Раскрывающийся блок для каждой свечи
+    with st.expander(label):
+        
+        # Предупреждение о пропущенных полях (если есть)
+        if full_data.get('missing_fields'):
+            st.warning(f"⚠️ Отсутствуют данные: {', '.join(full_data['missing_fields'])}. Метрики на основе этих полей не рассчитаны.")
+        
+        # Контейнер с фиксированной высотой для отчётов
+        with st.container(height=300):
+            
+            # Если есть композитный отчёт - показываем две вкладки
+            if full_data.get('x_ray_composite'):
+                t_xray, t_comp = st.tabs(["X-RAY", "⚡️ COMPOSITE"])
+                
+                # Вкладка X-RAY: основной анализ одной свечи
+                with t_xray:
+                    if full_data.get('x_ray'):
+                        st.code(full_data['x_ray'], language="yaml")
+                
+                # Вкладка COMPOSITE: сводный анализ по нескольким биржам
+                with t_comp:
+                    st.code(full_data['x_ray_composite'], language="yaml")
+            else:
+                # Если композита нет - показываем только X-RAY
+                if full_data.get('x_ray'):
+                    st.code(full_data['x_ray'], language="yaml")
+
+
 def render(db, processor):
     """
     Отрисовывает вкладку "Отчеты".
@@ -57,17 +105,57 @@ def render(db, processor):
     
     # === СЕКЦИЯ 3: ОБРАБОТКА НАЖАТИЯ КНОПКИ ===
     if process and input_text:
-        # Вызываем pipeline_processor для обработки сырого текста
+        # Потоковая обработка: свечи рисуются по мере готовности групп, а не
+        # после всего текста. Если поздний кусок дополнил уже показанную
+        # свечу, стрим выдаёт исправленную свечу с тем же ключом - она
+        # заменяет прежнюю и в списке, и на месте её отрисовки
+        orphan_errors = []
+        enriched = {}   # candle_key -> последняя версия свечи
+        slots = {}      # candle_key -> место отрисовки
+        stats = PipelineStats()
+        progress = st.empty()
+        live = st.container()
+        for full_data in processor.stream_batch(input_text, orphan_errors, stats=stats):
+            key = processor.candle_key(full_data)
+            if key not in slots:
+                slots[key] = live.empty()
+            enriched[key] = full_data
+            with slots[key].container():
+                render_candle(full_data)
+            progress.caption(f"⏳ Обработано свечей: {len(enriched)} · {full_data.get('ts')} · {full_data.get('exchange')}")
+        progress.empty()
+
+        # Композит и проверка сирот (нужны все свечи)
         # Возвращает: список обработанных свечей + список ошибок валидации
-        final_save_list, orphan_errors = processor.process_batch(input_text)
+        final_save_list, orphan_errors = processor.finalize_batch(list(enriched.values()), orphan_errors, stats)
         
         # Сохраняем результат в session_state (чтобы не потерять при rerun)
         st.session_state.processed_batch = final_save_list
         st.session_state.validation_errors = orphan_errors
+        st.session_state.pipeline_stats = stats.finish().to_dict()
         
         # Перезагружаем страницу для отображения результатов
         st.rerun()
     
+    # === СЕКЦИЯ 3.1: ТАЙМИНГИ ПАЙПЛАЙНА ===
+    # Время / вызовы / элементы по 7 шагам последней обработки
+    if st.session_state.get('pipeline_stats'):
+        stats_dict = st.session_state.pipeline_stats
+        with st.expander(f"⏱️ Тайминги пайплайна · {stats_dict['total_ms']:.0f} ms"):
+            st.dataframe(
+                [{"stage": name, **vals} for name, vals in stats_dict['stages'].items()],
+                hide_index=True,
+                use_container_width=True
+            )
+            if stats_dict['counters']:
+                st.caption(" · ".join(f"{k}: {v}" for k, v in stats_dict['counters'].items()))
+            st.download_button(
+                "JSON",
+                data=json.dumps(stats_dict, indent=2, ensure_ascii=False),
+                file_name="pipeline_stats.json",
+                mime="application/json"
+            )
+    
     # === СЕКЦИЯ 4: ОТОБРАЖЕНИЕ ОШИБОК ВАЛИДАЦИИ ===
     # Если есть ошибки (например, свечи других бирж не совпали с Binance)
     if 'validation_errors' in st.session_state and st.session_state.validation_errors:
@@ -82,50 +170,47 @@ def render(db, processor):
     if 'processed_batch' in st.session_state and st.session_state.processed_batch:
         batch = st.session_state.processed_batch
         
-        # Кнопка "Сохранить" - сохраняет все свечи в БД
+        # Кнопка "Сохранить" - ставит свечи в очередь записи (write-behind),
+        # UI не ждёт Supabase; запись с ретраями идёт в фоне. Очередь лежит в
+        # SQLite-спуле, поэтому пишем "в очереди", а не "сохранено"
         with col_save:
             if st.button(f"💾 Сохранить {len(batch)}", type="secondary", key="save_btn_top"):
-                if db.save_candles_batch(batch):
-                    st.toast("Успешно сохранено!", icon="💾")
-                    st.cache_data.clear()  # Очищаем кэш для обновления данных
+                depth = db.save_candles_async(batch)
+                dead = db.write_queue().stats()['dead_letters']
+                msg = f"В очереди на запись: {depth} (ещё не в базе)"
+                if dead:
+                    msg += f" · не записано: {dead}"
+                st.toast(msg, icon="⏳")
+        
+        # Состояние очереди записи: глубина / задержка сброса / ошибки
+        queue_stats = db.write_queue().stats()
+        if queue_stats['submitted'] or queue_stats['restored'] or queue_stats['dead_letters']:
+            last_ms = queue_stats['last_flush_ms']
+            msg = f"⏳ В очереди: {queue_stats['depth'] + queue_stats['in_flight']} · записано {queue_stats['flushed']}"
+            if queue_stats['restored']:
+                msg += f" · восстановлено из спула {queue_stats['restored']}"
+            if queue_stats['dead_letters']:
+                msg += f" · не записано {queue_stats['dead_letters']}"
+            if last_ms is not None:
+                msg += f" · последний сброс {last_ms:.0f} ms"
+            if queue_stats['failures']:
+                msg += f" · ошибок {queue_stats['failures']} ({queue_stats['last_error']})"
+            st.caption(msg)
+
+            # Строки, отклонённые базой max_attempts раз, - не записаны
+            if queue_stats['dead_letters']:
+                dead = db.write_queue().dead_letters()
+                st.error(f"⛔️ Не записано свечей: {len(dead)}")
+                with st.expander("Отклонённые строки"):
+                    for entry in dead:
+                        row = entry['row']
+                        st.code(f"{row.get('symbol_clean')} {row.get('tf')} {row.get('ts')} "
+                                f"(попыток {entry['attempts']}): {entry['error']}", language="text")
+                if st.button("🔁 Повторить запись", key="retry_dead_letters"):
+                    n = db.write_queue().retry_dead_letters()
+                    st.toast(f"Снова в очереди: {n}", icon="🔁")
         
         # === СЕКЦИЯ 6: РЕНДЕР КАЖДОЙ СВЕЧИ ===
-        for idx, full_data in enumerate(batch):
-            
-            # Формируем красивую метку времени
-            try:
-                ts_obj = datetime.fromisoformat(full_data['ts'])
-                ts_str = ts_obj.strftime('%d.%m.%Y %H:%M')
-            except:
-                ts_str = str(full_data.get('ts'))
-            
-            # Формируем заголовок expandera с предупреждением если есть пропущенные поля
-            warn_icon = " ⚠️" if full_data.get('missing_fields') else ""
-            label = f"{ts_str} · {full_data.get('exchange')} · {full_data.get('symbol_clean')} · {full_data.get('tf')} · O {fmt_num(full_data.get('open'))}{warn_icon}"
-            
-            # Раскрывающийся блок для каждой свечи
-            with st.expander(label):
-                
-                # Предупреждение о пропущенных полях (если есть)
-                if full_data.get('missing_fields'):
-                    st.warning(f"⚠️ Отсутствуют данные: {', '.join(full_data['missing_fields'])}. Метрики на основе этих полей не рассчитаны.")
-                
-                # Контейнер с фиксированной высотой для отчётов
-                with st.container(height=300):
-                    
-                    # Если есть композитный отчёт - показываем две вкладки
-                    if full_data.get('x_ray_composite'):
-                        t_xray, t_comp = st.tabs(["X-RAY", "⚡️ COMPOSITE"])
-                        
-                        # Вкладка X-RAY: основной анализ одной свечи
-                        with t_xray:
-                            if full_data.get('x_ray'):
-                                st.code(full_data['x_ray'], language="yaml")
-                        
-                        # Вкладка COMPOSITE: сводный анализ по нескольким биржам
-                        with t_comp:
-                            st.code(full_data['x_ray_composite'], language="yaml")
-                    else:
-                        # Если композита нет - показываем только X-RAY
-                        if full_data.get('x_ray'):
-                            st.code(full_data['x_ray'], language="yaml")
+        for full_data in batch:
+            render_candle(full_data)
+
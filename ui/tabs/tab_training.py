@@ -29,6 +29,12 @@ def render():
             index=1, 
             help="STRICT: полные бины (Q1-Q5), SMALLN: сжатые зоны (LOW/MID/HIGH)"
         )
+        tr_full = st.checkbox(
+            "Полная перезагрузка",
+            value=False,
+            help="Загрузить все сегменты заново, а не только новые. Нужна после правок "
+                 "старых сегментов в базе (автоматически - раз в STAGE1_FULL_RELOAD_SEC, по умолчанию сутки)"
+        )
         
         start_btn = st.button("🚀 ЗАПУСТИТЬ ОБУЧЕНИЕ", type="primary", use_container_width=True)
         
@@ -36,17 +42,22 @@ def render():
         st.subheader("2. Прогресс")
         
         if start_btn:
-            _run_training_pipeline(tr_symbol, tr_tf, tr_exchange, tr_profile)
+            _run_training_pipeline(tr_symbol, tr_tf, tr_exchange, tr_profile, full=tr_full)
 
 
-def _run_training_pipeline(symbol, tf, exchange, profile):
-    """Запускает 6-этапный конвейер обучения."""
+def _run_training_pipeline(symbol, tf, exchange, profile, full=False):
+    """
+    Запускает 6-этапный конвейер обучения.
+    
+    Аргументы:
+        full: Шаг 1 загружает все сегменты заново (без инкрементального обновления)
+    """
     
     status = st.status("Запуск конвейера...", expanded=True)
     
     # Шаг 1: Загрузка данных
     status.write("📥 Шаг 1: Загрузка данных (Offline Pooling)...")
-    success1, msg1, count1 = stage1_loader.run_pipeline(symbol, tf, exchange)
+    success1, msg1, count1 = stage1_loader.run_pipeline(symbol, tf, exchange, full=full)
     
     if not success1:
         status.update(label="❌ Ошибка на этапе загрузки!", state="error")